@@ -9,7 +9,10 @@ import os
 from os.path import join, abspath, dirname
 import sys
 import re
+import time
 import logging
+import threading
+import Queue
 
 from xpcom import components, COMException, ServerException, nsError
 from xpcom.server import WrapObject, UnwrapObject
@@ -45,6 +48,161 @@ def _params_from_connection(dbConnection):
         
     return obj
 
+#---- Background listing of the explorer nodes
+
+class _PendingChildren(object):
+    """The result of a children listing, possibly still running."""
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.started = False
+        self.finished_at = None
+        self._done = threading.Event()
+        self._value = None
+        self._exc_info = None
+
+    def run(self):
+        try:
+            self._value = self.func(*self.args)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        self.finished_at = time.time()
+        self._done.set()
+
+    def failed(self):
+        return self._exc_info is not None
+
+    def result(self):
+        self._done.wait()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+class _ChildrenPrefetcher(object):
+    """Run the children listings of the explorer nodes on a bounded pool of
+    worker threads.
+
+    Listings are keyed by node URI. A scheduled listing runs in the
+    background and its result is kept for `ttl` seconds: expanding the node
+    then doesn't wait for the server, or waits only for the listing already
+    in progress. A listing still queued when its node is expanded is run by
+    the caller instead. A listing is used once, so expanding the node again
+    lists it afresh; failed listings are not kept.
+    """
+    def __init__(self, num_workers=8, ttl=60):
+        self.num_workers = num_workers
+        self.ttl = ttl
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._workers = []
+
+    def _lookup(self, key):
+        # Call with the lock held.
+        pending = self._pending.get(key)
+        if pending is not None and pending.finished_at is not None \
+           and (pending.failed()
+                or time.time() - pending.finished_at > self.ttl):
+            del self._pending[key]
+            pending = None
+        return pending
+
+    def schedule(self, key, func, *args):
+        """Run func(*args) in the background unless a listing for key is
+        already available or in progress."""
+        self._lock.acquire()
+        try:
+            if self._lookup(key) is not None:
+                return
+            pending = self._pending[key] = _PendingChildren(func, args)
+            if len(self._workers) < self.num_workers:
+                worker = threading.Thread(target=self._work,
+                                          name="koDBConnPG prefetch")
+                worker.setDaemon(True)
+                self._workers.append(worker)
+                worker.start()
+        finally:
+            self._lock.release()
+        self._queue.put(pending)
+
+    def put(self, key, value):
+        """Store a listing obtained as a by-product of another one."""
+        pending = _PendingChildren(None, ())
+        pending._value = value
+        pending.started = True
+        pending.finished_at = time.time()
+        pending._done.set()
+        self._lock.acquire()
+        try:
+            self._pending[key] = pending
+        finally:
+            self._lock.release()
+
+    def get(self, key, func, *args):
+        """Return the listing for key, running func(*args) if it isn't
+        available or in progress."""
+        self._lock.acquire()
+        try:
+            pending = self._lookup(key)
+            if pending is None:
+                pending = self._pending[key] = _PendingChildren(func, args)
+            run = not pending.started
+            pending.started = True
+        finally:
+            self._lock.release()
+        if run:
+            pending.run()
+        try:
+            return pending.result()
+        finally:
+            self._lock.acquire()
+            try:
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+            finally:
+                self._lock.release()
+
+    def invalidate(self, prefix):
+        """Forget the listings of the node at prefix and its descendants."""
+        self._lock.acquire()
+        try:
+            for key in self._pending.keys():
+                if key.startswith(prefix):
+                    del self._pending[key]
+        finally:
+            self._lock.release()
+
+    def _work(self):
+        while True:
+            pending = self._queue.get()
+            self._lock.acquire()
+            try:
+                run = not pending.started
+                pending.started = True
+            finally:
+                self._lock.release()
+            if run:
+                pending.run()
+
+_prefetcher = _ChildrenPrefetcher()
+
+def _list_database_names(db_args):
+    return dbx_psycopg.Database(db_args, 'postgres').listDatabases()
+
+def _list_table_names(db_args, dbname):
+    return dbx_psycopg.Database(db_args, dbname).listAllTableNames(dbname)
+
+def _prefetch_column_names(db_args, dbname, uri):
+    """List the columns of all the tables of a database in one query and
+    store them as the children of each table node."""
+    db = dbx_psycopg.Database(db_args, dbname)
+    for table_name, column_names in db.listAllColumnNamesByTable(dbname).items():
+        _prefetcher.put(uri + "/" + table_name, column_names)
+
+def _list_column_names(db_args, dbname, table_name):
+    db = dbx_psycopg.Database(db_args, dbname)
+    return db.listAllColumnNames(dbname, table_name)
+
 class KoPostgresDBXTableConnection(dbxlib.KoTableConnector):
     """ This table is now mixed into KoMySQL_DBXTable"""
     def __init__(self):
@@ -102,9 +260,15 @@ class KoPostgresDBXConnection(dbxlib.KoDBXConnection):
         db_args = _params_from_connection(self)
         try:
             # At top-level, pick the postgres database
-            db = dbx_psycopg.Database(db_args, 'postgres')
-            database_names = [(name, 'database', KoPostgres_DBXDatabase(self, name)) for name in db.listDatabases()]
+            uri = self.getURI()
+            _prefetcher.invalidate(uri + "/")
+            database_names = [(name, 'database', KoPostgres_DBXDatabase(self, name)) for name in _prefetcher.get(uri, _list_database_names, db_args)]
             names = sorted(database_names, key=lambda item:item[0].lower())
+            # List the tables of all the databases concurrently, so that
+            # expanding any of them is immediate.
+            for name, type, child in names:
+                _prefetcher.schedule(uri + "/" + name, _list_table_names,
+                                     db_args, name)
             return names
         except Exception, ex:
             log.exception("Failed: KoPostgresDBXConnection.getChildren")
@@ -138,9 +302,10 @@ class KoPostgres_DBXDatabase(dbxlib.KoDBXConnectionChild):
         db_args = self.find_params_from_connection()
         log.debug("#2.2: db_args: %s", db_args)
         try:
-            db = dbx_psycopg.Database(db_args, self._dbname)
-            log.debug("#2.3: got a db object")
-            table_names = [(name, 'table', KoPostgres_DBXTable(self, name)) for name in db.listAllTableNames(self._dbname)]
+            uri = self.getURI()
+            table_names = [(name, 'table', KoPostgres_DBXTable(self, name)) for name in _prefetcher.get(uri, _list_table_names, db_args, self._dbname)]
+            _prefetcher.schedule(uri + "/", _prefetch_column_names,
+                                 db_args, self._dbname, uri)
             log.debug("#2.4: table_names:%s", table_names)
             names = sorted(table_names, key=lambda item:item[0].lower())
             log.debug("#2.5: names:%s", names)
@@ -180,14 +345,22 @@ class KoPostgres_DBXTable(dbxlib.KoDBXConnectionChild, KoPostgresDBXTableConnect
         log.debug("#3: Asked to get children from %r", self)
         db_args = self.find_params_from_connection()
         try:
-            db = dbx_psycopg.Database(db_args, self._dbname)
-            column_names = [(name, 'column', KoPostgres_DBXColumn(self, name)) for name in db.listAllColumnNames(self._dbname, self._table_name)]
+            column_names = [(name, 'column', KoPostgres_DBXColumn(self, name)) for name in _prefetcher.get(self.getURI(), _list_column_names, db_args, self._dbname, self._table_name)]
             names = sorted(column_names, key=lambda item:item[0].lower())
             return names
         except Exception, ex:
             log.exception("Failed: KoPostgresDBXConnection.getChildren")
             return [("Error: " + str(ex), 'error')]
 
+    def exportTable(self, path, num_workers=None):
+        """Export the whole table as CSV to the file at path, using several
+        connections in parallel."""
+        return self._db.exportTable(self._table_name, path, num_workers)
+
+    def cancelQuery(self):
+        """Cancel the query running on the table's database, if any."""
+        return self._db.cancelQuery()
+
     def getURI(self):
         return self._parent.getURI() + "/" + self._table_name
 
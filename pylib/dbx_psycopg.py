@@ -11,8 +11,14 @@ for another user's case of the problem.
 
 
 import os, sys, re
-from os.path import join, exists
+from os.path import join, exists, dirname, abspath
 import logging
+import shutil
+import tempfile
+import time
+from cStringIO import StringIO
+import threading
+import Queue
 from contextlib import contextmanager
 
 import logging
@@ -153,6 +159,44 @@ class ColumnInfo(object):
     def id_from_name(self, prettyName):
         return self.prettyName_to_attrName.get(prettyName, prettyName)
 
+class ImportResult(object):
+    """Summary of a Database.importFile() run."""
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.rejected = []
+
+    def __repr__(self):
+        return "<ImportResult: rows:%r, rejected:%r, bytes:%r, elapsed:%.2f>" % (
+            self.rows, len(self.rejected), self.bytes, self.elapsed)
+
+class _TimeoutCursor(object):
+    """Cursor proxy cancelling the statements that run longer than timeout
+    seconds."""
+    def __init__(self, cursor, timeout):
+        self._cursor = cursor
+        self._timeout = timeout
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, query, vars=None):
+        return self._cursor.execute(query, vars, timeout=self._timeout)
+
+# The browsing queries don't need a transaction, and can't modify the
+# database by mistake. The read only mode is set by the connection options:
+# set_session(readonly=True) would cost a round trip on every connection.
+_readonly_options = " options='-c default_transaction_read_only=on'"
+
+def _set_readonly(conn):
+    """Put conn, opened with _readonly_options, in autocommit mode."""
+    if hasattr(conn, 'set_isolation_level'):
+        conn.set_isolation_level(0)
+
 class OperationalError(psycopg2.OperationalError):
     pass
 
@@ -165,47 +209,90 @@ class IntegrityError(psycopg2.IntegrityError):
 class Database(dbxlib.CommonDatabase):
     # args should be: host, username=None, password=None, port=None
     handles_prepared_stmts = False
+    # Seconds after which the statements run through connect() are
+    # cancelled; None to wait forever.
+    query_timeout = None
     def __init__(self, args, dbname):
         self.connection = Connection(args, dbname)
         self._init_db()
 
     def _init_db(self):
         self.col_info_from_table_name = {}
+        self._active_conns = []
+        self._active_lock = threading.Lock()
 
     def getConnectionDisplayInfo(self):
         return self.connection.getConnectionDisplayValues()
         
     @contextmanager
-    def connect(self, commit=False, cu=None):
+    def connect(self, commit=False, cu=None, readonly=False):
         """ See dbx_sqlite3.py::connect docstring for full story
         @param commit {bool} 
         @param cu {sqlite3.Cursor}
+        @param readonly {bool} run the statements in a read only autocommit
+            session, for the metadata and browsing queries
         """
         if cu is not None:
             yield cu
         else:
             connStr = self.connection.getConnectionString()
             #log.debug("connStr: %s", connStr)
+            if readonly:
+                connStr += _readonly_options
             try:
                 conn = psycopg2.connect(connStr)
             except Exception, ex:
                 log.exception("Bad connection string of %s", connStr)
                 raise ex
+            if readonly:
+                _set_readonly(conn)
             cu = conn.cursor()
+            if self.query_timeout and hasattr(conn, 'cancel'):
+                cu = _TimeoutCursor(cu, self.query_timeout)
+            self._active_lock.acquire()
+            self._active_conns.append(conn)
+            self._active_lock.release()
             try:
                 yield cu
             finally:
+                self._active_lock.acquire()
+                self._active_conns.remove(conn)
+                self._active_lock.release()
                 if commit:
                     conn.commit()
                 cu.close()
                 conn.close()
 
+    def cancelQuery(self):
+        """Cancel the statements running on the connections opened by
+        connect(), e.g. a runaway custom query; it can be called from any
+        thread. The interrupted statement fails with an OperationalError.
+        Return the number of connections signalled.
+        """
+        self._active_lock.acquire()
+        try:
+            conns = list(self._active_conns)
+        finally:
+            self._active_lock.release()
+        count = 0
+        for conn in conns:
+            try:
+                conn.cancel()
+                count += 1
+            except AttributeError:
+                # The pq4 fallback library has no cancel support.
+                log.warn("cancelQuery: not supported by this psycopg2")
+                break
+            except psycopg2.Error, ex:
+                log.debug("cancelQuery: %s", ex)
+        return count
+
     # get metadata about the database and tables
                 
     def listDatabases(self):
         try:
             query = """select datname from pg_database"""
-            with self.connect() as cu:
+            with self.connect(readonly=True) as cu:
                 cu.execute(query)
                 names = [row[0] for row in cu.fetchall()]
                 return names
@@ -224,7 +311,7 @@ class Database(dbxlib.CommonDatabase):
                        where table_catalog = '%s'
                          and table_type = '%s'
                          and table_schema not in ('pg_catalog', 'information_schema')""" % (dbname, typeName)
-            with self.connect() as cu:
+            with self.connect(readonly=True) as cu:
                 cu.execute(query)
                 names = [row[0] for row in cu.fetchall()]
                 return names
@@ -248,7 +335,7 @@ class Database(dbxlib.CommonDatabase):
             query = ("select column_name from information_schema.columns "
                      + "where table_catalog = '%s' "
                      + " and table_name = '%s'") % (dbname, table_name)
-            with self.connect() as cu:
+            with self.connect(readonly=True) as cu:
                 cu.execute(query)
                 names = [row[0] for row in cu.fetchall()]
                 return names
@@ -257,6 +344,26 @@ class Database(dbxlib.CommonDatabase):
         except psycopg2.DatabaseError, ex:
             raise DatabaseError(ex)
 
+    def listAllColumnNamesByTable(self, dbname):
+        """Return a dict mapping each table of the database to the list of
+        its column names, fetched with a single query."""
+        try:
+            query = """select table_name, column_name
+                       from information_schema.columns
+                       where table_catalog = %s
+                         and table_schema not in ('pg_catalog', 'information_schema')
+                       order by table_name, ordinal_position"""
+            names = {}
+            with self.connect(readonly=True) as cu:
+                cu.execute(query, (dbname,))
+                for table_name, column_name in cu.fetchall():
+                    names.setdefault(table_name, []).append(column_name)
+            return names
+        except psycopg2.OperationalError, ex:
+            raise OperationalError(ex)
+        except psycopg2.DatabaseError, ex:
+            raise DatabaseError(ex)
+
     def listAllTriggerNames(self):
         return self.listAllTablePartsByType(dbname, 'TRIGGER') # TODO: Verify this
 
@@ -284,7 +391,7 @@ class Database(dbxlib.CommonDatabase):
         main_query = """select column_name, data_type, is_nullable, column_default, character_maximum_length
                    from information_schema.columns
                    where table_name='%s' and table_catalog = '%s' ORDER BY ordinal_position""" % (table_name, self.connection.dbname)
-        with self.connect() as cu:
+        with self.connect(readonly=True) as cu:
             cu.execute(index_query)
             for row in cu.fetchall():
                 log.debug("save_table_info: index_query: got row: %s", row)
@@ -352,7 +459,7 @@ class Database(dbxlib.CommonDatabase):
     def getRawRow(self, table_name, key_names, key_values, convert_blob_values=True):
         key_names_str = self._convertAndJoin(key_names, " AND ")
         query = "select * from %s where %s" %  (table_name, key_names_str)
-        with self.connect() as cu:
+        with self.connect(readonly=True) as cu:
             cu.execute(query, key_values)
             row = cu.fetchone()
         str_items = []
@@ -452,6 +559,309 @@ class Database(dbxlib.CommonDatabase):
                 res = False
         return res
 
+    # Bulk import
+
+    def _iterImportRecords(self, f, is_csv):
+        """Yield (line number, record) for each record of the file.
+
+        A CSV record can span several lines when a quoted field contains
+        newlines: a record is complete when it has an even number of quotes.
+        """
+        record = []
+        quotes = 0
+        line_no = 0
+        start_no = 1
+        for line in f:
+            line_no += 1
+            if not is_csv:
+                yield line_no, line
+                continue
+            record.append(line)
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                yield start_no, "".join(record)
+                record = []
+                quotes = 0
+                start_no = line_no + 1
+        if record:
+            # Unterminated quoted field: let the server report it.
+            yield start_no, "".join(record)
+
+    def _copyImportRecords(self, cu, copy_sql, records, result):
+        """Copy the list of (line number, record) into the table, bisecting
+        the list to find the rows that the server refuses."""
+        cu.execute("savepoint dbx_import")
+        try:
+            cu.copy_expert(copy_sql,
+                           StringIO("".join([r for n, r in records])))
+        except psycopg2.OperationalError:
+            raise
+        except psycopg2.DatabaseError, ex:
+            cu.execute("rollback to savepoint dbx_import")
+            if len(records) == 1:
+                result.rejected.append((records[0][0], str(ex).strip()))
+                return
+            half = len(records) // 2
+            self._copyImportRecords(cu, copy_sql, records[:half], result)
+            self._copyImportRecords(cu, copy_sql, records[half:], result)
+        else:
+            cu.execute("release savepoint dbx_import")
+            result.rows += len(records)
+
+    def importFile(self, table_name, path, column_names=None, format='csv',
+                   delimiter=None, header=False, chunk_rows=10000,
+                   commit_chunks=True, progress_callback=None):
+        """Load a CSV (format='csv') or tab separated (format='text') file
+        into the table using COPY.
+
+        The file is streamed in chunks of chunk_rows records; if
+        commit_chunks is true every chunk is committed as soon as it is
+        loaded, else the whole import is a single transaction. A chunk
+        refused by the server is bisected to skip only the bad records,
+        which are reported in the result's 'rejected' list as
+        (line number, error message).
+
+        progress_callback, if given, is called after each chunk as
+        progress_callback(rows, bytes, rows_per_sec, bytes_per_sec).
+        """
+        if ';' in table_name:
+            raise Exception("Unsafe table_name: %s" % (table_name,))
+        if format not in ('csv', 'text'):
+            raise ValueError("Unsupported import format: %r" % (format,))
+        is_csv = format == 'csv'
+        if delimiter is None:
+            delimiter = is_csv and ',' or '\t'
+        if len(delimiter) != 1 or delimiter in "'\\":
+            raise ValueError("Invalid delimiter: %r" % (delimiter,))
+        copy_sql = "copy %s" % table_name
+        if column_names:
+            copy_sql += " (%s)" % ", ".join(column_names)
+        copy_sql += " from stdin with delimiter as '%s'" % delimiter
+        if is_csv:
+            copy_sql += " csv"
+
+        result = ImportResult()
+        start_time = time.time()
+        f = open(path, 'rb')
+        try:
+            with self.connect() as cu:
+                conn = cu.connection
+                records = []
+                num_bytes = 0
+                def flush():
+                    self._copyImportRecords(cu, copy_sql, records, result)
+                    if commit_chunks:
+                        conn.commit()
+                    if progress_callback:
+                        elapsed = max(time.time() - start_time, 1e-6)
+                        processed = result.rows + len(result.rejected)
+                        progress_callback(processed, num_bytes,
+                                          processed / elapsed,
+                                          num_bytes / elapsed)
+                    del records[:]
+
+                records_iter = self._iterImportRecords(f, is_csv)
+                if header:
+                    for line_no, record in records_iter:
+                        num_bytes += len(record)
+                        break
+                for line_no, record in records_iter:
+                    records.append((line_no, record))
+                    num_bytes += len(record)
+                    if len(records) >= chunk_rows:
+                        flush()
+                if records:
+                    flush()
+                conn.commit()
+        except psycopg2.OperationalError, ex:
+            raise OperationalError(ex)
+        except psycopg2.DatabaseError, ex:
+            raise DatabaseError(ex)
+        finally:
+            f.close()
+        result.bytes = num_bytes
+        result.elapsed = time.time() - start_time
+        return result
+
+    # Table export
+
+    def _getExportKey(self, table_name):
+        """Return the name of the column usable to split the table in key
+        ranges: a single-column integer primary key, or None."""
+        key_cols = [c for c in self._save_table_info(table_name)
+                    if c.is_primary_key]
+        if len(key_cols) == 1 and columnTypeIsInteger(key_cols[0].type):
+            return key_cols[0].name
+        return None
+
+    def _getExportRanges(self, cu, table_name, key_name, num_parts):
+        """Return a list of WHERE conditions splitting the table in up to
+        num_parts disjoint ranges covering all of its rows."""
+        if key_name:
+            cu.execute("select min(%s), max(%s) from %s"
+                       % (key_name, key_name, table_name))
+            low, high = cu.fetchone()
+            if low is None:
+                return ["true"]
+            step = max(1, (high - low + num_parts) // num_parts)
+            return ["%s between %d and %d" % (key_name, start,
+                                              min(start + step - 1, high))
+                    for start in range(low, high + 1, step)]
+        # No usable key: split by physical block ranges.  Before PostgreSQL
+        # 14 a ctid range can't be scanned without reading the whole table,
+        # so every worker would scan all of it: use a single scan instead.
+        if cu.connection.server_version < 140000:
+            return ["true"]
+        cu.execute("select pg_relation_size(%s) / "
+                   "current_setting('block_size')::int", (table_name,))
+        num_blocks = cu.fetchone()[0]
+        step = max(1, (num_blocks + num_parts) // num_parts)
+        conditions = []
+        for start in range(0, num_blocks, step):
+            cond = "ctid >= '(%d,0)'::tid" % start
+            if start + step < num_blocks:
+                cond += " and ctid < '(%d,0)'::tid" % (start + step)
+            conditions.append(cond)
+        return conditions or ["true"]
+
+    def _beginExportTransaction(self, cu, snapshot=None):
+        """Start a repeatable read transaction, importing the given
+        snapshot if any."""
+        if cu.connection.server_version >= 90100:
+            cu.execute("set transaction isolation level repeatable read")
+        if snapshot:
+            cu.execute("set transaction snapshot %s", (snapshot,))
+
+    def exportTable(self, table_name, path, num_workers=None, header=True,
+                    delimiter=','):
+        """Export the table to the CSV file at path.
+
+        The table is split in ranges of its integer primary key (or of
+        physical blocks when there's no such key, on PostgreSQL 14 and
+        later, else it is copied in a single part) and the ranges are copied
+        concurrently on num_workers connections, all sharing the same
+        snapshot (on PostgreSQL 9.2 and later), then the parts are joined
+        together.  Return the number of ranges exported.
+        """
+        if ';' in table_name:
+            raise Exception("Unsafe table_name: %s" % (table_name,))
+        if num_workers is None:
+            try:
+                import multiprocessing
+                num_workers = min(8, multiprocessing.cpu_count())
+            except (ImportError, NotImplementedError):
+                num_workers = 4
+        num_workers = max(1, num_workers)
+        col_names = [c.name for c in self._save_table_info(table_name)]
+        key_name = self._getExportKey(table_name)
+        connStr = self.connection.getConnectionString()
+        from psycopg2.pool import ThreadedConnectionPool
+        pool = ThreadedConnectionPool(0, num_workers + 1, connStr)
+        part_paths = []
+        try:
+            # The master transaction holds the snapshot until all the
+            # workers have imported it.
+            master = pool.getconn()
+            cu = master.cursor()
+            self._beginExportTransaction(cu)
+            snapshot = None
+            if master.server_version >= 90200:
+                cu.execute("select pg_export_snapshot()")
+                snapshot = cu.fetchone()[0]
+            elif num_workers > 1:
+                log.warn("exportTable: server can't share snapshots, the "
+                         "parts of %s may be inconsistent", table_name)
+            conditions = self._getExportRanges(cu, table_name, key_name,
+                                               num_workers * 2)
+            if len(conditions) < num_workers:
+                num_workers = len(conditions)
+
+            out_dir = dirname(abspath(path))
+            tasks = Queue.Queue()
+            for i, condition in enumerate(conditions):
+                fd, part_path = tempfile.mkstemp(prefix='.export-',
+                                                 dir=out_dir)
+                os.close(fd)
+                part_paths.append(part_path)
+                tasks.put((i, condition, part_path))
+            errors = []
+            ready = threading.Semaphore(0)
+
+            def worker():
+                try:
+                    conn = pool.getconn()
+                except Exception, ex:
+                    errors.append(ex)
+                    ready.release()
+                    return
+                try:
+                    try:
+                        wcu = conn.cursor()
+                        self._beginExportTransaction(wcu, snapshot)
+                    finally:
+                        ready.release()
+                    while not errors:
+                        try:
+                            i, condition, part_path = tasks.get_nowait()
+                        except Queue.Empty:
+                            break
+                        options = "with delimiter as '%s' csv" % delimiter
+                        if header and i == 0:
+                            options += " header"
+                        order = key_name and (" order by %s" % key_name) or ""
+                        query = ("copy (select %s from %s where %s%s) "
+                                 "to stdout %s" % (", ".join(col_names),
+                                 table_name, condition, order, options))
+                        f = open(part_path, 'wb')
+                        try:
+                            wcu.copy_expert(query, f)
+                        finally:
+                            f.close()
+                except Exception, ex:
+                    log.exception("exportTable: worker failed")
+                    errors.append(ex)
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    # don't mask the error that broke the connection
+                    pool.putconn(conn, close=True)
+                else:
+                    pool.putconn(conn)
+
+            threads = [threading.Thread(target=worker)
+                       for i in range(num_workers)]
+            for t in threads:
+                t.setDaemon(True)
+                t.start()
+            # Release the snapshot only once every worker has imported it.
+            for t in threads:
+                ready.acquire()
+            master.rollback()
+            pool.putconn(master)
+            for t in threads:
+                t.join()
+            if errors:
+                raise errors[0]
+
+            f = open(path, 'wb')
+            try:
+                for part_path in part_paths:
+                    part = open(part_path, 'rb')
+                    try:
+                        shutil.copyfileobj(part, f, 1024 * 1024)
+                    finally:
+                        part.close()
+            finally:
+                f.close()
+            return len(conditions)
+        finally:
+            for part_path in part_paths:
+                try:
+                    os.unlink(part_path)
+                except OSError:
+                    pass
+            pool.closeall()
+
     def getIndexInfo(self, indexName, res):
         XXX # Implement!
         
@@ -21,6 +21,8 @@ ALLOWED_PSYCOPG_VERSIONS = ('2.0.14',)
 import sys
 import time
 import db
+import pool
+import cache
 import re
 
 import Acquisition
@@ -73,6 +75,16 @@ class Connection(Shared.DC.ZRDB.Connection.Connection):
     meta_type = title = 'Z Psycopg 2 Database Connection'
     icon              = 'misc_/conn'
 
+    # size of the connections pool, shared by the DAs with the same
+    # connection string
+    pool_minconn = pool.DEFAULT_MINCONN
+    pool_maxconn = pool.DEFAULT_MAXCONN
+
+    # results cache of the read-only queries, disabled if the size is 0
+    cache_size = 0
+    cache_ttl = 60
+    cache_channels = ''
+
     def __init__(self, id, title, connection_string,
                  zdatetime, check=None, tilevel=2, encoding='UTF-8'):
         self.zdatetime = zdatetime
@@ -119,11 +131,15 @@ class Connection(Shared.DC.ZRDB.Connection.Connection):
                               psycopg2.__version__)
 
         self._v_connected = ''
+        pool.setpoolsize(self.connection_string,
+            self.pool_minconn, self.pool_maxconn)
         dbf = self.factory()
         
         # TODO: let the psycopg exception propagate, or not?
         self._v_database_connection = dbf(
-            self.connection_string, self.tilevel, self.get_type_casts(), self.encoding)
+            self.connection_string, self.tilevel, self.get_type_casts(), self.encoding,
+            cache=cache.getcache(self.connection_string, self.cache_size,
+                self.cache_ttl, self.cache_channels.split()))
         self._v_database_connection.open()
         self._v_connected = DateTime()
 
@@ -136,9 +152,53 @@ class Connection(Shared.DC.ZRDB.Connection.Connection):
         else:
             return DATETIME, DATE, TIME
 
+    ## connections pool ##
+
+    manage_pool = HTMLFile('dtml/pool', globals())
+
+    def manage_editPool(self, pool_minconn, pool_maxconn, REQUEST=None):
+        """Change the size of the connections pool."""
+        if pool_minconn < 0 or pool_maxconn < max(pool_minconn, 1):
+            raise ValueError("bad pool size: %d-%d"
+                % (pool_minconn, pool_maxconn))
+        self.pool_minconn = pool_minconn
+        self.pool_maxconn = pool_maxconn
+        pool.setpoolsize(self.connection_string, pool_minconn, pool_maxconn)
+        if REQUEST is not None:
+            msg = "Pool size changed."
+            return self.manage_pool(self, REQUEST, manage_tabs_message=msg)
+
+    def manage_editCache(self, cache_size, cache_ttl, cache_channels='',
+                         REQUEST=None):
+        """Change the settings of the results cache."""
+        if cache_size < 0 or cache_ttl <= 0:
+            raise ValueError("bad cache settings: size %d, ttl %d"
+                % (cache_size, cache_ttl))
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache_channels = ' '.join(cache_channels.split())
+        # the new settings are used by the next database connection
+        self.connect(self.connection_string)
+        if REQUEST is not None:
+            msg = "Cache settings changed."
+            return self.manage_pool(self, REQUEST, manage_tabs_message=msg)
+
+    def cache_stats(self):
+        """Return the statistics of the results cache, None if disabled."""
+        dbc = getattr(self, '_v_database_connection', None)
+        c = getattr(dbc, 'cache', None)
+        if c is not None:
+            return c.stats()
+
+    def pool_stats(self):
+        """Return the statistics of the connections pool, None if the
+        pool has not been created yet."""
+        return pool.getstats(self.connection_string)
+
     ## browsing and table/column management ##
 
-    manage_options = Shared.DC.ZRDB.Connection.Connection.manage_options
+    manage_options = Shared.DC.ZRDB.Connection.Connection.manage_options + (
+        {'label': 'Pool', 'action': 'manage_pool'},)
     # + (
     #    {'label': 'Browse', 'action':'manage_browse'},)
 
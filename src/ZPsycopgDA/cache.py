@@ -0,0 +1,189 @@
+# ZPsycopgDA/cache.py - ZPsycopgDA Zope product: query results cache
+#
+# psycopg2 is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# psycopg2 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+
+# The results of the read-only queries can be cached, one cache for each
+# connection string. The entries expire after a time to live and the least
+# recently used ones are dropped when the cache is full. If table-change
+# channels are configured, a NOTIFY on a channel drops the entries whose
+# query contains the channel name (the table triggers are expected to notify
+# a channel named as the table) and the ones mentioning no channel.
+
+import re
+import time
+import threading
+
+import psycopg2
+import psycopg2.extras
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+# quoted literals and identifiers, whose whitespace is significant
+_re_quoted = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_re_spaces = re.compile(r"\s+")
+# queries that may modify the database even if they start with SELECT
+_re_writes = re.compile(r"\b(into|for\s+update|for\s+share|nextval|setval)\b")
+
+
+def normalize(query):
+    """Collapse the whitespace of a query, outside of the quoted strings."""
+    parts = _re_quoted.split(query.strip())
+    for i in range(0, len(parts), 2):
+        parts[i] = _re_spaces.sub(' ', parts[i])
+    return ''.join(parts)
+
+def cacheable(query):
+    """Return True if the normalized query only reads the database."""
+    query = query.lower()
+    return query.startswith('select ') and not _re_writes.search(query)
+
+
+class ResultCache(object):
+    """A thread-safe LRU cache of query results with time to live."""
+
+    def __init__(self, dsn, maxsize, ttl, channels=()):
+        self.dsn = dsn
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.channels = tuple(channels)
+        self.hits = self.misses = 0
+        # incremented by every invalidation: a result read before an
+        # invalidation and stored after it would be stale
+        self.generation = 0
+
+        self._lock = threading.Lock()
+        self._entries = {} # key -> link
+        # circular doubly linked list of [prev, next, key, value, expires,
+        # channels] links, the most recently used first
+        self._root = root = [None, None, None, None, None, None]
+        root[0] = root[1] = root
+
+        self._dispatcher = None
+        if self.channels:
+            self._listen()
+
+    def _listen(self):
+        conn = psycopg2.connect(self.dsn)
+        self._dispatcher = psycopg2.extras.NotifyDispatcher(conn)
+        for channel in self.channels:
+            self._dispatcher.listen(channel, self._notified)
+        self._dispatcher.start()
+
+    def _notified(self, pid, channel, payload):
+        self.invalidate(channel)
+
+    def _valid(self):
+        """Return False if the invalidations may have been missed."""
+        return self._dispatcher is None or not self._dispatcher.conn.closed
+
+    def get(self, key):
+        """Return the value cached for key, None if missing or expired."""
+        self._lock.acquire()
+        try:
+            link = self._entries.get(key)
+            if link is None or link[4] < time.time() or not self._valid():
+                if link is not None:
+                    self._unlink(link)
+                self.misses += 1
+                return None
+            # move it to the front
+            self._unlink(link)
+            self._link(link)
+            self.hits += 1
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def put(self, key, value, query, generation):
+        """Cache value for key; query tells the channels it depends on.
+
+        The value is not stored if the cache was invalidated after
+        'generation' was read.
+        """
+        lquery = query.lower()
+        channels = [c for c in self.channels
+            if re.search(r'\b%s\b' % re.escape(c.lower()), lquery)]
+        self._lock.acquire()
+        try:
+            if generation != self.generation or not self._valid():
+                return
+            link = self._entries.get(key)
+            if link is not None:
+                self._unlink(link)
+            while len(self._entries) >= self.maxsize:
+                self._unlink(self._root[0])
+            self._link([None, None, key, value, time.time() + self.ttl,
+                channels])
+        finally:
+            self._lock.release()
+
+    def invalidate(self, channel=None):
+        """Drop the entries depending on channel; all of them if None."""
+        self._lock.acquire()
+        try:
+            self.generation += 1
+            if channel is None:
+                self._entries.clear()
+                self._root[0] = self._root[1] = self._root
+                return
+            for link in self._entries.values():
+                if not link[5] or channel in link[5]:
+                    self._unlink(link)
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dict with the cache size and the hits and misses."""
+        return {'size': len(self._entries), 'maxsize': self.maxsize,
+            'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        """Drop all the entries and stop listening to the notifications."""
+        self.invalidate()
+        if self._dispatcher is not None:
+            self._dispatcher.close()
+            self._dispatcher = None
+
+    def _link(self, link):
+        root = self._root
+        link[0] = root
+        link[1] = root[1]
+        root[1][0] = link
+        root[1] = link
+        self._entries[link[2]] = link
+
+    def _unlink(self, link):
+        link[0][1] = link[1]
+        link[1][0] = link[0]
+        del self._entries[link[2]]
+
+
+def getcache(dsn, maxsize, ttl, channels=()):
+    """Return the cache for 'dsn', replacing it if the settings changed.
+
+    Return None if maxsize is 0: the cache is disabled.
+    """
+    _caches_lock.acquire()
+    try:
+        cache = _caches.get(dsn)
+        if cache is not None and (cache.maxsize, cache.ttl, cache.channels) \
+                == (maxsize, ttl, tuple(channels)):
+            return cache
+        if cache is not None:
+            del _caches[dsn]
+            cache.close()
+        if not maxsize:
+            return None
+        cache = _caches[dsn] = ResultCache(dsn, maxsize, ttl, channels)
+        return cache
+    finally:
+        _caches_lock.release()
@@ -22,10 +22,12 @@ from ZODB.POSException import ConflictError
 
 import site
 import pool
+import cache
 
 import psycopg2
 from psycopg2.extensions import INTEGER, LONGINTEGER, FLOAT, BOOLEAN, DATE, TIME
 from psycopg2.extensions import TransactionRollbackError, register_type
+from psycopg2.extensions import TRANSACTION_STATUS_UNKNOWN
 from psycopg2 import NUMBER, STRING, ROWID, DATETIME 
 
 
@@ -35,21 +37,29 @@ class DB(TM, dbi_db.DB):
     
     _p_oid = _p_changed = _registered = None
 
-    def __init__(self, dsn, tilevel, typecasts, enc='utf-8'):
+    def __init__(self, dsn, tilevel, typecasts, enc='utf-8', cache=None):
         self.dsn = dsn
+        self.cache = cache
         self.tilevel = tilevel
         self.typecasts = typecasts
         self.encoding = enc
+        # the settings applied to the connections: the typecasts are
+        # module-level objects, identified by their id
+        self._setup = (int(tilevel), enc, tuple([id(tc) for tc in typecasts]))
         self.failures = 0
         self.calls = 0
         self.make_mappings()
                         
     def getconn(self, create=True):
         conn = pool.getconn(self.dsn)
-        conn.set_isolation_level(int(self.tilevel))
-        conn.set_client_encoding(self.encoding)
-        for tc in self.typecasts:
-            register_type(tc, conn)
+        # configure the connection only the first time we get it, or if it
+        # was used last by a DA with different settings
+        if conn.zda_setup != self._setup:
+            conn.set_isolation_level(int(self.tilevel))
+            conn.set_client_encoding(self.encoding)
+            for tc in self.typecasts:
+                register_type(tc, conn)
+            conn.zda_setup = self._setup
         return conn
 
     def putconn(self, close=False):
@@ -67,6 +77,11 @@ class DB(TM, dbi_db.DB):
         try:
             conn = self.getconn(False)
             conn.commit()
+            if conn.zda_wrote:
+                # our own changes don't wait for the notifications
+                conn.zda_wrote = False
+                if self.cache is not None:
+                    self.cache.invalidate()
             self.putconn()
         except AttributeError:
             pass
@@ -75,6 +90,7 @@ class DB(TM, dbi_db.DB):
         try:
             conn = self.getconn(False)
             conn.rollback()
+            conn.zda_wrote = False
             self.putconn()
         except AttributeError:
             pass
@@ -150,10 +166,49 @@ class DB(TM, dbi_db.DB):
     
     ## query execution ##
 
+    def _cachekey(self, query_string, max_rows, query_data):
+        """Return the key of a query in the results cache.
+
+        Return None if the query can't be cached.
+        """
+        queries = [x for x in query_string.split('\0') if x]
+        if len(queries) != 1:
+            return None
+        query = cache.normalize(queries[0])
+        if not cache.cacheable(query):
+            return None
+        if isinstance(query_data, dict):
+            query_data = query_data.items()
+            query_data.sort()
+        if query_data:
+            query_data = tuple(query_data)
+        key = (self._setup, query, max_rows, query_data)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
     def query(self, query_string, max_rows=None, query_data=None):
         self._register()
         self.calls = self.calls+1
 
+        key = None
+        if self.cache is not None:
+            conn = self.getconn()
+            key = self._cachekey(query_string, max_rows, query_data)
+            if key is None:
+                # it may change the database: until the end of the
+                # transaction the cache would hide the changes
+                conn.zda_wrote = True
+            elif conn.zda_wrote:
+                key = None
+            else:
+                generation = self.cache.generation
+                rv = self.cache.get(key)
+                if rv is not None:
+                    return [dict(d) for d in rv[0]], list(rv[1])
+
         desc = ()
         res = []
         nselects = 0
@@ -172,13 +227,18 @@ class DB(TM, dbi_db.DB):
                     #logging.debug("Serialization Error, retrying transaction", exc_info=True)
                     raise ConflictError("TransactionRollbackError from psycopg2")
                 except psycopg2.OperationalError:
-                    #logging.exception("Operational error on connection, closing it.")
-                    try:
-                        # Only close our connection
-                        self.putconn(True)
-                    except:
-                        #logging.debug("Something went wrong when we tried to close the pool", exc_info=True)
-                        pass
+                    # Only close our connection, and only if it is broken: a
+                    # healthy one is rolled back by _abort() and reused
+                    conn = c.connection
+                    if conn.closed or conn.get_transaction_status() \
+                            == TRANSACTION_STATUS_UNKNOWN:
+                        #logging.exception("Operational error on connection, closing it.")
+                        try:
+                            self.putconn(True)
+                        except:
+                            #logging.debug("Something went wrong when we tried to close the pool", exc_info=True)
+                            pass
+                    raise
                 if c.description is not None:
                     nselects += 1
                     if c.description != desc and nselects > 1:
@@ -194,5 +254,10 @@ class DB(TM, dbi_db.DB):
         except StandardError, err:
             self._abort()
             raise err
+
+        desc = self.convert_description(desc)
+        if key is not None:
+            self.cache.put(key, (desc, res), key[1], generation)
+            return [dict(d) for d in desc], list(res)
         
-        return self.convert_description(desc), res
+        return desc, res
@@ -16,29 +16,81 @@
 # their work without bothering about the module dependencies.
 
 # All the connections are held in a pool of pools, directly accessible by the
-# ZPsycopgDA code in db.py.
+# ZPsycopgDA code in db.py. The connections put back are rolled back by the
+# pool if needed and reused: only the broken ones are closed.
 
 import threading
 import psycopg2.pool
+import psycopg2.extensions
+
+
+class ZConnection(psycopg2.extensions.connection):
+    """A connection remembering the DA settings it was configured with."""
+
+    zda_setup = None
+    zda_wrote = False   # True if the transaction changed the database
+
+    def reset(self, *args, **kwargs):
+        # the reset drops the encoding set by the DA
+        self.zda_setup = None
+        return super(ZConnection, self).reset(*args, **kwargs)
+
+
+# The registry is read without locking: a dict lookup is atomic, and the
+# lock is only taken to create or remove a pool, or to change its size.
+
+DEFAULT_MINCONN = 4
+DEFAULT_MAXCONN = 200
 
 _connections_pool = {}
+_connections_sizes = {}
 _connections_lock = threading.Lock()
 
 def getpool(dsn, create=True):
+    """Return the pool for 'dsn'; None if missing and 'create' is false."""
+    # look it up only once: a concurrent flushpool() may remove it
+    pool = _connections_pool.get(dsn)
+    if pool is not None or not create:
+        return pool
+
     _connections_lock.acquire()
     try:
-        if not _connections_pool.has_key(dsn) and create:
-            _connections_pool[dsn] = \
-                psycopg2.pool.PersistentConnectionPool(4, 200, dsn)
+        # another thread may have created it in the meantime
+        pool = _connections_pool.get(dsn)
+        if pool is None:
+            minconn, maxconn = _connections_sizes.get(dsn,
+                (DEFAULT_MINCONN, DEFAULT_MAXCONN))
+            pool = _connections_pool[dsn] = \
+                psycopg2.pool.PersistentConnectionPool(minconn, maxconn, dsn,
+                    reset='rollback', connection_factory=ZConnection)
     finally:
         _connections_lock.release()
-    return _connections_pool[dsn]
+    return pool
+
+def setpoolsize(dsn, minconn, maxconn):
+    """Set the size of the pool for 'dsn', even if it already exists."""
+    _connections_lock.acquire()
+    try:
+        _connections_sizes[dsn] = (minconn, maxconn)
+        pool = _connections_pool.get(dsn)
+        if pool is not None:
+            pool.minconn = minconn
+            pool.maxconn = maxconn
+    finally:
+        _connections_lock.release()
+
+def getstats(dsn):
+    """Return the statistics of the pool for 'dsn', None if there is none."""
+    pool = _connections_pool.get(dsn)
+    if pool is None:
+        return None
+    return pool.stats()
 
 def flushpool(dsn):
     _connections_lock.acquire()
     try:
-        _connections_pool[dsn].closeall()
-        del _connections_pool[dsn]
+        # unregister it first, so that no thread looks up a closed pool
+        _connections_pool.pop(dsn).closeall()
     finally:
         _connections_lock.release()
         
@@ -0,0 +1,310 @@
+"""Event loop integration for psycopg2
+
+This module drives asynchronous queries (see `cursor.execute()` with
+`async=1`) from an event loop exposing the asyncio__ API, registering the
+connection socket with `!add_reader()`/`!add_writer()`: a single thread can
+run queries on many connections concurrently. Under Python 2 the trollius__
+backport of asyncio can be used.
+
+.. __: http://docs.python.org/3/library/asyncio.html
+.. __: https://pypi.python.org/pypi/trollius
+"""
+# psycopg/aio.py - event loop integration
+#
+# psycopg2 is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders give
+# permission to link this program with the OpenSSL library (or with
+# modified versions of OpenSSL that use the same license as OpenSSL),
+# and distribute linked combinations including the two.
+#
+# You must obey the GNU Lesser General Public License in all respects for
+# all of the code used other than OpenSSL.
+#
+# psycopg2 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
+# License for more details.
+
+try:
+    from collections import deque
+except ImportError:
+    deque = None
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+import psycopg2
+from psycopg2 import extensions as _ext
+
+
+def _get_loop(loop):
+    if asyncio is None:
+        raise ImportError("asyncio (or trollius) is required by psycopg2.aio")
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    return loop
+
+def _new_future(loop):
+    if hasattr(loop, 'create_future'):
+        return loop.create_future()
+    return asyncio.Future(loop=loop)
+
+def _call(loop, func, *args):
+    """Call func(*args) and return a future with the result."""
+    future = _new_future(loop)
+    try:
+        future.set_result(func(*args))
+    except Exception, exc:
+        future.set_exception(exc)
+    return future
+
+
+def aconnect(dsn=None, loop=None, connection_factory=None, **kwargs):
+    """Open a connection and return a future resolving to an
+    `AsyncConnection`.
+
+    The arguments are the same of `psycopg2.connect()`; the connection is
+    started with the `!async` parameter and established by the loop,
+    calling `~connection.poll()` when the socket is ready.
+    """
+    loop = _get_loop(loop)
+    result = _new_future(loop)
+
+    kwargs['async'] = 1
+    if connection_factory is not None:
+        kwargs['connection_factory'] = connection_factory
+    try:
+        if dsn is not None:
+            conn = psycopg2.connect(dsn, **kwargs)
+        else:
+            conn = psycopg2.connect(**kwargs)
+    except Exception, exc:
+        result.set_exception(exc)
+        return result
+
+    # libpq may open a new socket while connecting, e.g. retrying without SSL
+    state = {'fd': None, 'writing': False}
+
+    def unwatch():
+        if state['fd'] is not None:
+            if state['writing']:
+                loop.remove_writer(state['fd'])
+            else:
+                loop.remove_reader(state['fd'])
+            state['fd'] = None
+
+    def poll():
+        unwatch()
+        if result.cancelled():
+            conn.close()
+            return
+        try:
+            ready = conn.poll()
+            if ready == _ext.POLL_OK:
+                result.set_result(AsyncConnection(conn, loop))
+                return
+            state['fd'] = conn.fileno()
+        except Exception, exc:
+            # a failed poll() already closed the connection
+            if not conn.closed:
+                conn.close()
+            result.set_exception(exc)
+            return
+        state['writing'] = ready == _ext.POLL_WRITE
+        if state['writing']:
+            loop.add_writer(state['fd'], poll)
+        else:
+            loop.add_reader(state['fd'], poll)
+
+    poll()
+    return result
+
+
+class AsyncConnection(object):
+    """Wrap a `connection` to be used from an event loop.
+
+    The connection can run a single query at time: the operations requested
+    while a query is running are queued and executed in order. The
+    operations that can't be performed without blocking (beginning a
+    transaction, :sql:`COPY`, commit and rollback) are run in the loop
+    default executor. Use the autocommit isolation level to avoid the
+    implicit :sql:`BEGIN` before the first query of each transaction.
+    """
+
+    def __init__(self, conn, loop=None):
+        self.connection = conn
+        self.loop = _get_loop(loop)
+        self._pending = deque()
+        self._busy = False
+
+    def __getattr__(self, attr):
+        return getattr(self.connection, attr)
+
+    def cursor(self, *args, **kwargs):
+        """Return a new `AsyncCursor` on the connection."""
+        return AsyncCursor(self, self.connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        """Commit the current transaction; return a future."""
+        return self._submit(self._run_in_executor, self.connection.commit)
+
+    def rollback(self):
+        """Roll back the current transaction; return a future."""
+        return self._submit(self._run_in_executor, self.connection.rollback)
+
+    def close(self):
+        """Close the connection."""
+        self.connection.close()
+
+    # operations scheduling
+
+    def _submit(self, operation, *args):
+        """Schedule operation(future, done, *args) to run when the
+        connection is free.
+
+        The operation must call done() when the connection can be used
+        again, which may happen after the future is resolved.
+        """
+        future = _new_future(self.loop)
+        self._pending.append((operation, future, args))
+        if not self._busy:
+            self._run_next()
+        return future
+
+    def _run_next(self):
+        while self._pending and not self._busy:
+            operation, future, args = self._pending.popleft()
+            if future.cancelled():
+                continue
+            self._busy = True
+            try:
+                operation(future, self._done, *args)
+            except Exception, exc:
+                self._busy = False
+                if not future.done():
+                    future.set_exception(exc)
+
+    def _done(self):
+        self._busy = False
+        self._run_next()
+
+    def _run_in_executor(self, future, done, func, *args):
+        def finished(f):
+            done()
+            if future.cancelled():
+                return
+            if f.exception() is not None:
+                future.set_exception(f.exception())
+            else:
+                future.set_result(f.result())
+        self.loop.run_in_executor(None, func, *args).add_done_callback(
+            finished)
+
+    def _wait_result(self, future, done, curs, result):
+        """Wait on the socket for the result of the async query on curs."""
+        loop = self.loop
+        fd = self.connection.fileno()
+        state = {'writing': False}
+
+        def finish(exc=None):
+            loop.remove_reader(fd)
+            if state['writing']:
+                loop.remove_writer(fd)
+            done()
+            if future.cancelled():
+                return
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+        def writable():
+            try:
+                if self.connection.flush():
+                    loop.remove_writer(fd)
+                    state['writing'] = False
+            except Exception, exc:
+                finish(exc)
+
+        def readable():
+            try:
+                if curs.isready():
+                    finish()
+            except Exception, exc:
+                finish(exc)
+
+        # the query may be too large to be sent at once
+        if not self.connection.flush():
+            state['writing'] = True
+            loop.add_writer(fd, writable)
+        loop.add_reader(fd, readable)
+
+    def _execute(self, future, done, curs, result, query, vars):
+        conn = self.connection
+        if conn.isolation_level != _ext.ISOLATION_LEVEL_AUTOCOMMIT \
+                and conn.status == _ext.STATUS_READY:
+            # execute() will send a blocking BEGIN first
+            def sent(f):
+                if f.exception() is not None:
+                    done()
+                    if not future.cancelled():
+                        future.set_exception(f.exception())
+                else:
+                    self._wait_result(future, done, curs, result)
+            self.loop.run_in_executor(None, curs.execute, query, vars, 1
+                ).add_done_callback(sent)
+        else:
+            curs.execute(query, vars, 1)
+            self._wait_result(future, done, curs, result)
+
+
+class AsyncCursor(object):
+    """Wrap a `cursor` to be used from an event loop.
+
+    `execute()` and `copy_expert()` return futures. The fetch methods also
+    return futures (already resolved, as the data is available once the
+    query has completed) so that all the methods can be waited on uniformly.
+    """
+
+    def __init__(self, conn, cursor):
+        self.connection = conn
+        self.cursor = cursor
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def execute(self, query, vars=None):
+        """Execute a query; return a future resolving to the cursor."""
+        return self.connection._submit(self.connection._execute,
+            self.cursor, self, query, vars)
+
+    def fetchone(self):
+        return _call(self.connection.loop, self.cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.cursor.arraysize
+        return _call(self.connection.loop, self.cursor.fetchmany, size)
+
+    def fetchall(self):
+        return _call(self.connection.loop, self.cursor.fetchall)
+
+    def copy_expert(self, sql, file, size=8192):
+        """Run a :sql:`COPY` statement in the executor; return a future."""
+        return self.connection._submit(self.connection._run_in_executor,
+            self.cursor.copy_expert, sql, file, size)
+
+    def close(self):
+        self.cursor.close()
+
+
+__all__ = filter(lambda k: not k.startswith('_'), locals().keys())
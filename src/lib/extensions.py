@@ -48,12 +48,13 @@ except:
 try:
     from _psycopg import DateFromPy, TimeFromPy, TimestampFromPy
     from _psycopg import IntervalFromPy
+    from _psycopg import PYDATE, PYTIME, PYDATETIME, PYINTERVAL
 except:
     pass
 
 from _psycopg import adapt, adapters, encodings, connection, cursor, lobject
 from _psycopg import string_types, binary_types, new_type, register_type
-from _psycopg import ISQLQuote
+from _psycopg import ISQLQuote, Notify
 
 from _psycopg import QueryCanceledError, TransactionRollbackError
 
@@ -72,6 +73,7 @@ STATUS_READY    = 1
 STATUS_BEGIN    = 2
 STATUS_SYNC     = 3
 STATUS_ASYNC    = 4
+STATUS_CONNECTING = 5
 
 # This is a usefull mnemonic to check if the connection is in a transaction
 STATUS_IN_TRANSACTION = STATUS_BEGIN
@@ -83,6 +85,11 @@ TRANSACTION_STATUS_INTRANS = 2
 TRANSACTION_STATUS_INERROR = 3
 TRANSACTION_STATUS_UNKNOWN = 4
 
+"""Values returned by connection.poll()."""
+POLL_OK    = 0
+POLL_READ  = 1
+POLL_WRITE = 2
+
 def register_adapter(typ, callable):
     """Register 'callable' as an ISQLQuote adapter for type 'typ'."""
     adapters[(typ, ISQLQuote)] = callable
@@ -27,14 +27,32 @@ and classes untill a better place in the distribution is found.
 
 import os
 import time
+import struct
+import datetime
 import re as regex
+import random as _random
+import sys as _sys
+import errno as _errno
+import select as _select
+import Queue as _Queue
+import traceback as _traceback
+
+try:
+    import threading as _threading
+except ImportError:
+    _threading = None
+
+try:
+    from decimal import Decimal
+except ImportError:
+    Decimal = None
 
 try:
     import logging
 except:
     logging = None
 
-from psycopg2 import DATETIME, DataError
+from psycopg2 import DATETIME, DataError, NotSupportedError
 from psycopg2 import extensions as _ext
 from psycopg2.extensions import cursor as _cursor
 from psycopg2.extensions import connection as _connection
@@ -484,4 +502,712 @@ def register_tstz_w_secs(oids=None, conn_or_curs=None):
     return _ext.TSTZ_W_SECS
 
 
+
+# binary COPY format support
+
+_COPY_SIGNATURE = 'PGCOPY\n\377\r\n\0'
+_COPY_HEADER = _COPY_SIGNATURE + struct.pack('!ii', 0, 0)
+_COPY_TRAILER = struct.pack('!h', -1)
+
+# PostgreSQL binary epoch and infinity markers for date/time values
+_PG_EPOCH_DATE = datetime.date(2000, 1, 1)
+_PG_EPOCH_DATETIME = datetime.datetime(2000, 1, 1)
+_PG_DATE_INFINITY = 0x7FFFFFFF
+_PG_TIMESTAMP_INFINITY = 0x7FFFFFFFFFFFFFFFL
+
+# types whose binary representation is the same as the text one: the value
+# is passed through the registered typecaster (if any) for the oid
+_TEXT_OIDS = (18, 19, 25, 114, 142, 705, 1042, 1043)
+
+def _decode_struct(fmt):
+    return lambda data, reader: struct.unpack(fmt, data)[0]
+
+def _decode_bool(data, reader):
+    return data != '\0'
+
+def _decode_bytea(data, reader):
+    return buffer(data)
+
+def _decode_date(data, reader):
+    days = struct.unpack('!i', data)[0]
+    if days == _PG_DATE_INFINITY:
+        return datetime.date.max
+    elif days == -_PG_DATE_INFINITY - 1:
+        return datetime.date.min
+    return _PG_EPOCH_DATE + datetime.timedelta(days)
+
+def _decode_timestamp(data, reader, tz=False):
+    usecs = struct.unpack('!q', data)[0]
+    if usecs == _PG_TIMESTAMP_INFINITY:
+        return datetime.datetime.max
+    elif usecs == -_PG_TIMESTAMP_INFINITY - 1:
+        return datetime.datetime.min
+    value = _PG_EPOCH_DATETIME + datetime.timedelta(microseconds=usecs)
+    if tz:
+        value = value.replace(tzinfo=reader.tzinfo_factory(0))
+    return value
+
+def _decode_timestamptz(data, reader):
+    return _decode_timestamp(data, reader, True)
+
+def _decode_time(data, reader):
+    usecs = struct.unpack('!q', data)[0]
+    secs, usecs = divmod(usecs, 1000000)
+    mins, secs = divmod(secs, 60)
+    hours, mins = divmod(mins, 60)
+    return datetime.time(hours, mins, secs, usecs)
+
+def _decode_interval(data, reader):
+    usecs, days, months = struct.unpack('!qii', data)
+    # months are approximated as 30 days, as the text typecaster does
+    return datetime.timedelta(days + months * 30, 0, usecs)
+
+def _decode_numeric(data, reader):
+    ndigits, weight, sign, dscale = struct.unpack('!hhHH', data[:8])
+    if sign == 0xC000:
+        return Decimal('NaN')
+    # PostgreSQL 14 numeric infinities
+    if sign == 0xD000:
+        return Decimal('Infinity')
+    if sign == 0xF000:
+        return Decimal('-Infinity')
+    digits = ''.join(['%04d' % d for d in
+        struct.unpack('!%dH' % ndigits, data[8:8 + ndigits * 2])])
+    exp = (weight - ndigits + 1) * 4
+    if exp > -dscale:
+        digits += '0' * (exp + dscale)
+    elif exp < -dscale:
+        digits = digits[:len(digits) + exp + dscale]
+    digits = digits.lstrip('0') or '0'
+    return Decimal(((sign == 0x4000 and 1 or 0),
+                    tuple(map(int, digits)), -dscale))
+
+_BINARY_DECODERS = {
+    16: _decode_bool,
+    17: _decode_bytea,
+    20: _decode_struct('!q'),
+    21: _decode_struct('!h'),
+    23: _decode_struct('!i'),
+    26: _decode_struct('!I'),
+    700: _decode_struct('!f'),
+    701: _decode_struct('!d'),
+    1082: _decode_date,
+    1083: _decode_time,
+    1114: _decode_timestamp,
+    1184: _decode_timestamptz,
+    1186: _decode_interval,
+    1700: _decode_numeric,
+    }
+
+def _encode_struct(fmt):
+    return lambda value, writer: struct.pack(fmt, value)
+
+def _encode_bool(value, writer):
+    return value and '\1' or '\0'
+
+def _encode_text(value, writer):
+    if isinstance(value, unicode):
+        return value.encode(writer.encoding)
+    return str(value)
+
+def _encode_bytea(value, writer):
+    return str(value)
+
+def _encode_date(value, writer):
+    if value == datetime.date.max:
+        return struct.pack('!i', _PG_DATE_INFINITY)
+    elif value == datetime.date.min:
+        return struct.pack('!i', -_PG_DATE_INFINITY - 1)
+    return struct.pack('!i', (value - _PG_EPOCH_DATE).days)
+
+def _encode_timedelta_usecs(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000000L \
+        + delta.microseconds
+
+def _encode_timestamp(value, writer):
+    if value == datetime.datetime.max:
+        return struct.pack('!q', _PG_TIMESTAMP_INFINITY)
+    elif value == datetime.datetime.min:
+        return struct.pack('!q', -_PG_TIMESTAMP_INFINITY - 1)
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return struct.pack('!q',
+        _encode_timedelta_usecs(value - _PG_EPOCH_DATETIME))
+
+def _encode_time(value, writer):
+    return struct.pack('!q', ((value.hour * 60 + value.minute) * 60
+        + value.second) * 1000000L + value.microsecond)
+
+def _encode_interval(value, writer):
+    return struct.pack('!qii',
+        value.seconds * 1000000L + value.microseconds, value.days, 0)
+
+def _encode_numeric(value, writer):
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    sign, digits, exp = value.as_tuple()
+    if not isinstance(exp, (int, long)):
+        if exp == 'n':
+            return struct.pack('!hhHH', 0, 0, 0xC000, 0)
+        if exp == 'F':
+            return struct.pack('!hhHH', 0, 0, sign and 0xF000 or 0xD000, 0)
+        raise DataError("can't represent %s as numeric" % value)
+    dscale = max(0, -exp)
+    digits = ''.join(map(str, digits))
+    # align the digits to base 10000 groups around the decimal point
+    pad = exp % 4
+    digits += '0' * pad
+    exp -= pad
+    digits = '0' * (-len(digits) % 4) + digits
+    groups = [int(digits[i:i+4]) for i in range(0, len(digits), 4)]
+    weight = len(groups) - 1 + exp / 4
+    while groups and groups[0] == 0:
+        del groups[0]
+        weight -= 1
+    while groups and groups[-1] == 0:
+        del groups[-1]
+    if not groups:
+        weight = 0
+    return struct.pack('!hhHH%dH' % len(groups), len(groups), weight,
+        sign and 0x4000 or 0, dscale, *groups)
+
+_BINARY_ENCODERS = {
+    16: _encode_bool,
+    17: _encode_bytea,
+    20: _encode_struct('!q'),
+    21: _encode_struct('!h'),
+    23: _encode_struct('!i'),
+    26: _encode_struct('!I'),
+    700: _encode_struct('!f'),
+    701: _encode_struct('!d'),
+    1082: _encode_date,
+    1083: _encode_time,
+    1114: _encode_timestamp,
+    1184: _encode_timestamp,
+    1186: _encode_interval,
+    1700: _encode_numeric,
+    }
+for _oid in _TEXT_OIDS:
+    _BINARY_ENCODERS[_oid] = _encode_text
+
+class BinaryCopyReader(object):
+    """Decode a :sql:`COPY ... TO STDOUT WITH BINARY` stream.
+
+    *types* is the sequence of the type oids of the columns in the stream
+    (the binary format doesn't carry them). Values of fixed size types
+    (numbers, booleans, dates and times, :sql:`numeric`) are decoded
+    directly; values of textual types are passed to the typecaster
+    registered for their oid, so that custom casters keep working. The
+    values of other types are returned as raw strings.
+
+    The reader can be passed as the *file* argument of
+    `~cursor.copy_expert()`: the stream is decoded while received. Each
+    record is passed to *callback*, if specified; else the records are
+    collected in the `rows` list, which is only advisable for small results.
+    `iter_rows()` decodes a stream read from a file without keeping the
+    records.
+    """
+
+    def __init__(self, types, cursor=None, tzinfo_factory=None,
+            callback=None):
+        self.types = list(types)
+        self.callback = callback
+        self.cursor = cursor
+        if tzinfo_factory is None:
+            if cursor is not None and cursor.tzinfo_factory is not None:
+                tzinfo_factory = cursor.tzinfo_factory
+            else:
+                from psycopg2.tz import FixedOffsetTimezone
+                tzinfo_factory = FixedOffsetTimezone
+        self.tzinfo_factory = tzinfo_factory
+        self.rows = []
+        self._received = []
+        self._decoders = [self._get_decoder(oid) for oid in self.types]
+        self._buffer = ''
+        self._header = False
+        self._done = False
+
+    def _get_decoder(self, oid):
+        if oid in _TEXT_OIDS:
+            caster = _ext.string_types.get(oid)
+            if caster is not None and self.cursor is not None:
+                cursor = self.cursor
+                return lambda data, reader: caster(data, cursor)
+            return lambda data, reader: data
+        return _BINARY_DECODERS.get(oid, lambda data, reader: data)
+
+    def _parse_header(self, data, pos):
+        if len(data) - pos < 19:
+            return None
+        if data[pos:pos+11] != _COPY_SIGNATURE:
+            raise DataError("invalid binary COPY signature")
+        extlen = struct.unpack('!i', data[pos+15:pos+19])[0]
+        if len(data) - pos < 19 + extlen:
+            return None
+        return pos + 19 + extlen
+
+    def _parse(self, data):
+        """Decode the complete records in *data*; return the unused tail."""
+        pos = 0
+        if not self._header:
+            end = self._parse_header(data, pos)
+            if end is None:
+                return data
+            self._header = True
+            pos = end
+
+        rows = self._received
+        decoders = self._decoders
+        unpack = struct.unpack
+        size = len(data)
+        while pos + 2 <= size and not self._done:
+            nfields = unpack('!h', data[pos:pos+2])[0]
+            if nfields == -1:
+                self._done = True
+                pos += 2
+                break
+            if nfields != len(decoders):
+                raise DataError("expected %d columns in COPY data, got %d"
+                    % (len(decoders), nfields))
+
+            row = []
+            p = pos + 2
+            for decode in decoders:
+                if p + 4 > size:
+                    return data[pos:]
+                length = unpack('!i', data[p:p+4])[0]
+                p += 4
+                if length == -1:
+                    row.append(None)
+                    continue
+                if p + length > size:
+                    return data[pos:]
+                row.append(decode(data[p:p+length], self))
+                p += length
+
+            rows.append(tuple(row))
+            pos = p
+
+        return data[pos:]
+
+    def _feed(self, data):
+        """Decode a chunk of the stream; return the records completed."""
+        if self._done:
+            if data:
+                raise DataError("data after the end of the COPY stream")
+            return []
+        if self._buffer:
+            data = self._buffer + data
+        self._buffer = self._parse(data)
+        rows, self._received = self._received, []
+        return rows
+
+    def write(self, data):
+        """Feed a chunk of the binary stream to the reader."""
+        rows = self._feed(data)
+        if self.callback is not None:
+            for row in rows:
+                self.callback(row)
+        else:
+            self.rows.extend(rows)
+
+    def finish(self):
+        """Check that the whole stream was received.
+
+        Raise `~psycopg2.DataError` if the stream ended before its trailer.
+        """
+        if not self._done:
+            raise DataError("COPY stream ended before the trailer")
+
+    def read_from(self, f, size=65536):
+        """Read and decode the whole stream from the file *f*."""
+        while not self._done:
+            data = f.read(size)
+            if not data:
+                break
+            self.write(data)
+        self.finish()
+        return self.rows
+
+    def iter_rows(self, f, size=65536):
+        """Read the stream from the file *f* and yield its records."""
+        while not self._done:
+            data = f.read(size)
+            if not data:
+                break
+            for row in self._feed(data):
+                yield row
+        self.finish()
+
+    def columns(self):
+        """Return the values read so far as a list of per-column lists."""
+        return [list(c) for c in zip(*self.rows)] \
+            or [[] for oid in self.types]
+
+
+class BinaryCopyWriter(object):
+    """Encode records for a :sql:`COPY ... FROM STDIN WITH BINARY` command.
+
+    *types* is the sequence of the type oids of the target columns. *rows*
+    is an iterable of sequences of Python values (`!None` for nulls).
+
+    The writer is a readable file-like object: it can be passed as the
+    *file* argument of `~cursor.copy_expert()` and encodes the rows lazily
+    while the server consumes them.
+    """
+
+    def __init__(self, types, rows, encoding='utf-8'):
+        self.types = list(types)
+        self.encoding = encoding
+        self._encoders = []
+        for oid in self.types:
+            if not _BINARY_ENCODERS.has_key(oid):
+                raise NotSupportedError(
+                    "binary COPY of type %s not supported" % oid)
+            self._encoders.append(_BINARY_ENCODERS[oid])
+        self._rows = iter(rows)
+        self._buffer = _COPY_HEADER
+        self._done = False
+
+    def encode_row(self, row):
+        """Return the binary representation of a single record."""
+        if len(row) != len(self._encoders):
+            raise DataError("expected %d values, got %d"
+                % (len(self._encoders), len(row)))
+        parts = [struct.pack('!h', len(row))]
+        for encode, value in zip(self._encoders, row):
+            if value is None:
+                parts.append(struct.pack('!i', -1))
+            else:
+                value = encode(value, self)
+                parts.append(struct.pack('!i', len(value)))
+                parts.append(value)
+        return ''.join(parts)
+
+    def read(self, size=8192):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while length < size and not self._done:
+            try:
+                row = self._rows.next()
+            except StopIteration:
+                self._done = True
+                parts.append(_COPY_TRAILER)
+                break
+            data = self.encode_row(row)
+            parts.append(data)
+            length += len(data)
+        data = ''.join(parts)
+        self._buffer = data[size:]
+        return data[:size]
+
+def _get_copy_types(curs, source, columns):
+    """Return the type oids of *columns* of the table or query *source*."""
+    if columns:
+        fields = ', '.join(columns)
+    else:
+        fields = '*'
+    curs.execute("SELECT %s FROM %s AS _copy_source LIMIT 0"
+        % (fields, source))
+    return [d[1] for d in curs.description]
+
+def copy_to_binary(curs, source, columns=None, types=None, callback=None):
+    """Read the records of *source* using the binary :sql:`COPY` format.
+
+    *source* is a table name or a parenthesized :sql:`SELECT` query;
+    *columns* can only be used with a table. If *types* is not specified
+    the column types are read from the server. Return a `BinaryCopyReader`:
+    if *callback* is specified each record is passed to it while received,
+    else the records are available in its `!rows` attribute and by column
+    using its `!columns()` method.
+    """
+    if columns and source.lstrip().startswith('('):
+        raise ValueError("columns can't be specified with a query")
+    if types is None:
+        types = _get_copy_types(curs, source, columns)
+    if columns:
+        source = '%s (%s)' % (source, ', '.join(columns))
+    reader = BinaryCopyReader(types, curs, callback=callback)
+    curs.copy_expert("COPY %s TO STDOUT WITH BINARY" % source, reader)
+    reader.finish()
+    return reader
+
+def copy_from_binary(curs, table, rows, columns=None, types=None,
+        size=65536):
+    """Insert *rows* into *table* using the binary :sql:`COPY` format.
+
+    If *types* is not specified the column types are read from the server.
+    The rows are encoded lazily, so *rows* can be a generator.
+    """
+    if types is None:
+        types = _get_copy_types(curs, table, columns)
+    encoding = _ext.encodings.get(curs.connection.encoding, 'utf-8')
+    writer = BinaryCopyWriter(types, rows, encoding)
+    if columns:
+        table = '%s (%s)' % (table, ', '.join(columns))
+    curs.copy_expert("COPY %s FROM STDIN WITH BINARY" % table, writer, size)
+
+
+# LISTEN/NOTIFY dispatching
+
+class NotifyDispatcher(object):
+    """Deliver the notifications received by a connection as they arrive.
+
+    A background thread waits on the connection socket (using no CPU while
+    idle), reads the notifications with `connection.poll()` and passes them
+    to the callbacks registered with `listen()`; the notifications of the
+    channels without callback are put in a queue read by `get()`. The queue
+    holds at most `maxsize` notifications: when it is full the oldest ones
+    are dropped and counted in `dropped`.
+
+    Notifications are delivered as ``(pid, channel, payload)`` tuples (the
+    payload is an empty string before PostgreSQL 9.0). The connection must
+    be dedicated to the dispatcher: it is switched to autocommit mode.
+    """
+
+    def __init__(self, conn, maxsize=1000):
+        if _threading is None:
+            raise NotSupportedError("threading is required by NotifyDispatcher")
+        self.conn = conn
+        self.conn.set_isolation_level(_ext.ISOLATION_LEVEL_AUTOCOMMIT)
+        self.queue = _Queue.Queue(maxsize)
+        self.dropped = 0
+        self._callbacks = {}
+        self._lock = _threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._wakeup = None
+        if hasattr(os, 'pipe') and _sys.platform != 'win32':
+            self._wakeup = os.pipe()
+
+    def listen(self, channel, callback=None):
+        """Start listening on channel.
+
+        If callback is given it is called as callback(pid, channel, payload)
+        in the dispatcher thread for every notification on the channel.
+        """
+        self._lock.acquire()
+        try:
+            self._callbacks[channel] = callback
+        finally:
+            self._lock.release()
+        self.conn.cursor().execute("LISTEN %s" % self._quote(channel))
+        # notifications read by the query can't wake up the select
+        self._wake()
+
+    def unlisten(self, channel):
+        """Stop listening on channel."""
+        self.conn.cursor().execute("UNLISTEN %s" % self._quote(channel))
+        self._lock.acquire()
+        try:
+            self._callbacks.pop(channel, None)
+        finally:
+            self._lock.release()
+
+    def get(self, block=True, timeout=None):
+        """Return the next queued notification; see `Queue.Queue.get()`."""
+        return self.queue.get(block, timeout)
+
+    def start(self):
+        """Start the dispatcher thread."""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = _threading.Thread(target=self._run,
+            name="NotifyDispatcher")
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the dispatcher thread and wait for it to terminate."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def close(self):
+        """Stop the dispatcher and close the connection."""
+        self.stop()
+        if self._wakeup is not None:
+            os.close(self._wakeup[0])
+            os.close(self._wakeup[1])
+            self._wakeup = None
+        self.conn.close()
+
+    def _quote(self, channel):
+        return '"%s"' % channel.replace('"', '""')
+
+    def _wake(self):
+        if self._wakeup is not None:
+            os.write(self._wakeup[1], 'x')
+
+    def _run(self):
+        rlist = [self.conn]
+        timeout = None
+        if self._wakeup is not None:
+            rlist.append(self._wakeup[0])
+        else:
+            # no way to interrupt the select: check for stop periodically
+            timeout = 1.0
+
+        while not self._stopping:
+            try:
+                ready = _select.select(rlist, [], [], timeout)[0]
+            except _select.error, exc:
+                if exc.args[0] == _errno.EINTR:
+                    continue
+                raise
+            if self._wakeup is not None and self._wakeup[0] in ready:
+                os.read(self._wakeup[0], 512)
+            if self._stopping:
+                break
+            if self.conn in ready:
+                self.conn.poll()
+            self._dispatch()
+
+    def _dispatch(self):
+        notifies = self.conn.notifies
+        received = notifies[:]
+        del notifies[:len(received)]
+
+        for notify in received:
+            notify = (notify[0], notify[1], notify.payload)
+            self._lock.acquire()
+            try:
+                callback = self._callbacks.get(notify[1])
+            finally:
+                self._lock.release()
+
+            if callback is not None:
+                try:
+                    callback(*notify)
+                except Exception:
+                    if logging:
+                        logging.getLogger('psycopg2').exception(
+                            "error in the callback of channel %s", notify[1])
+                    else:
+                        _traceback.print_exc()
+                continue
+
+            while 1:
+                try:
+                    self.queue.put_nowait(notify)
+                    break
+                except _Queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except _Queue.Empty:
+                        pass
+
+
+class RetryStats(object):
+    """Counters of the transactions run by one or more `TransactionRunner`.
+
+    `!transactions` is the number of transactions committed, `!retries` the
+    number of attempts repeated, `!failures` the number of transactions
+    given up after `!max_retries` retries; `!errors` maps the SQLSTATE
+    retried to the number of times it was received; `!sleep_time` is the
+    total time spent waiting before the retries.
+    """
+
+    def __init__(self):
+        self.transactions = 0
+        self.retries = 0
+        self.failures = 0
+        self.errors = {}
+        self.sleep_time = 0.0
+        if _threading is not None:
+            self._lock = _threading.Lock()
+        else:
+            self._lock = None
+
+    def _record(self, committed=False, retried=None, failed=False, delay=0.0):
+        if self._lock is not None:
+            self._lock.acquire()
+        try:
+            if committed:
+                self.transactions += 1
+            if retried is not None:
+                self.retries += 1
+                self.errors[retried] = self.errors.get(retried, 0) + 1
+                self.sleep_time += delay
+            if failed:
+                self.failures += 1
+        finally:
+            if self._lock is not None:
+                self._lock.release()
+
+
+class TransactionRunner(object):
+    """Run functions in a transaction, repeating them if the transaction
+    fails for a serialization failure or a deadlock.
+
+    `run()` calls the function passing it a new cursor, then commits. On a
+    `~psycopg2.extensions.TransactionRollbackError` with SQLSTATE in
+    `!retry_codes` the transaction is rolled back and the function is called
+    again, after waiting a random time between 0 and `!backoff` seconds,
+    doubled at every retry up to `!max_backoff`. After `!max_retries`
+    retries the error is raised. Any other error rolls the transaction back
+    and is raised immediately.
+
+    The function may be called more than once: it shouldn't have effects
+    outside of the database. Counters are kept in `!stats`, a `RetryStats`
+    which can be shared by several runners.
+    """
+
+    retry_codes = ('40001', '40P01')    # serialization failure, deadlock
+
+    def __init__(self, conn, max_retries=5, backoff=0.01, max_backoff=1.0,
+                 stats=None):
+        self.conn = conn
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        if stats is None:
+            stats = RetryStats()
+        self.stats = stats
+
+    def run(self, func, *args, **kwargs):
+        """Call func(cursor, *args, **kwargs) in a transaction and commit.
+
+        Return the function result.
+        """
+        retries = 0
+        while 1:
+            try:
+                curs = self.conn.cursor()
+                try:
+                    rv = func(curs, *args, **kwargs)
+                finally:
+                    curs.close()
+                self.conn.commit()
+            except:
+                exc_info = _sys.exc_info()
+                try:
+                    self.conn.rollback()
+                except Exception:
+                    # the connection is broken: report the original error
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                code = getattr(exc_info[1], 'pgcode', None)
+                if not isinstance(exc_info[1], _ext.TransactionRollbackError) \
+                        or code not in self.retry_codes:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                if retries >= self.max_retries:
+                    self.stats._record(failed=True)
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                del exc_info
+
+                delay = _random.uniform(0,
+                    min(self.max_backoff, self.backoff * 2 ** retries))
+                retries += 1
+                self.stats._record(retried=code, delay=delay)
+                time.sleep(delay)
+            else:
+                self.stats._record(committed=True)
+                return rv
+
+
 __all__ = filter(lambda k: not k.startswith('_'), locals().keys())
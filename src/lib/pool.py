@@ -24,7 +24,17 @@ This module implements thread-safe (and not) connection pools.
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
 # License for more details.
 
+import os
+import re
+import sys
+import time
+import errno
+import select
+import weakref
+from collections import deque
+
 import psycopg2
+from psycopg2 import extensions as _ext
 
 try:
     import logging
@@ -58,6 +68,90 @@ class PoolError(psycopg2.Error):
     pass
 
 
+_re_connect_timeout = re.compile(r"(?:^|\s)connect_timeout\s*=\s*'?(\d+)")
+
+def _connect_timeout(args, kwargs):
+    """Return the connect_timeout of a connection string, None if not set.
+
+    libpq doesn't apply the timeout to the non-blocking connections.
+    """
+    dsn = args and args[0] or kwargs.get('dsn')
+    m = dsn and _re_connect_timeout.search(dsn)
+    if m:
+        timeout = m.group(1)
+    else:
+        timeout = os.environ.get('PGCONNECT_TIMEOUT')
+    try:
+        timeout = int(timeout)
+    except (TypeError, ValueError):
+        return None
+    if timeout <= 0:
+        return None
+    # as libpq does, shorter timeouts are too likely to fail
+    return max(timeout, 2)
+
+def connect_many(n, *args, **kwargs):
+    """Open 'n' connections concurrently and return them in a list.
+
+    The arguments are passed to psycopg2.connect(). The connections are
+    started without blocking (see the 'async' argument of connect()) and
+    established together by the calling thread, so that opening many
+    connections takes about the time of a single one. If the connection
+    string specifies a 'connect_timeout' the connections not established
+    within that time are closed and OperationalError is raised.
+    """
+    timeout = _connect_timeout(args, kwargs)
+    if timeout is not None:
+        deadline = time.time() + timeout
+    kwargs['async'] = 1
+    conns = []
+    try:
+        pending = {}
+        for i in range(n):
+            conn = psycopg2.connect(*args, **kwargs)
+            conns.append(conn)
+            pending[conn] = conn.poll()
+
+        while pending:
+            rlist = []
+            wlist = []
+            for conn, state in pending.items():
+                if state == _ext.POLL_OK:
+                    del pending[conn]
+                elif state == _ext.POLL_READ:
+                    rlist.append(conn)
+                else:
+                    wlist.append(conn)
+            if not pending:
+                break
+
+            try:
+                if timeout is None:
+                    ready = select.select(rlist, wlist, [])
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise psycopg2.OperationalError("timeout expired")
+                    ready = select.select(rlist, wlist, [], remaining)
+            except select.error, e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for conn in ready[0] + ready[1]:
+                pending[conn] = conn.poll()
+    except:
+        exc_info = sys.exc_info()
+        for conn in conns:
+            if not conn.closed:
+                try:
+                    conn.close()
+                except:
+                    pass
+        raise exc_info[0], exc_info[1], exc_info[2]
+
+    return conns
+
+
 class AbstractConnectionPool(object):
     """Generic key-based pooling code."""
 
@@ -67,10 +161,25 @@ class AbstractConnectionPool(object):
         New 'minconn' connections are created immediately calling 'connfunc'
         with given parameters. The connection pool will support a maximum of
         about 'maxconn' connections.        
+
+        The following keyword arguments are used by the pool and not passed
+        to connect(): 'max_lifetime' is the number of seconds after which a
+        connection is closed instead of being reused; 'idle_timeout' makes
+        the pool keep the connections put back, closing the ones unused for
+        more than the given seconds in excess of 'minconn' (see reap()); if
+        'check_on_checkout' is true (default) the connections are checked
+        to be alive before being handed out; 'reset' is the policy used to
+        clean the session of the connections put back (see _reset_on_return).
         """
         self.minconn = minconn
         self.maxconn = maxconn
         self.closed = False
+        self.max_lifetime = kwargs.pop('max_lifetime', None)
+        self.idle_timeout = kwargs.pop('idle_timeout', None)
+        self.check_on_checkout = kwargs.pop('check_on_checkout', True)
+        self.reset = kwargs.pop('reset', None)
+        if self.reset not in (None, 'rollback', 'discard', 'reset'):
+            raise ValueError("bad reset policy: %r" % self.reset)
         
         self._args = args
         self._kwargs = kwargs
@@ -79,20 +188,120 @@ class AbstractConnectionPool(object):
         self._used = {}
         self._rused = {} # id(conn) -> key map
         self._keys = 0
+        self._ctimes = {} # id(conn) -> creation time
+        self._itimes = {} # id(conn) -> time put back in the pool
+        self._dirty = {} # id(conn) -> True if the session must be reset
+        self._reaper = None
+        self._nrequests = 0 # counters reported by stats()
+        self._nopened = 0
+        self._nclosed = 0
 
-        for i in range(self.minconn):
-            self._connect()
+        self._connect_many(self.minconn)
 
     def _connect(self, key=None):
         """Create a new connection and assign it to 'key' if not None."""
         conn = psycopg2.connect(*self._args, **self._kwargs)
+        self._nopened += 1
+        self._ctimes[id(conn)] = time.time()
         if key is not None:
             self._used[key] = conn
             self._rused[id(conn)] = key
         else:
             self._pool.append(conn)
+            self._itimes[id(conn)] = time.time()
         return conn
 
+    def _connect_many(self, n):
+        """Create 'n' new connections concurrently and put them in the pool."""
+        conns = connect_many(n, *self._args, **self._kwargs)
+        self._nopened += len(conns)
+        now = time.time()
+        for conn in conns:
+            self._ctimes[id(conn)] = now
+            self._itimes[id(conn)] = now
+            self._pool.append(conn)
+
+    def _discard(self, conn):
+        """Close a connection and forget about it."""
+        self._nclosed += 1
+        self._ctimes.pop(id(conn), None)
+        self._itimes.pop(id(conn), None)
+        self._dirty.pop(id(conn), None)
+        try:
+            conn.close()
+        except:
+            pass
+
+    def _expired(self, conn, now=None):
+        """Return True if 'conn' is older than 'max_lifetime'."""
+        if self.max_lifetime is None:
+            return False
+        if now is None: now = time.time()
+        return now - self._ctimes.get(id(conn), now) > self.max_lifetime
+
+    def _check(self, conn, force=False):
+        """Return True if the idle connection 'conn' can be handed out.
+
+        The connection is only checked to be alive if 'check_on_checkout'
+        is true, or if 'force' is.
+        """
+        if conn.closed or self._expired(conn):
+            return False
+        if not self.check_on_checkout and not force:
+            return True
+        try:
+            # an idle connection has nothing to read unless the server sent
+            # notices or notifications, or closed it. A terminated backend
+            # sends a FATAL notice before closing: poll() only fails when
+            # it reads the end of the stream, so keep reading.
+            for i in range(10):
+                if not select.select([conn], [], [], 0)[0]:
+                    break
+                conn.poll()
+            status = conn.get_transaction_status()
+            if status == _ext.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != _ext.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except (psycopg2.Error, select.error):
+            return False
+        return True
+
+    def _reset_on_return(self, conn):
+        """Clean up a connection put back; return False if it is broken.
+
+        A transaction left open is rolled back. With the 'discard' and
+        'reset' policies the connection is marked dirty: its session is
+        reset only when it is handed out again (see _clean), so that the
+        connections closed while idle never pay for it.
+        """
+        if self.reset is None:
+            return True
+        try:
+            status = conn.get_transaction_status()
+            if status == _ext.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != _ext.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        if self.reset != 'rollback':
+            self._dirty[id(conn)] = True
+        return True
+
+    def _clean(self, conn):
+        """Reset the session of a dirty connection before handing it out.
+
+        Return False if the connection is broken.
+        """
+        if not self._dirty.pop(id(conn), False):
+            return True
+        try:
+            conn.reset(discard=(self.reset == 'discard'))
+        except psycopg2.Error:
+            return False
+        return True
+
     def _getkey(self):
         """Return a new unique key."""
         self._keys += 1
@@ -102,18 +311,25 @@ class AbstractConnectionPool(object):
         """Get a free connection and assign it to 'key' if not None."""
         if self.closed: raise PoolError("connection pool is closed")
         if key is None: key = self._getkey()
+        self._nrequests += 1
 	
         if self._used.has_key(key):
             return self._used[key]
 
-        if self._pool:
-            self._used[key] = conn = self._pool.pop()
+        while self._pool:
+            conn = self._pool.pop()
+            self._itimes.pop(id(conn), None)
+            if not self._check(conn) or not self._clean(conn):
+                # broken or too old: replace it
+                self._discard(conn)
+                continue
+            self._used[key] = conn
             self._rused[id(conn)] = key
             return conn
-        else:
-            if len(self._used) == self.maxconn:
-                raise PoolError("connection pool exausted")
-            return self._connect(key)
+
+        if len(self._used) >= self.maxconn:
+            raise PoolError("connection pool exausted")
+        return self._connect(key)
 		 
     def _putconn(self, conn, key=None, close=False):
         """Put away a connection."""
@@ -123,10 +339,14 @@ class AbstractConnectionPool(object):
         if not key:
             raise PoolError("trying to put unkeyed connection")
 
-        if len(self._pool) < self.minconn and not close:
+        if not close and not conn.closed and not self._expired(conn) \
+                and (len(self._pool) < self.minconn
+                    or self.idle_timeout is not None) \
+                and self._reset_on_return(conn):
             self._pool.append(conn)
+            self._itimes[id(conn)] = time.time()
         else:
-            conn.close()
+            self._discard(conn)
 
         # here we check for the presence of key because it can happen that a
         # thread tries to put back a connection after a call to close
@@ -143,11 +363,80 @@ class AbstractConnectionPool(object):
         """
         if self.closed: raise PoolError("connection pool is closed")
         for conn in self._pool + list(self._used.values()):
-            try:
-                conn.close()
-            except:
-                pass
+            self._discard(conn)
         self.closed = True
+        if self._reaper is not None:
+            self._reaper.set()
+
+    def _reap(self):
+        """Close the broken, expired and idle connections in the pool.
+
+        The connections unused for more than 'idle_timeout' seconds are
+        closed, keeping at least 'minconn' of them; new connections are
+        opened to replace the ones closed below 'minconn'.
+        """
+        if self.closed: raise PoolError("connection pool is closed")
+        now = time.time()
+
+        # the connections put back first are at the start of the list
+        pool = []
+        for conn in self._pool:
+            if self._check(conn, True):
+                pool.append(conn)
+            else:
+                self._discard(conn)
+
+        if self.idle_timeout is not None:
+            while len(pool) > self.minconn and \
+                    now - self._itimes.get(id(pool[0]), now) \
+                        > self.idle_timeout:
+                self._discard(pool.pop(0))
+
+        self._pool = pool
+        self._connect_many(min(self.minconn - len(pool),
+            self.maxconn - len(pool) - len(self._used)))
+
+    def _stats(self):
+        """Return a dict with the pool size and usage counters."""
+        return {
+            'minconn': self.minconn,
+            'maxconn': self.maxconn,
+            'idle': len(self._pool),
+            'used': len(self._used),
+            'requests': self._nrequests,
+            'opened': self._nopened,
+            'closed': self._nclosed,
+        }
+
+    def _start_reaper(self):
+        """Run reap() periodically in a thread if the pool needs it."""
+        timeouts = [t for t in (self.max_lifetime, self.idle_timeout)
+            if t is not None]
+        if not timeouts:
+            return
+
+        import threading
+        self._reaper = threading.Event()
+        interval = max(min(timeouts) / 2.0, 1.0)
+        t = threading.Thread(target=_reaper,
+            args=(weakref.ref(self), self._reaper, interval),
+            name="psycopg2.pool reaper")
+        t.setDaemon(True)
+        t.start()
+
+
+def _reaper(pool_ref, stop, interval):
+    """Call reap() on the referenced pool every 'interval' seconds."""
+    while 1:
+        stop.wait(interval)
+        pool = pool_ref()
+        if stop.isSet() or pool is None or pool.closed:
+            break
+        try:
+            pool.reap()
+        except Exception, e:
+            dbg("error reaping connections:", e)
+        del pool
         
 
 class SimpleConnectionPool(AbstractConnectionPool):
@@ -156,6 +445,18 @@ class SimpleConnectionPool(AbstractConnectionPool):
     getconn = AbstractConnectionPool._getconn
     putconn = AbstractConnectionPool._putconn
     closeall   = AbstractConnectionPool._closeall
+    reap = AbstractConnectionPool._reap
+    stats = AbstractConnectionPool._stats
+
+
+class _PoolWaiter(object):
+    """A thread waiting for a connection from an exhausted pool."""
+
+    def __init__(self, lock):
+        import threading
+        self.cond = threading.Condition(lock)
+        self.ready = False
+        self.conn = None
 
 
 class ThreadedConnectionPool(AbstractConnectionPool):
@@ -167,12 +468,24 @@ class ThreadedConnectionPool(AbstractConnectionPool):
         AbstractConnectionPool.__init__(
             self, minconn, maxconn, *args, **kwargs)
         self._lock = threading.Lock()
+        self._waiters = deque()
+        self._start_reaper()
 
-    def getconn(self, key=None):
-        """Get a free connection and assign it to 'key' if not None."""
+    def getconn(self, key=None, timeout=0):
+        """Get a free connection and assign it to 'key' if not None.
+
+        If the pool is exhausted wait up to 'timeout' seconds (forever if
+        None) for a connection to be put back: the waiting threads are
+        served in order of arrival. With the default 'timeout' of 0 raise
+        PoolError immediately.
+        """
         self._lock.acquire()
         try:
-            return self._getconn(key)
+            if self.closed or key in self._used or not self._exhausted():
+                return self._getconn(key)
+            if timeout is not None and timeout <= 0:
+                raise PoolError("connection pool exausted")
+            return self._wait(key, timeout)
         finally:
             self._lock.release()
 
@@ -180,7 +493,10 @@ class ThreadedConnectionPool(AbstractConnectionPool):
         """Put away an unused connection."""
         self._lock.acquire()
         try:
-            self._putconn(conn, key, close)
+            if self._waiters and not self.closed:
+                self._handoff(conn, key, close)
+            else:
+                self._putconn(conn, key, close)
         finally:
             self._lock.release()
 
@@ -189,9 +505,102 @@ class ThreadedConnectionPool(AbstractConnectionPool):
         self._lock.acquire()
         try:
             self._closeall()
+            while self._waiters:
+                self._wake(None)
+        finally:
+            self._lock.release()
+
+    def reap(self):
+        """Close the broken, expired and idle connections in the pool."""
+        self._lock.acquire()
+        try:
+            self._reap()
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dict with the pool size and usage counters."""
+        self._lock.acquire()
+        try:
+            rv = self._stats()
+            rv['waiting'] = len(self._waiters)
+            return rv
         finally:
             self._lock.release()
 
+    def _exhausted(self):
+        """Return True if a new request must wait for a connection."""
+        return bool(self._waiters
+            or (not self._pool and len(self._used) >= self.maxconn))
+
+    def _wait(self, key, timeout):
+        """Wait in line for a connection; called with the lock held."""
+        self._nrequests += 1
+        waiter = _PoolWaiter(self._lock)
+        self._waiters.append(waiter)
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while not waiter.ready:
+            if timeout is None:
+                waiter.cond.wait()
+                continue
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self._waiters.remove(waiter)
+                raise PoolError(
+                    "timeout expired waiting for a connection (%s sec)"
+                    % timeout)
+            waiter.cond.wait(remaining)
+
+        if self.closed:
+            raise PoolError("connection pool is closed")
+        if key is None: key = self._getkey()
+
+        conn = waiter.conn
+        if conn is not None and not self._clean(conn):
+            self._discard(conn)
+            conn = None
+
+        if conn is None:
+            # the connection was discarded: open a new one in its slot
+            try:
+                return self._connect(key)
+            except:
+                if self._waiters:
+                    self._wake(None)
+                raise
+
+        self._used[key] = conn
+        self._rused[id(conn)] = key
+        return conn
+
+    def _handoff(self, conn, key, close):
+        """Pass a connection put back to the first waiting thread."""
+        if key is None: key = self._rused[id(conn)]
+        if not key:
+            raise PoolError("trying to put unkeyed connection")
+
+        del self._used[key]
+        del self._rused[id(conn)]
+
+        # check it as getconn() would check a connection taken from the pool
+        if close or conn.closed or self._expired(conn) \
+                or not self._reset_on_return(conn) or not self._check(conn):
+            self._discard(conn)
+            conn = None
+        self._wake(conn)
+
+    def _wake(self, conn):
+        """Wake up the first waiting thread giving it 'conn'.
+
+        If 'conn' is None the thread will open a new connection.
+        """
+        waiter = self._waiters.popleft()
+        waiter.conn = conn
+        waiter.ready = True
+        waiter.cond.notify()
+
 
 class PersistentConnectionPool(AbstractConnectionPool):
     """A pool that assigns persistent connections to different threads. 
@@ -214,6 +623,7 @@ class PersistentConnectionPool(AbstractConnectionPool):
         # import it here and copy it in an instance variable
         import thread
         self.__thread = thread
+        self._start_reaper()
 
     def getconn(self):
         """Generate thread id and return a connection."""
@@ -241,3 +651,285 @@ class PersistentConnectionPool(AbstractConnectionPool):
             self._closeall()
         finally:
             self._lock.release()
+
+    def reap(self):
+        """Close the broken, expired and idle connections in the pool."""
+        self._lock.acquire()
+        try:
+            self._reap()
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dict with the pool size and usage counters."""
+        self._lock.acquire()
+        try:
+            return self._stats()
+        finally:
+            self._lock.release()
+
+
+class RoutingConnectionPool(object):
+    """A pool routing the read-only transactions to replica servers.
+
+    The pool keeps a `ThreadedConnectionPool` for the 'primary' connection
+    string and one for each of the 'replicas', created on first use. The
+    connections requested with getconn(readonly=True) are taken from a
+    replica chosen according to 'policy': 'round-robin' (default) or
+    'least-outstanding', picking the replica with less connections in use.
+    The other requests, and the read-only ones if no replica is usable, are
+    served by the primary.
+
+    A replica is skipped for 'retry_after' seconds after it fails to give a
+    connection. If 'max_lag' is set, the replication delay of each replica
+    is checked at most every 'lag_interval' seconds, using one of its
+    connections; a replica lagging more than 'max_lag' seconds is skipped
+    until the next check.
+
+    The other arguments are passed to the ThreadedConnectionPool of each
+    server.
+    """
+
+    def __init__(self, minconn, maxconn, primary, replicas=(), **kwargs):
+        import threading
+        self.policy = kwargs.pop('policy', 'round-robin')
+        if self.policy not in ('round-robin', 'least-outstanding'):
+            raise ValueError("bad routing policy: %r" % self.policy)
+        self.max_lag = kwargs.pop('max_lag', None)
+        self.lag_interval = kwargs.pop('lag_interval', 5)
+        self.retry_after = kwargs.pop('retry_after', 30)
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.primary = primary
+        self.replicas = tuple(replicas)
+        self.closed = False
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+
+        self._primary = ThreadedConnectionPool(
+            minconn, maxconn, primary, **kwargs)
+        n = len(self.replicas)
+        self._pools = [None] * n
+        self._outstanding = [0] * n
+        self._failed = [0] * n      # time until a replica is skipped
+        self._lags = [None] * n     # last replication delay measured
+        self._checked = [0] * n     # time of the last delay check
+        self._next = 0              # round-robin position
+        self._owners = {}           # id(conn) -> replica index, None: primary
+        self._nfallbacks = 0
+
+    def getconn(self, readonly=False, timeout=0):
+        """Get a free connection; a replica one if 'readonly' is true.
+
+        'timeout' is passed to the getconn() of the primary pool: a busy
+        replica is skipped.
+        """
+        if self.closed: raise PoolError("connection pool is closed")
+        if readonly:
+            for i in self._candidates():
+                conn = self._getreplica(i)
+                if conn is not None:
+                    return conn
+            self._lock.acquire()
+            try:
+                if self.replicas:
+                    self._nfallbacks += 1
+            finally:
+                self._lock.release()
+
+        conn = self._primary.getconn(timeout=timeout)
+        self._lock.acquire()
+        try:
+            self._owners[id(conn)] = None
+        finally:
+            self._lock.release()
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Put away a connection, returning it to the pool it came from."""
+        self._lock.acquire()
+        try:
+            if id(conn) not in self._owners:
+                raise PoolError("trying to put unkeyed connection")
+            i = self._owners.pop(id(conn))
+            if i is not None:
+                self._outstanding[i] -= 1
+                if self._broken(conn):
+                    # the server went away: don't try it for a while
+                    self._failed[i] = time.time() + self.retry_after
+                pool = self._pools[i]
+            else:
+                pool = self._primary
+        finally:
+            self._lock.release()
+
+        if pool is not None and not pool.closed:
+            pool.putconn(conn, close=close)
+        else:
+            conn.close()
+
+    def closeall(self):
+        """Close all the connections of the primary and of the replicas."""
+        self._lock.acquire()
+        try:
+            if self.closed: raise PoolError("connection pool is closed")
+            self.closed = True
+            pools = [self._primary] + [p for p in self._pools if p is not None]
+        finally:
+            self._lock.release()
+        for pool in pools:
+            if not pool.closed:
+                pool.closeall()
+
+    def stats(self):
+        """Return a dict with the stats of the primary and replica pools.
+
+        'replicas' is a list with an entry for each replica: its pool stats
+        (if the pool was created) plus the connections 'outstanding', the
+        last replication 'lag' measured and whether it's 'available'.
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            pools = list(self._pools)
+            replicas = []
+            for i in range(len(self.replicas)):
+                replicas.append({
+                    'outstanding': self._outstanding[i],
+                    'lag': self._lags[i],
+                    'available': self._usable(i, now),
+                })
+            fallbacks = self._nfallbacks
+        finally:
+            self._lock.release()
+
+        for pool, stats in zip(pools, replicas):
+            if pool is not None and not pool.closed:
+                stats.update(pool.stats())
+        return {'primary': self._primary.stats(), 'replicas': replicas,
+            'fallbacks': fallbacks}
+
+    def _broken(self, conn):
+        """Return True if the connection was lost, not closed on purpose."""
+        if conn.closed:
+            return conn.closed == 2
+        return conn.get_transaction_status() \
+            == _ext.TRANSACTION_STATUS_UNKNOWN
+
+    def _usable(self, i, now):
+        """Return True if the replica 'i' can be chosen; call with the lock."""
+        if self._failed[i] > now:
+            return False
+        if self.max_lag is not None and self._lags[i] is not None \
+                and self._lags[i] > self.max_lag \
+                and now - self._checked[i] < self.lag_interval:
+            return False
+        return True
+
+    def _candidates(self):
+        """Return the indexes of the usable replicas, in order of preference.
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            n = len(self.replicas)
+            order = [(self._next + j) % n for j in range(n)]
+            self._next = n and (self._next + 1) % n
+            order = [i for i in order if self._usable(i, now)]
+            if self.policy == 'least-outstanding':
+                # stable sort: the ties are broken in round-robin order
+                order.sort(key=lambda i: self._outstanding[i])
+            return order
+        finally:
+            self._lock.release()
+
+    def _getreplica(self, i):
+        """Return a connection to the replica 'i', None if not available."""
+        try:
+            pool = self._replica_pool(i)
+            conn = pool.getconn()
+        except psycopg2.Error, e:
+            # includes PoolError, raised if the replica pool is exhausted
+            dbg("replica", i, "not available:", e)
+            if not isinstance(e, PoolError):
+                self._lock.acquire()
+                try:
+                    self._failed[i] = time.time() + self.retry_after
+                finally:
+                    self._lock.release()
+            return None
+
+        if self.max_lag is not None:
+            self._lock.acquire()
+            try:
+                check = time.time() - self._checked[i] >= self.lag_interval
+                if check:
+                    # other threads don't need to check it too
+                    self._checked[i] = time.time()
+            finally:
+                self._lock.release()
+            if check:
+                lag = self._check_lag(conn)
+                self._lock.acquire()
+                try:
+                    self._lags[i] = lag
+                    if lag is None:
+                        self._failed[i] = time.time() + self.retry_after
+                finally:
+                    self._lock.release()
+                if lag is None or lag > self.max_lag:
+                    pool.putconn(conn, close=(lag is None))
+                    return None
+
+        self._lock.acquire()
+        try:
+            self._owners[id(conn)] = i
+            self._outstanding[i] += 1
+        finally:
+            self._lock.release()
+        return conn
+
+    def _replica_pool(self, i):
+        """Return the pool of the replica 'i', creating it if needed."""
+        pool = self._pools[i]
+        if pool is not None:
+            return pool
+
+        # connect without holding the lock: the other servers can be used
+        pool = ThreadedConnectionPool(self.minconn, self.maxconn,
+            self.replicas[i], **self._kwargs)
+        self._lock.acquire()
+        try:
+            if self._pools[i] is None and not self.closed:
+                self._pools[i] = pool
+                return pool
+        finally:
+            self._lock.release()
+        pool.closeall()
+        if self.closed: raise PoolError("connection pool is closed")
+        return self._pools[i]
+
+    def _check_lag(self, conn):
+        """Return the replication delay in seconds; None if conn is broken.
+
+        The delay is the time elapsed since the last transaction replayed:
+        a replica of a primary without write activity appears to lag too.
+        The delay of a server not in recovery is 0.
+        """
+        try:
+            curs = conn.cursor()
+            curs.execute("SELECT CASE WHEN pg_is_in_recovery() THEN "
+                "extract(epoch from now() - pg_last_xact_replay_timestamp()) "
+                "ELSE 0 END")
+            lag = curs.fetchone()[0]
+            curs.close()
+            if conn.isolation_level != _ext.ISOLATION_LEVEL_AUTOCOMMIT:
+                conn.rollback()
+        except psycopg2.Error, e:
+            dbg("error checking the replica lag:", e)
+            return None
+        if lag is None:
+            # nothing replayed yet
+            return 0.0
+        return float(lag)
@@ -116,6 +116,15 @@ static int pthread_mutex_init(pthread_mutex_t *mutex, void* fake)
 #include <pthread.h>
 #endif
 
+/* regular files sent to the backend (COPY FROM, large objects) are memory
+   mapped where possible: MMAP_WINDOW is the size of the region mapped at
+   once and MMAP_SLICE the size of the blocks passed to libpq */
+#if !defined(_WIN32) && !defined(__BEOS__)
+#define PSYCOPG_HAVE_MMAP 1
+#define PSYCOPG_MMAP_WINDOW (64 * 1024 * 1024)
+#define PSYCOPG_MMAP_SLICE (1024 * 1024)
+#endif
+
 /* to work around the fact that Windows does not have a gmtime_r function, or
    a proper gmtime function */
 #ifdef _WIN32
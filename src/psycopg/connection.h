@@ -37,10 +37,17 @@ extern "C" {
 #endif
 
 /* connection status */
+#define CONN_STATUS_SETUP 0
 #define CONN_STATUS_READY 1
 #define CONN_STATUS_BEGIN 2
 #define CONN_STATUS_SYNC  3
 #define CONN_STATUS_ASYNC 4
+#define CONN_STATUS_CONNECTING 5
+
+/* values returned by connection.poll() */
+#define PSYCO_POLL_OK    0
+#define PSYCO_POLL_READ  1
+#define PSYCO_POLL_WRITE 2
 
 /* Hard limit on the notices stored by the Python connection */
 #define CONN_NOTICES_LIMIT 50
@@ -64,14 +71,21 @@ typedef struct {
     long int closed;          /* 1 means connection has been closed;
                                  2 that something horrible happened */
     long int isolation_level; /* isolation level for this connection */
+    int default_isolation;    /* 1 if isolation_level is the server default
+                                 and has not been read yet */
+    int readonly;             /* 1 if the session is read only */
+    int session_pending;      /* 1 if the readonly setting must be sent */
     long int mark;            /* number of commits/rollbacks done so far */
     int status;               /* status of the connection */
     int protocol;             /* protocol version */
     int server_version;       /* server version */
 
     PGconn *pgconn;         /* the postgresql connection */
+    PGcancel *cancel;       /* data to cancel the running query */
 
     PyObject *async_cursor;
+    PyObject *pipeline;     /* cursors with a queued query, NULL if the
+                               connection is not in pipeline mode */
 
     /* notice processing */
     PyObject *notice_list;
@@ -91,12 +105,18 @@ typedef struct {
 /* C-callable functions in connection_int.c and connection_ext.c */
 HIDDEN void conn_notice_process(connectionObject *self);
 HIDDEN void conn_notice_clean(connectionObject *self);
+HIDDEN void conn_notifies_process(connectionObject *self);
 HIDDEN int  conn_setup(connectionObject *self, PGconn *pgconn);
 HIDDEN int  conn_connect(connectionObject *self);
+HIDDEN int  conn_connect_async(connectionObject *self);
+HIDDEN int  conn_poll_connect(connectionObject *self);
 HIDDEN void conn_close(connectionObject *self);
 HIDDEN int  conn_commit(connectionObject *self);
 HIDDEN int  conn_rollback(connectionObject *self);
+HIDDEN int  conn_resolve_isolation_level(connectionObject *self);
 HIDDEN int  conn_switch_isolation_level(connectionObject *self, int level);
+HIDDEN int  conn_set_session(connectionObject *self, int autocommit,
+                             int readonly);
 HIDDEN int  conn_set_client_encoding(connectionObject *self, const char *enc);
 
 /* exception-raising macros */
@@ -104,6 +124,13 @@ HIDDEN int  conn_set_client_encoding(connectionObject *self, const char *enc);
     PyErr_SetString(InterfaceError, "connection already closed"); \
     return NULL; }
 
+#define EXC_IF_CONN_CONNECTING(self) \
+    if ((self)->status == CONN_STATUS_CONNECTING \
+            || (self)->status == CONN_STATUS_SETUP) { \
+    PyErr_SetString(InterfaceError, \
+        "connection not established yet: poll() it until ready"); \
+    return NULL; }
+
 #ifdef __cplusplus
 }
 #endif
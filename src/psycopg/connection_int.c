@@ -101,6 +101,59 @@ conn_notice_process(connectionObject *self)
     conn_notice_clean(self);
 }
 
+/* conn_notifies_process - move the notifications received into notifies
+
+   the items are (pid, channel) Notify tuples, with the payload (PostgreSQL
+   9.0 and following) available as their payload attribute. */
+
+void
+conn_notifies_process(connectionObject *self)
+{
+    PGnotify *pgn;
+    PyObject *notify, *pid, *channel, *payload;
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&self->lock);
+
+    while (self->pgconn != NULL
+           && (pgn = PQnotifies(self->pgconn)) != NULL) {
+
+        Dprintf("conn_notifies_process: got NOTIFY from pid %d, msg = %s",
+                (int) pgn->be_pid, pgn->relname);
+
+        Py_BLOCK_THREADS;
+        notify = NULL;
+        pid = PyInt_FromLong((long)pgn->be_pid);
+        channel = PyString_FromString(pgn->relname);
+        payload = PyString_FromString(pgn->extra ? pgn->extra : "");
+        if (pid && channel && payload
+                && (notify = PyStructSequence_New(&notifyType)) != NULL) {
+            PyStructSequence_SET_ITEM(notify, 0, pid);
+            PyStructSequence_SET_ITEM(notify, 1, channel);
+            PyStructSequence_SET_ITEM(notify, 2, payload);
+        }
+        else {
+            Py_XDECREF(pid);
+            Py_XDECREF(channel);
+            Py_XDECREF(payload);
+        }
+        if (notify != NULL) {
+            PyList_Append(self->notifies, notify);
+            Py_DECREF(notify);
+        }
+        else {
+            /* nobody to raise the error to */
+            PyErr_Clear();
+        }
+        Py_UNBLOCK_THREADS;
+
+        PQfreemem(pgn);
+    }
+
+    pthread_mutex_unlock(&self->lock);
+    Py_END_ALLOW_THREADS;
+}
+
 void
 conn_notice_clean(connectionObject *self)
 {
@@ -123,34 +176,21 @@ conn_notice_clean(connectionObject *self)
     Py_END_ALLOW_THREADS;    
 }
 
-/* conn_setup - setup and read basic information about the connection */
-
-int
-conn_setup(connectionObject *self, PGconn *pgconn)
-{
-    PGresult *pgres;
-    const char *data, *tmp;
-    const char *scs;    /* standard-conforming strings */
-    size_t i;
-
-    /* we need the initial date style to be ISO, for typecasters; if the user
-       later change it, she must know what she's doing... */
-    static const char datestyle[] = "SET DATESTYLE TO 'ISO'";
-    static const char encoding[]  = "SHOW client_encoding";
-    static const char isolevel[]  = "SHOW default_transaction_isolation";
+/* the queries run to set up a new connection, if the parameters reported
+   by the server at connection time are not enough: we need the initial date
+   style to be ISO, for typecasters; if the user later change it, she must
+   know what she's doing... */
 
-    static const char lvl1a[] = "read uncommitted";
-    static const char lvl1b[] = "read committed";
-    static const char lvl2a[] = "repeatable read";
-    static const char lvl2b[] = "serializable";
+static const char conn_datestyle[] = "SET DATESTYLE TO 'ISO'";
+static const char conn_encoding[]  = "SHOW client_encoding";
+static const char conn_isolevel[]  = "SHOW default_transaction_isolation";
 
-    Py_BEGIN_ALLOW_THREADS;
-    pthread_mutex_lock(&self->lock);
-    Py_BLOCK_THREADS;
+/* conn_read_equote - check if the server requires E'' quotes */
 
-    if (self->encoding) free(self->encoding);
-    self->equote = 0;
-    self->isolation_level = 0;
+static void
+conn_read_equote(connectionObject *self, PGconn *pgconn)
+{
+    const char *scs;    /* standard-conforming strings */
 
     /*
      * The presence of the 'standard_conforming_strings' parameter
@@ -179,65 +219,115 @@ conn_setup(connectionObject *self, PGconn *pgconn)
 #endif
     Dprintf("conn_connect: server requires E'' quotes: %s",
         self->equote ? "YES" : "NO");
+}
 
-    Py_UNBLOCK_THREADS;
-    pgres = PQexec(pgconn, datestyle);
-    Py_BLOCK_THREADS;
+/* conn_store_encoding - store the client encoding, uppercase
 
-    if (pgres == NULL || PQresultStatus(pgres) != PGRES_COMMAND_OK ) {
-        PyErr_SetString(OperationalError, "can't set datestyle to ISO");
-        PQfinish(pgconn);
-        IFCLEARPGRES(pgres);
-        Py_UNBLOCK_THREADS;
-        pthread_mutex_unlock(&self->lock);
-        Py_BLOCK_THREADS;
-        return -1;
-    }
-    CLEARPGRES(pgres);
+   must be called holding the GIL: sets an exception on error */
 
-    Py_UNBLOCK_THREADS;
-    pgres = PQexec(pgconn, encoding);
-    Py_BLOCK_THREADS;
+static int
+conn_store_encoding(connectionObject *self, const char *enc)
+{
+    size_t i;
 
-    if (pgres == NULL || PQresultStatus(pgres) != PGRES_TUPLES_OK) {
-        PyErr_SetString(OperationalError, "can't fetch client_encoding");
-        PQfinish(pgconn);
-        IFCLEARPGRES(pgres);
-        Py_UNBLOCK_THREADS;
-        pthread_mutex_unlock(&self->lock);
-        Py_BLOCK_THREADS;
-        return -1;
-    }
-    tmp = PQgetvalue(pgres, 0, 0);
-    self->encoding = malloc(strlen(tmp)+1);
+    if (self->encoding) free(self->encoding);
+    self->encoding = malloc(strlen(enc)+1);
     if (self->encoding == NULL) {
         PyErr_NoMemory();
-        PQfinish(pgconn);
-        IFCLEARPGRES(pgres);
-        Py_UNBLOCK_THREADS;
-        pthread_mutex_unlock(&self->lock);
-        Py_BLOCK_THREADS;
         return -1;
     }
-    for (i=0 ; i < strlen(tmp) ; i++)
-        self->encoding[i] = toupper(tmp[i]);
+    for (i=0 ; i < strlen(enc) ; i++)
+        self->encoding[i] = toupper(enc[i]);
     self->encoding[i] = '\0';
-    CLEARPGRES(pgres);
 
-    Py_UNBLOCK_THREADS;
-    pgres = PQexec(pgconn, isolevel);
-    Py_BLOCK_THREADS;
+    return 0;
+}
+
+/* conn_read_setup_result - process the result of a setup query
+
+   must be called holding the GIL: sets an exception on error */
+
+static int
+conn_read_setup_result(connectionObject *self, PGresult *pgres)
+{
+    switch (PQresultStatus(pgres)) {
+    case PGRES_COMMAND_OK:
+        /* SET DATESTYLE */
+        return 0;
+    case PGRES_TUPLES_OK:
+        /* SHOW client_encoding */
+        return conn_store_encoding(self, PQgetvalue(pgres, 0, 0));
+    default:
+        PyErr_SetString(OperationalError, PQresultErrorMessage(pgres));
+        return -1;
+    }
+}
+
+/* conn_setup_params - read the parameters reported by the server
+
+   the queries still needed to set up the connection are written in query,
+   which must be SETUP_QUERY_SIZE long; the string is left empty if the
+   parameters are enough (protocol 3 and a server with ISO datestyle).
+   The isolation level is read only when needed, see
+   conn_resolve_isolation_level(). Must be called holding the GIL. */
+
+#define SETUP_QUERY_SIZE (sizeof(conn_datestyle) + sizeof(conn_encoding))
+
+static int
+conn_setup_params(connectionObject *self, PGconn *pgconn, char *query)
+{
+    const char *tmp;
+
+    query[0] = '\0';
+
+    if (self->encoding) free(self->encoding);
+    self->encoding = NULL;
+    self->equote = 0;
+
+    /* a placeholder: BEGIN doesn't set the level until it is known */
+    self->isolation_level = 1;
+    self->default_isolation = 1;
+
+    conn_read_equote(self, pgconn);
+
+    tmp = PQparameterStatus(pgconn, "DateStyle");
+    Dprintf("conn_setup_params: server DateStyle: %s", tmp ? tmp : "unknown");
+    if (tmp == NULL || strncmp(tmp, "ISO", 3) != 0)
+        strcat(query, conn_datestyle);
+
+    tmp = PQparameterStatus(pgconn, "client_encoding");
+    if (tmp != NULL) {
+        if (conn_store_encoding(self, tmp) == -1)
+            return -1;
+    }
+    else {
+        if (query[0]) strcat(query, ";");
+        strcat(query, conn_encoding);
+    }
+
+    return 0;
+}
+
+/* conn_read_isolation_level - store the isolation level from a SHOW result
+
+   must be called holding the GIL: sets an exception on error */
+
+static int
+conn_read_isolation_level(connectionObject *self, PGresult *pgres)
+{
+    const char *data;
+
+    static const char lvl1a[] = "read uncommitted";
+    static const char lvl1b[] = "read committed";
+    static const char lvl2a[] = "repeatable read";
+    static const char lvl2b[] = "serializable";
 
     if (pgres == NULL || PQresultStatus(pgres) != PGRES_TUPLES_OK) {
         PyErr_SetString(OperationalError,
                          "can't fetch default_isolation_level");
-        PQfinish(pgconn);
-        IFCLEARPGRES(pgres);
-        Py_UNBLOCK_THREADS;
-        pthread_mutex_unlock(&self->lock);
-        Py_BLOCK_THREADS;
         return -1;
     }
+
     data = PQgetvalue(pgres, 0, 0);
     if ((strncmp(lvl1a, data, strlen(lvl1a)) == 0)
         || (strncmp(lvl1b, data, strlen(lvl1b)) == 0))
@@ -247,12 +337,136 @@ conn_setup(connectionObject *self, PGconn *pgconn)
         self->isolation_level = 2;
     else
         self->isolation_level = 2;
-    CLEARPGRES(pgres);
+
+    return 0;
+}
+
+/* conn_setup - setup and read basic information about the connection */
+
+int
+conn_setup(connectionObject *self, PGconn *pgconn)
+{
+    PGresult *pgres;
+    char query[SETUP_QUERY_SIZE];
+    int res = 0;
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&self->lock);
+    Py_BLOCK_THREADS;
+
+    if (conn_setup_params(self, pgconn, query) == -1)
+        res = -1;
+
+    /* send the queries needed, if any, in a single round trip */
+    else if (query[0]) {
+        Dprintf("conn_setup: sending setup queries: %s", query);
+        Py_UNBLOCK_THREADS;
+        res = PQsendQuery(pgconn, query) ? 0 : -1;
+        Py_BLOCK_THREADS;
+
+        if (res == -1)
+            PyErr_SetString(OperationalError, PQerrorMessage(pgconn));
+
+        while (1) {
+            Py_UNBLOCK_THREADS;
+            pgres = PQgetResult(pgconn);
+            Py_BLOCK_THREADS;
+            if (pgres == NULL) break;
+            if (res == 0)
+                res = conn_read_setup_result(self, pgres);
+            CLEARPGRES(pgres);
+        }
+    }
+
+    if (res == -1) {
+        PQfinish(pgconn);
+    }
+
+    Py_UNBLOCK_THREADS;
+    pthread_mutex_unlock(&self->lock);
+    Py_END_ALLOW_THREADS;
+
+    return res;
+}
+
+/* conn_resolve_isolation_level - read the server default isolation level
+
+   the level is read only when a different level is set in a transaction,
+   to save the round trip on connection; until then the transactions are
+   started with the server default level and isolation_level reports 1.
+   Nothing is done if the query can't be executed without side effects: if
+   an async query is running or the transaction is aborted. */
+
+int
+conn_resolve_isolation_level(connectionObject *self)
+{
+    PGresult *pgres;
+    int res, status;
+
+    if (!self->default_isolation || self->pgconn == NULL
+            || self->async_cursor != NULL
+            || self->status == CONN_STATUS_CONNECTING
+            || self->status == CONN_STATUS_SETUP)
+        return 0;
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&self->lock);
+    status = PQtransactionStatus(self->pgconn);
+    if (status != PQTRANS_IDLE && status != PQTRANS_INTRANS) {
+        pthread_mutex_unlock(&self->lock);
+        Py_BLOCK_THREADS;
+        return 0;
+    }
+    pgres = PQexec(self->pgconn, conn_isolevel);
+    Py_BLOCK_THREADS;
+
+    if (pgres != NULL && PQresultStatus(pgres) == PGRES_FATAL_ERROR) {
+        PyErr_SetString(OperationalError, PQresultErrorMessage(pgres));
+        res = -1;
+    }
+    else
+        res = conn_read_isolation_level(self, pgres);
+    if (res == 0)
+        self->default_isolation = 0;
+    IFCLEARPGRES(pgres);
 
     Py_UNBLOCK_THREADS;
     pthread_mutex_unlock(&self->lock);
     Py_END_ALLOW_THREADS;
 
+    return res;
+}
+
+/* conn_read_params - store the parameters of an established connection
+
+   doesn't close pgconn on error */
+
+static int
+conn_read_params(connectionObject *self, PGconn *pgconn)
+{
+    /* the cancel data can be used by another thread while a query runs */
+    self->cancel = PQgetCancel(pgconn);
+    if (self->cancel == NULL) {
+        Dprintf("conn_connect: PQgetCancel() FAILED");
+        PyErr_SetString(OperationalError, "PQgetCancel() failed");
+        return -1;
+    }
+
+    if (PQsetnonblocking(pgconn, 1) != 0) {
+        Dprintf("conn_connect: PQsetnonblocking() FAILED");
+        PyErr_SetString(OperationalError, "PQsetnonblocking() failed");
+        return -1;
+    }
+
+#ifdef HAVE_PQPROTOCOL3
+    self->protocol = PQprotocolVersion(pgconn);
+#else
+    self->protocol = 2;
+#endif
+    Dprintf("conn_connect: using protocol %d", self->protocol);
+
+    self->server_version = (int)PQserverVersion(pgconn);
+
     return 0;
 }
 
@@ -288,26 +502,184 @@ conn_connect(connectionObject *self)
     if (conn_setup(self, pgconn) == -1)
         return -1;
 
-    if (PQsetnonblocking(pgconn, 1) != 0) {
-        Dprintf("conn_connect: PQsetnonblocking() FAILED");
-        PyErr_SetString(OperationalError, "PQsetnonblocking() failed");
+    if (conn_read_params(self, pgconn) == -1) {
         PQfinish(pgconn);
         return -1;
     }
 
-#ifdef HAVE_PQPROTOCOL3
-    self->protocol = PQprotocolVersion(pgconn);
-#else
-    self->protocol = 2;
-#endif
-    Dprintf("conn_connect: using protocol %d", self->protocol);
+    self->pgconn = pgconn;
+    return 0;
+}
 
-    self->server_version = (int)PQserverVersion(pgconn);
+/* conn_connect_async - start a connection without blocking
+
+   the connection is established by conn_poll_connect() */
+
+int
+conn_connect_async(connectionObject *self)
+{
+    PGconn *pgconn;
+
+    Py_BEGIN_ALLOW_THREADS;
+    pgconn = PQconnectStart(self->dsn);
+    Py_END_ALLOW_THREADS;
+
+    Dprintf("conn_connect_async: new postgresql connection at %p", pgconn);
+
+    if (pgconn == NULL)
+    {
+        Dprintf("conn_connect_async: PQconnectStart(%s) FAILED", self->dsn);
+        PyErr_SetString(OperationalError, "PQconnectStart() failed");
+        return -1;
+    }
+    else if (PQstatus(pgconn) == CONNECTION_BAD)
+    {
+        Dprintf("conn_connect_async: PQconnectStart(%s) returned BAD",
+            self->dsn);
+        PyErr_SetString(OperationalError, PQerrorMessage(pgconn));
+        PQfinish(pgconn);
+        return -1;
+    }
+
+    PQsetNoticeProcessor(pgconn, conn_notice_callback, (void*)self);
+
+    if (PQsetnonblocking(pgconn, 1) != 0) {
+        Dprintf("conn_connect_async: PQsetnonblocking() FAILED");
+        PyErr_SetString(OperationalError, "PQsetnonblocking() failed");
+        PQfinish(pgconn);
+        return -1;
+    }
 
     self->pgconn = pgconn;
+    self->status = CONN_STATUS_CONNECTING;
     return 0;
 }
 
+/* _conn_poll_setup - read the results of the setup queries */
+
+static int
+_conn_poll_setup(connectionObject *self)
+{
+    PGresult *pgres;
+    int flush, busy = 0, res = 0, ret = 0;
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&self->lock);
+    flush = PQflush(self->pgconn);
+    if (flush >= 0 && (res = PQconsumeInput(self->pgconn)))
+        busy = PQisBusy(self->pgconn);
+    pthread_mutex_unlock(&self->lock);
+    Py_END_ALLOW_THREADS;
+
+    if (flush < 0 || res == 0) {
+        PyErr_SetString(OperationalError, PQerrorMessage(self->pgconn));
+        return -1;
+    }
+    if (flush == 1)
+        return PSYCO_POLL_WRITE;
+    if (busy)
+        return PSYCO_POLL_READ;
+
+    /* all the results are available: PQgetResult() doesn't block */
+    while ((pgres = PQgetResult(self->pgconn)) != NULL) {
+        if (ret == 0)
+            ret = conn_read_setup_result(self, pgres);
+        CLEARPGRES(pgres);
+    }
+    if (ret == -1)
+        return -1;
+
+    self->status = CONN_STATUS_READY;
+    return PSYCO_POLL_OK;
+}
+
+/* _conn_poll_connecting - advance the connection and send the setup queries
+
+   the queries, if needed, are sent all together, to be read in a single
+   round trip */
+
+static int
+_conn_poll_connecting(connectionObject *self)
+{
+    PostgresPollingStatusType res;
+    char query[SETUP_QUERY_SIZE];
+    int sent;
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&self->lock);
+    res = PQconnectPoll(self->pgconn);
+    pthread_mutex_unlock(&self->lock);
+    Py_END_ALLOW_THREADS;
+
+    Dprintf("conn_poll_connect: PQconnectPoll returned %d", res);
+
+    switch (res) {
+    case PGRES_POLLING_OK:
+        break;
+    case PGRES_POLLING_READING:
+        return PSYCO_POLL_READ;
+    case PGRES_POLLING_FAILED:
+        PyErr_SetString(OperationalError, PQerrorMessage(self->pgconn));
+        return -1;
+    default:
+        return PSYCO_POLL_WRITE;
+    }
+
+    if (conn_setup_params(self, self->pgconn, query) == -1)
+        return -1;
+    if (conn_read_params(self, self->pgconn) == -1)
+        return -1;
+
+    if (!query[0]) {
+        self->status = CONN_STATUS_READY;
+        return PSYCO_POLL_OK;
+    }
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&self->lock);
+    sent = PQsendQuery(self->pgconn, query);
+    pthread_mutex_unlock(&self->lock);
+    Py_END_ALLOW_THREADS;
+
+    if (!sent) {
+        PyErr_SetString(OperationalError, PQerrorMessage(self->pgconn));
+        return -1;
+    }
+
+    self->status = CONN_STATUS_SETUP;
+    return _conn_poll_setup(self);
+}
+
+/* conn_poll_connect - advance the connection started by conn_connect_async
+
+   return PSYCO_POLL_OK when the connection is ready to be used, else
+   PSYCO_POLL_READ/PSYCO_POLL_WRITE to be called again when the socket is
+   readable/writable; on error close the connection and return -1 */
+
+int
+conn_poll_connect(connectionObject *self)
+{
+    int res;
+
+    if (self->status == CONN_STATUS_CONNECTING)
+        res = _conn_poll_connecting(self);
+    else
+        res = _conn_poll_setup(self);
+
+    if (res == -1) {
+        Py_BEGIN_ALLOW_THREADS;
+        pthread_mutex_lock(&self->lock);
+        PQfinish(self->pgconn);
+        self->pgconn = NULL;
+        self->closed = 1;
+        self->status = CONN_STATUS_READY;
+        pthread_mutex_unlock(&self->lock);
+        Py_END_ALLOW_THREADS;
+    }
+
+    return res;
+}
+
 /* conn_close - do anything needed to shut down the connection */
 
 void
@@ -351,6 +723,9 @@ conn_commit(connectionObject *self)
 {
     int res;
 
+    if (pq_sync_pipeline(self) < 0)
+        return -1;
+
     res = pq_commit(self);
     return res;
 }
@@ -360,8 +735,17 @@ conn_commit(connectionObject *self)
 int
 conn_rollback(connectionObject *self)
 {
+    Py_ssize_t i;
     int res;
 
+    /* the queries still in the pipeline are dropped, not executed */
+    if (self->pipeline != NULL) {
+        for (i = 0; i < PyList_GET_SIZE(self->pipeline); i++)
+            ((cursorObject *)PyList_GET_ITEM(self->pipeline, i))->queued = 0;
+        if (PyList_SetSlice(self->pipeline, 0, i, NULL) < 0)
+            return -1;
+    }
+
     res = pq_abort(self);
     return res;
 }
@@ -375,8 +759,21 @@ conn_switch_isolation_level(connectionObject *self, int level)
     char *error = NULL;
     int res = 0;
 
+    /* the server default level must be known to compare it, if a
+       transaction begun at that level may have to be aborted; else the new
+       level can just be set, without a round trip */
+    if (level > 0 && self->status != CONN_STATUS_READY
+            && conn_resolve_isolation_level(self) < 0)
+        return -1;
+
     /* if the current isolation level is equal to the requested one don't switch */
-    if (self->isolation_level == level) return 0;
+    if (self->isolation_level == level) {
+        self->default_isolation = 0;
+        return 0;
+    }
+
+    if (pq_sync_pipeline(self) < 0)
+        return -1;
 
     Py_BEGIN_ALLOW_THREADS;
     pthread_mutex_lock(&self->lock);
@@ -387,6 +784,7 @@ conn_switch_isolation_level(connectionObject *self, int level)
         res = pq_abort_locked(self, &pgres, &error);
     }
     self->isolation_level = level;
+    self->default_isolation = 0;
 
     Dprintf("conn_switch_isolation_level: switched to level %d", level);
 
@@ -399,6 +797,42 @@ conn_switch_isolation_level(connectionObject *self, int level)
     return res;
 }
 
+/* conn_set_session - set the autocommit and read only session modes
+
+   -1 leaves a setting unchanged. Switching off autocommit restores the
+   server default isolation level. The read only setting is not sent to the
+   backend here but before the next query. */
+
+int
+conn_set_session(connectionObject *self, int autocommit, int readonly)
+{
+    if (self->status != CONN_STATUS_READY) {
+        PyErr_SetString(ProgrammingError,
+            "set_session cannot be used inside a transaction");
+        return -1;
+    }
+
+    if (autocommit == 1 && conn_switch_isolation_level(self, 0) < 0)
+        return -1;
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&self->lock);
+
+    if (autocommit == 0 && self->isolation_level == 0) {
+        self->isolation_level = 1;
+        self->default_isolation = 1;
+    }
+    if (readonly != -1 && readonly != self->readonly) {
+        self->readonly = readonly;
+        self->session_pending = 1;
+    }
+
+    pthread_mutex_unlock(&self->lock);
+    Py_END_ALLOW_THREADS;
+
+    return 0;
+}
+
 /* conn_set_client_encoding - switch client encoding on connection */
 
 int
@@ -422,18 +856,15 @@ conn_set_client_encoding(connectionObject *self, const char *enc)
     PyOS_snprintf(query, 47, "SET client_encoding = '%s'", enc);
 
     /* abort the current transaction, to set the encoding ouside of
-       transactions */
-    res = pq_abort_locked(self, &pgres, &error);
+       transactions (in the same round trip) */
+    res = pq_abort_execute_locked(self, query, &pgres, &error);
 
     if (res == 0) {
-        res = pq_execute_command_locked(self, query, &pgres, &error);
-        if (res == 0) {
-            /* no error, we can proceeed and store the new encoding */
-            if (self->encoding) free(self->encoding);
-            self->encoding = strdup(enc);
-            Dprintf("conn_set_client_encoding: set encoding to %s",
-                    self->encoding);
-        }
+        /* no error, we can proceeed and store the new encoding */
+        if (self->encoding) free(self->encoding);
+        self->encoding = strdup(enc);
+        Dprintf("conn_set_client_encoding: set encoding to %s",
+                self->encoding);
     }
 
 
@@ -38,6 +38,7 @@
 #include "psycopg/connection.h"
 #include "psycopg/cursor.h"
 #include "psycopg/lobject.h"
+#include "psycopg/pqpath.h"
 
 /** DBAPI methods **/
 
@@ -65,6 +66,7 @@ psyco_conn_cursor(connectionObject *self, PyObject *args, PyObject *keywds)
     }
 
     EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
 
     Dprintf("psyco_conn_cursor: new cursor for connection at %p", self);
     Dprintf("psyco_conn_cursor:     parameters: name = %s", name);
@@ -119,6 +121,7 @@ static PyObject *
 psyco_conn_commit(connectionObject *self, PyObject *args)
 {
     EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
 
     if (!PyArg_ParseTuple(args, "")) return NULL;
 
@@ -139,6 +142,7 @@ static PyObject *
 psyco_conn_rollback(connectionObject *self, PyObject *args)
 {
     EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
 
     if (!PyArg_ParseTuple(args, "")) return NULL;
 
@@ -163,6 +167,7 @@ psyco_conn_set_isolation_level(connectionObject *self, PyObject *args)
     int level = 1;
 
     EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
 
     if (!PyArg_ParseTuple(args, "i", &level)) return NULL;
 
@@ -183,6 +188,41 @@ psyco_conn_set_isolation_level(connectionObject *self, PyObject *args)
     return Py_None;
 }
 
+/* set_session method - set the autocommit and read only modes */
+
+#define psyco_conn_set_session_doc \
+"set_session(readonly=None, autocommit=None) -- Set the session modes.\n\n" \
+"In read only mode the transactions can't modify the database; in\n" \
+"autocommit mode no transaction is started. None leaves a mode unchanged."
+
+static PyObject *
+psyco_conn_set_session(connectionObject *self, PyObject *args,
+                       PyObject *kwargs)
+{
+    PyObject *readonly = Py_None, *autocommit = Py_None;
+    int r = -1, a = -1;
+
+    static char *kwlist[] = {"readonly", "autocommit", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|OO", kwlist,
+                                     &readonly, &autocommit))
+        return NULL;
+
+    EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
+
+    if (readonly != Py_None && (r = PyObject_IsTrue(readonly)) < 0)
+        return NULL;
+    if (autocommit != Py_None && (a = PyObject_IsTrue(autocommit)) < 0)
+        return NULL;
+
+    if (conn_set_session(self, a, r) < 0)
+        return NULL;
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
 /* set_client_encoding method - set client encoding */
 
 #define psyco_conn_set_client_encoding_doc \
@@ -196,6 +236,7 @@ psyco_conn_set_client_encoding(connectionObject *self, PyObject *args)
     size_t i, j;
 
     EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
 
     if (!PyArg_ParseTuple(args, "s", &enc)) return NULL;
 
@@ -294,6 +335,7 @@ psyco_conn_lobject(connectionObject *self, PyObject *args, PyObject *keywds)
     }
 
     EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
 
     Dprintf("psyco_conn_lobject: new lobject for connection at %p", self);
     Dprintf("psyco_conn_lobject:     parameters: oid = %d, mode = %s",
@@ -358,16 +400,32 @@ psyco_conn_get_backend_pid(connectionObject *self)
 /* reset the currect connection */
 
 #define psyco_conn_reset_doc \
-"reset() -- Reset current connection to defaults."
+"reset(discard=False) -- Reset current connection to defaults.\n\n" \
+"If discard is true drop all the session state using DISCARD ALL."
 
 static PyObject *
-psyco_conn_reset(connectionObject *self)
+psyco_conn_reset(connectionObject *self, PyObject *args, PyObject *kwargs)
 {
     int res;
+    PyObject *discard = Py_False;
+
+    static char *kwlist[] = {"discard", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O", kwlist, &discard))
+        return NULL;
 
     EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
+
+    if ((res = PyObject_IsTrue(discard)) < 0)
+        return NULL;
 
-    if (pq_reset(self) < 0)
+    if (pq_reset(self, res) < 0)
+        return NULL;
+
+    /* the notifications received are not interesting anymore */
+    if (PySequence_DelSlice(self->notifies, 0,
+                            PyList_GET_SIZE(self->notifies)) < 0)
         return NULL;
 
     res = conn_setup(self, self->pgconn);
@@ -378,6 +436,207 @@ psyco_conn_reset(connectionObject *self)
     return Py_None;
 }
 
+/* return the file descriptor of the connection socket */
+
+#define psyco_conn_fileno_doc \
+"fileno() -> int -- Return the file descriptor of the connection socket."
+
+static PyObject *
+psyco_conn_fileno(connectionObject *self)
+{
+    long int socket;
+
+    EXC_IF_CONN_CLOSED(self);
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&(self->lock));
+    socket = (long int)PQsocket(self->pgconn);
+    pthread_mutex_unlock(&(self->lock));
+    Py_END_ALLOW_THREADS;
+
+    return PyInt_FromLong(socket);
+}
+
+/* send the data queued on the connection without blocking */
+
+#define psyco_conn_flush_doc \
+"flush() -> bool -- Try to send the data queued to the backend.\n\n" \
+"Return True if all data has been sent, False if there is still data\n" \
+"queued: wait for the socket to be writable and call flush() again."
+
+static PyObject *
+psyco_conn_flush(connectionObject *self)
+{
+    int res;
+
+    EXC_IF_CONN_CLOSED(self);
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&(self->lock));
+    res = PQflush(self->pgconn);
+    pthread_mutex_unlock(&(self->lock));
+    Py_END_ALLOW_THREADS;
+
+    if (res < 0) {
+        PyErr_SetString(OperationalError, PQerrorMessage(self->pgconn));
+        return NULL;
+    }
+
+    return PyBool_FromLong(res == 0);
+}
+
+/* cancel the query running on the connection */
+
+#define psyco_conn_cancel_doc \
+"cancel() -- Ask the backend to cancel the query in progress.\n\n" \
+"The method can be called from a different thread than the one running\n" \
+"the query, which will fail with an OperationalError if the request is\n" \
+"honoured. Nothing happens if no query is running."
+
+static PyObject *
+psyco_conn_cancel(connectionObject *self)
+{
+    char errbuf[256];
+    int res;
+
+    EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
+
+    /* don't take the connection lock: it is held by the running query and
+       PGcancel is safe to use concurrently with the connection */
+    Py_BEGIN_ALLOW_THREADS;
+    res = PQcancel(self->cancel, errbuf, sizeof(errbuf));
+    Py_END_ALLOW_THREADS;
+
+    if (res == 0) {
+        PyErr_SetString(OperationalError, errbuf);
+        return NULL;
+    }
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+/* read the data available from the backend without blocking */
+
+#define psyco_conn_poll_doc \
+"poll() -> int -- Read the data available from the backend without blocking.\n\n" \
+"The notifications received are appended to `notifies`. Return POLL_OK,\n" \
+"or POLL_READ/POLL_WRITE if an asynchronous query is still running and\n" \
+"poll() should be called again when the socket is readable/writable.\n\n" \
+"On a connection created with async=1 poll() drives the connection\n" \
+"establishment until it returns POLL_OK."
+
+static PyObject *
+psyco_conn_poll(connectionObject *self)
+{
+    int flush, busy = 0, res = 0;
+
+    EXC_IF_CONN_CLOSED(self);
+
+    if (self->status == CONN_STATUS_CONNECTING
+            || self->status == CONN_STATUS_SETUP) {
+        res = conn_poll_connect(self);
+        if (res < 0) return NULL;
+        return PyInt_FromLong(res);
+    }
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&(self->lock));
+    flush = PQflush(self->pgconn);
+    if (flush >= 0 && (res = PQconsumeInput(self->pgconn)))
+        busy = PQisBusy(self->pgconn);
+    pthread_mutex_unlock(&(self->lock));
+    Py_END_ALLOW_THREADS;
+
+    if (flush < 0 || res == 0) {
+        PyErr_SetString(OperationalError, PQerrorMessage(self->pgconn));
+        return NULL;
+    }
+
+    conn_notice_process(self);
+    conn_notifies_process(self);
+
+    if (flush == 1)
+        return PyInt_FromLong(PSYCO_POLL_WRITE);
+    if (busy && self->async_cursor != NULL)
+        return PyInt_FromLong(PSYCO_POLL_READ);
+    return PyInt_FromLong(PSYCO_POLL_OK);
+}
+
+/* pipeline mode - send several queries in a single round trip */
+
+#define psyco_conn_start_pipeline_doc \
+"start_pipeline() -- Enter pipeline mode.\n\n" \
+"In pipeline mode the queries executed on the connection cursors are\n" \
+"queued and sent together by sync_pipeline(), or when the results of a\n" \
+"queued query are fetched."
+
+static PyObject *
+psyco_conn_start_pipeline(connectionObject *self)
+{
+    EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
+
+    if (self->async_cursor != NULL) {
+        PyErr_SetString(ProgrammingError,
+                        "asynchronous query already in execution");
+        return NULL;
+    }
+
+    if (self->pipeline == NULL && !(self->pipeline = PyList_New(0)))
+        return NULL;
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+#define psyco_conn_sync_pipeline_doc \
+"sync_pipeline() -- Execute the queries queued in the pipeline."
+
+static PyObject *
+psyco_conn_sync_pipeline(connectionObject *self)
+{
+    EXC_IF_CONN_CLOSED(self);
+    EXC_IF_CONN_CONNECTING(self);
+
+    if (self->pipeline == NULL) {
+        PyErr_SetString(ProgrammingError, "the connection is not in "
+                        "pipeline mode");
+        return NULL;
+    }
+
+    if (pq_sync_pipeline(self) < 0)
+        return NULL;
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+#define psyco_conn_end_pipeline_doc \
+"end_pipeline() -- Execute the queries queued and exit pipeline mode."
+
+static PyObject *
+psyco_conn_end_pipeline(connectionObject *self)
+{
+    int res;
+
+    EXC_IF_CONN_CLOSED(self);
+
+    if (self->pipeline == NULL) {
+        Py_INCREF(Py_None);
+        return Py_None;
+    }
+
+    res = pq_sync_pipeline(self);
+    Py_CLEAR(self->pipeline);
+    if (res < 0)
+        return NULL;
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
 #endif
 
 static PyObject *
@@ -406,6 +665,8 @@ static struct PyMethodDef connectionObject_methods[] = {
 #ifdef PSYCOPG_EXTENSIONS
     {"set_isolation_level", (PyCFunction)psyco_conn_set_isolation_level,
      METH_VARARGS, psyco_conn_set_isolation_level_doc},
+    {"set_session", (PyCFunction)psyco_conn_set_session,
+     METH_VARARGS|METH_KEYWORDS, psyco_conn_set_session_doc},
     {"set_client_encoding", (PyCFunction)psyco_conn_set_client_encoding,
      METH_VARARGS, psyco_conn_set_client_encoding_doc},
     {"get_transaction_status", (PyCFunction)psyco_conn_get_transaction_status,
@@ -417,7 +678,21 @@ static struct PyMethodDef connectionObject_methods[] = {
     {"lobject", (PyCFunction)psyco_conn_lobject,
      METH_VARARGS|METH_KEYWORDS, psyco_conn_lobject_doc},
     {"reset", (PyCFunction)psyco_conn_reset,
-     METH_NOARGS, psyco_conn_reset_doc},
+     METH_VARARGS|METH_KEYWORDS, psyco_conn_reset_doc},
+    {"fileno", (PyCFunction)psyco_conn_fileno,
+     METH_NOARGS, psyco_conn_fileno_doc},
+    {"flush", (PyCFunction)psyco_conn_flush,
+     METH_NOARGS, psyco_conn_flush_doc},
+    {"cancel", (PyCFunction)psyco_conn_cancel,
+     METH_NOARGS, psyco_conn_cancel_doc},
+    {"poll", (PyCFunction)psyco_conn_poll,
+     METH_NOARGS, psyco_conn_poll_doc},
+    {"start_pipeline", (PyCFunction)psyco_conn_start_pipeline,
+     METH_NOARGS, psyco_conn_start_pipeline_doc},
+    {"sync_pipeline", (PyCFunction)psyco_conn_sync_pipeline,
+     METH_NOARGS, psyco_conn_sync_pipeline_doc},
+    {"end_pipeline", (PyCFunction)psyco_conn_end_pipeline,
+     METH_NOARGS, psyco_conn_end_pipeline_doc},
 #endif
     {NULL}
 };
@@ -428,9 +703,6 @@ static struct PyMemberDef connectionObject_members[] = {
 #ifdef PSYCOPG_EXTENSIONS
     {"closed", T_LONG, offsetof(connectionObject, closed), RO,
         "True if the connection is closed."},
-    {"isolation_level", T_LONG,
-        offsetof(connectionObject, isolation_level), RO,
-        "The current isolation level."},
     {"encoding", T_STRING, offsetof(connectionObject, encoding), RO,
         "The current client encoding."},
     {"notices", T_OBJECT, offsetof(connectionObject, notice_list), RO},
@@ -454,10 +726,52 @@ static struct PyMemberDef connectionObject_members[] = {
     {NULL}
 };
 
+#ifdef PSYCOPG_EXTENSIONS
+static PyObject *
+psyco_conn_autocommit_get(connectionObject *self)
+{
+    PyObject *ret = self->isolation_level == 0 ? Py_True : Py_False;
+    Py_INCREF(ret);
+    return ret;
+}
+
+/* the server default level is not queried on connection: report it as
+   unknown rather than guessing it */
+static PyObject *
+psyco_conn_isolation_level_get(connectionObject *self)
+{
+    if (self->default_isolation) {
+        Py_INCREF(Py_None);
+        return Py_None;
+    }
+    return PyInt_FromLong(self->isolation_level);
+}
+
+static PyObject *
+psyco_conn_readonly_get(connectionObject *self)
+{
+    PyObject *ret = self->readonly ? Py_True : Py_False;
+    Py_INCREF(ret);
+    return ret;
+}
+#endif
+
 #define EXCEPTION_GETTER(exc) \
     { #exc, psyco_conn_get_exception, NULL, exc ## _doc, &exc }
 
 static struct PyGetSetDef connectionObject_getsets[] = {
+#ifdef PSYCOPG_EXTENSIONS
+    { "autocommit",
+        (getter)psyco_conn_autocommit_get, NULL,
+        "True if the connection is in autocommit mode.", NULL },
+    { "isolation_level",
+        (getter)psyco_conn_isolation_level_get, NULL,
+        "The current isolation level, None if it is the server default.",
+        NULL },
+    { "readonly",
+        (getter)psyco_conn_readonly_get, NULL,
+        "True if the session is read only.", NULL },
+#endif
     /* DBAPI-2.0 extensions (exception objects) */
     EXCEPTION_GETTER(Error),
     EXCEPTION_GETTER(Warning),
@@ -476,7 +790,7 @@ static struct PyGetSetDef connectionObject_getsets[] = {
 /* initialization and finalization methods */
 
 static int
-connection_setup(connectionObject *self, const char *dsn)
+connection_setup(connectionObject *self, const char *dsn, long int async)
 {
     char *pos;
     int res;
@@ -493,16 +807,21 @@ connection_setup(connectionObject *self, const char *dsn)
     self->status = CONN_STATUS_READY;
     self->critical = NULL;
     self->async_cursor = NULL;
+    self->pipeline = NULL;
     self->pgconn = NULL;
+    self->cancel = NULL;
     self->mark = 0;
     self->string_types = PyDict_New();
     self->binary_types = PyDict_New();
     self->notice_pending = NULL;
     self->encoding = NULL;
+    self->default_isolation = 0;
+    self->readonly = 0;
+    self->session_pending = 0;
 
     pthread_mutex_init(&(self->lock), NULL);
 
-    if (conn_connect(self) != 0) {
+    if ((async ? conn_connect_async(self) : conn_connect(self)) != 0) {
         Dprintf("connection_init: FAILED");
         res = -1;
     }
@@ -538,8 +857,10 @@ connection_dealloc(PyObject* obj)
     if (self->dsn) free(self->dsn);
     if (self->encoding) free(self->encoding);
     if (self->critical) free(self->critical);
+    if (self->cancel) PQfreeCancel(self->cancel);
 
     Py_CLEAR(self->async_cursor);
+    Py_CLEAR(self->pipeline);
     Py_CLEAR(self->notice_list);
     Py_CLEAR(self->notice_filter);
     Py_CLEAR(self->notifies);
@@ -560,11 +881,14 @@ static int
 connection_init(PyObject *obj, PyObject *args, PyObject *kwds)
 {
     const char *dsn;
+    long int async = 0;
+
+    static char *kwlist[] = {"dsn", "async", NULL};
 
-    if (!PyArg_ParseTuple(args, "s", &dsn))
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|l", kwlist, &dsn, &async))
         return -1;
 
-    return connection_setup((connectionObject *)obj, dsn);
+    return connection_setup((connectionObject *)obj, dsn, async);
 }
 
 static PyObject *
@@ -591,6 +915,7 @@ static int
 connection_traverse(connectionObject *self, visitproc visit, void *arg)
 {
     Py_VISIT(self->async_cursor);
+    Py_VISIT(self->pipeline);
     Py_VISIT(self->notice_list);
     Py_VISIT(self->notice_filter);
     Py_VISIT(self->notifies);
@@ -603,7 +928,7 @@ connection_traverse(connectionObject *self, visitproc visit, void *arg)
 /* object type */
 
 #define connectionType_doc \
-"connection(dsn, ...) -> new connection object\n\n" \
+"connection(dsn, async=0) -> new connection object\n\n" \
 ":Groups:\n" \
 "  * `DBAPI-2.0 errors`: Error, Warning, InterfaceError,\n" \
 "    DatabaseError, InternalError, OperationalError,\n" \
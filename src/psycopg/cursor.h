@@ -47,6 +47,7 @@ typedef struct {
     int closed:1;            /* 1 if the cursor is closed */
     int notuples:1;          /* 1 if the command was not a SELECT query */
     int needsfetch:1;        /* 1 if a call to pq_fetch is pending */
+    int queued:1;            /* 1 if the query waits in the conn pipeline */
 
     long int rowcount;       /* number of rows affected by last execute */
     long int columns;        /* number of columns fetched from the db */
@@ -54,6 +55,8 @@ typedef struct {
     long int row;            /* the row counter for fetch*() operations */
     long int mark;           /* transaction marker, copied from conn */
 
+    double fetch_timeout;    /* max seconds to wait for an async result */
+
     PyObject *description;   /* read-only attribute: sequence of 7-item
                                 sequences.*/
 
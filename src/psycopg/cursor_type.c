@@ -304,11 +304,14 @@ static PyObject *_psyco_curs_validate_sql_basic(
 }
 
 #define psyco_curs_execute_doc \
-"execute(query, vars=None, async=0) -- Execute query with bound vars."
+"execute(query, vars=None, async=0, timeout=None) -- Execute query with bound vars.\n\n" \
+"If timeout is given (in seconds) the query is cancelled if it doesn't\n" \
+"complete in time: OperationalError is raised in that case."
 
 static int
 _psyco_curs_execute(cursorObject *self,
-                    PyObject *operation, PyObject *vars, long int async)
+                    PyObject *operation, PyObject *vars, long int async,
+                    double timeout)
 {
     int res = 0;
     PyObject *fquery, *cvt = NULL;
@@ -326,6 +329,10 @@ _psyco_curs_execute(cursorObject *self,
     pthread_mutex_unlock(&(self->conn->lock));
     Py_END_ALLOW_THREADS;
 
+    /* the cursor can hold a single result: complete its queued query */
+    if (self->queued && pq_sync_pipeline(self->conn) < 0)
+        return 0;
+
     operation = _psyco_curs_validate_sql_basic(self, operation);
 
     /* Any failure from here forward should 'goto fail' rather than 'return 0'
@@ -430,7 +437,19 @@ _psyco_curs_execute(cursorObject *self,
 
     /* At this point, the SQL statement must be str, not unicode */
 
-    res = pq_execute(self, PyString_AS_STRING(self->query), async);
+    /* in pipeline mode plain queries are only queued; the multi-statement
+       ones are executed at once */
+    if (self->conn->pipeline != NULL && !async && timeout <= 0
+            && self->name == NULL) {
+        if ((res = pq_queue_pipeline(self)) < 0) { goto fail; }
+        if (res == 0) {
+            res = 1;
+            goto cleanup;
+        }
+    }
+
+    res = pq_execute_timeout(self, PyString_AS_STRING(self->query), async,
+                             timeout);
     Dprintf("psyco_curs_execute: res = %d, pgres = %p", res, self->pgres);
     if (res == -1) { goto fail; }
 
@@ -455,15 +474,32 @@ static PyObject *
 psyco_curs_execute(cursorObject *self, PyObject *args, PyObject *kwargs)
 {
     long int async = 0;
-    PyObject *vars = NULL, *operation = NULL;
+    double timeout = 0;
+    PyObject *vars = NULL, *operation = NULL, *otimeout = Py_None;
 
-    static char *kwlist[] = {"query", "vars", "async", NULL};
+    static char *kwlist[] = {"query", "vars", "async", "timeout", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|Ol", kwlist,
-                                     &operation, &vars, &async)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|OlO", kwlist,
+                                     &operation, &vars, &async, &otimeout)) {
         return NULL;
     }
 
+    if (otimeout != Py_None) {
+        timeout = PyFloat_AsDouble(otimeout);
+        if (timeout == -1.0 && PyErr_Occurred())
+            return NULL;
+        if (timeout <= 0) {
+            PyErr_SetString(PyExc_ValueError, "timeout must be positive");
+            return NULL;
+        }
+        if (async) {
+            psyco_set_error(ProgrammingError, (PyObject*)self,
+                "timeout can't be used with async queries: "
+                "use fetch_timeout instead", NULL, NULL);
+            return NULL;
+        }
+    }
+
     if (self->name != NULL) {
         if (self->query != Py_None) {
             psyco_set_error(ProgrammingError, (PyObject*)self,
@@ -485,7 +521,7 @@ psyco_curs_execute(cursorObject *self, PyObject *args, PyObject *kwargs)
 
     EXC_IF_CURS_CLOSED(self);
 
-    if (_psyco_curs_execute(self, operation, vars, async)) {
+    if (_psyco_curs_execute(self, operation, vars, async, timeout)) {
         Py_INCREF(Py_None);
         return Py_None;
     }
@@ -528,7 +564,7 @@ psyco_curs_executemany(cursorObject *self, PyObject *args, PyObject *kwargs)
     }
 
     while ((v = PyIter_Next(vars)) != NULL) {
-        if (_psyco_curs_execute(self, operation, v, 0) == 0) {
+        if (_psyco_curs_execute(self, operation, v, 0, 0) == 0) {
             Py_DECREF(v);
             Py_XDECREF(iter);
             return NULL;
@@ -671,6 +707,13 @@ _psyco_curs_prefetch(cursorObject *self)
     pthread_mutex_unlock(&(self->conn->lock));
     Py_END_ALLOW_THREADS;
 
+    /* the query is still in the pipeline: execute it now */
+    if (self->queued) {
+        if (pq_sync_pipeline(self->conn) < 0)
+            return -1;
+        return 0;
+    }
+
     if (self->pgres == NULL || self->needsfetch) {
         self->needsfetch = 0;
         Dprintf("_psyco_curs_prefetch: trying to fetch data");
@@ -684,29 +727,55 @@ _psyco_curs_prefetch(cursorObject *self)
     return i;
 }
 
+/* state of a value in the two-pass row building */
+#define CURS_NATIVE_NULL 0  /* the value is NULL */
+#define CURS_NATIVE_OK   1  /* the value is parsed */
+#define CURS_NATIVE_CAST 2  /* the typecaster must be called */
+
+/* rows parsed with the GIL released at time, and minimum number of cells
+   worth releasing it */
+#define CURS_NATIVE_BLOCK     1024
+#define CURS_NATIVE_MIN_CELLS 64
+
+typedef struct {
+    int status;
+    typecast_native val;
+} cursNativeCell;
+
 static PyObject *
 _psyco_curs_buildrow_fill(cursorObject *self, PyObject *res,
-                          int row, int n, int istuple)
+                          int row, int n, int istuple,
+                          const int *kinds, cursNativeCell *cells)
 {
     int i, len, err;
     const char *str;
     PyObject *val;
 
     for (i=0; i < n; i++) {
-        if (PQgetisnull(self->pgres, row, i)) {
-            str = NULL;
-            len = 0;
+        /* values already parsed by _psyco_curs_buildrows() */
+        if (cells != NULL && cells[i].status == CURS_NATIVE_NULL) {
+            Py_INCREF(Py_None);
+            val = Py_None;
         }
-        else {
-            str = PQgetvalue(self->pgres, row, i);
-            len = PQgetlength(self->pgres, row, i);
+        else if (cells != NULL && cells[i].status == CURS_NATIVE_OK) {
+            val = typecast_native_object(kinds[i], &(cells[i].val));
         }
+        else {
+            if (PQgetisnull(self->pgres, row, i)) {
+                str = NULL;
+                len = 0;
+            }
+            else {
+                str = PQgetvalue(self->pgres, row, i);
+                len = PQgetlength(self->pgres, row, i);
+            }
 
-        Dprintf("_psyco_curs_buildrow: row %ld, element %d, len %d",
-                self->row, i, len);
+            Dprintf("_psyco_curs_buildrow: row %ld, element %d, len %d",
+                    self->row, i, len);
 
-        val = typecast_cast(PyTuple_GET_ITEM(self->casts, i), str, len,
-                            (PyObject*)self);
+            val = typecast_cast(PyTuple_GET_ITEM(self->casts, i), str, len,
+                                (PyObject*)self);
+        }
 
         if (val) {
             Dprintf("_psyco_curs_buildrow: val->refcnt = "
@@ -744,7 +813,8 @@ _psyco_curs_buildrow(cursorObject *self, int row)
     int n;
 
     n = PQnfields(self->pgres);
-    return _psyco_curs_buildrow_fill(self, PyTuple_New(n), row, n, 1);
+    return _psyco_curs_buildrow_fill(self, PyTuple_New(n), row, n, 1,
+                                     NULL, NULL);
 }
 
 static PyObject *
@@ -757,7 +827,101 @@ _psyco_curs_buildrow_with_factory(cursorObject *self, int row)
     if ((res = PyObject_CallFunction(self->tuple_factory, "O", self))== NULL)
         return NULL;
 
-    return _psyco_curs_buildrow_fill(self, res, row, n, 0);
+    return _psyco_curs_buildrow_fill(self, res, row, n, 0, NULL, NULL);
+}
+
+/* _psyco_curs_buildrows - build size rows into list, from self->row on
+
+   the values of the types with a native decoder (see typecast.h) are parsed
+   in blocks of rows with the GIL released, so that threads fetching on
+   different connections can parse concurrently; the row objects are then
+   built in a second pass. without native columns, or for a few cells, the
+   rows are just built one at time. */
+
+static int
+_psyco_curs_buildrows(cursorObject *self, PyObject *list, int size)
+{
+    PGresult *pgres = self->pgres;
+    cursNativeCell *cells = NULL, *cell;
+    int *kinds = NULL;
+    int i, j, r, n, first, count, block, nnative = 0, retvalue = -1;
+    PyObject *res;
+
+    n = PQnfields(pgres);
+
+    if (n > 0 && (kinds = PyMem_Malloc(n * sizeof(int))) == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (j = 0; j < n; j++) {
+        kinds[j] = typecast_native_kind(PyTuple_GET_ITEM(self->casts, j));
+        if (kinds[j] != TYPECAST_NATIVE_NONE) nnative++;
+    }
+
+    if (nnative * size >= CURS_NATIVE_MIN_CELLS) {
+        block = size < CURS_NATIVE_BLOCK ? size : CURS_NATIVE_BLOCK;
+        cells = PyMem_Malloc(block * n * sizeof(cursNativeCell));
+        if (cells == NULL) {
+            PyErr_NoMemory();
+            goto exit;
+        }
+    }
+    else {
+        block = size;
+    }
+
+    for (i = 0; i < size; i += block) {
+        count = size - i < block ? size - i : block;
+
+        if (cells != NULL) {
+            first = self->row;
+            Py_BEGIN_ALLOW_THREADS;
+            for (r = 0; r < count; r++) {
+                for (j = 0; j < n; j++) {
+                    cell = cells + r * n + j;
+                    if (kinds[j] == TYPECAST_NATIVE_NONE)
+                        cell->status = CURS_NATIVE_CAST;
+                    else if (PQgetisnull(pgres, first + r, j))
+                        cell->status = CURS_NATIVE_NULL;
+                    else if (typecast_native_parse(kinds[j],
+                                 PQgetvalue(pgres, first + r, j),
+                                 PQgetlength(pgres, first + r, j),
+                                 &(cell->val)))
+                        cell->status = CURS_NATIVE_OK;
+                    else
+                        cell->status = CURS_NATIVE_CAST;
+                }
+            }
+            Py_END_ALLOW_THREADS;
+        }
+
+        for (r = 0; r < count; r++) {
+            cell = cells != NULL ? cells + r * n : NULL;
+            if (self->tuple_factory == Py_None) {
+                res = _psyco_curs_buildrow_fill(self, PyTuple_New(n),
+                    self->row, n, 1, kinds, cell);
+            }
+            else {
+                res = PyObject_CallFunction(self->tuple_factory, "O", self);
+                if (res != NULL)
+                    res = _psyco_curs_buildrow_fill(self, res,
+                        self->row, n, 0, kinds, cell);
+            }
+
+            self->row++;
+
+            if (res == NULL)
+                goto exit;
+
+            PyList_SET_ITEM(list, i + r, res);
+        }
+    }
+    retvalue = 0;
+
+exit:
+    if (cells) PyMem_Free(cells);
+    if (kinds) PyMem_Free(kinds);
+    return retvalue;
 }
 
 static PyObject *
@@ -817,8 +981,7 @@ psyco_curs_fetchone(cursorObject *self, PyObject *args)
 static PyObject *
 psyco_curs_fetchmany(cursorObject *self, PyObject *args, PyObject *kwords)
 {
-    int i;
-    PyObject *list, *res;
+    PyObject *list;
 
     long int size = self->arraysize;
     static char *kwlist[] = {"size", NULL};
@@ -854,20 +1017,11 @@ psyco_curs_fetchmany(cursorObject *self, PyObject *args, PyObject *kwords)
 
     list = PyList_New(size);
 
-    for (i = 0; i < size; i++) {
-        if (self->tuple_factory == Py_None)
-            res = _psyco_curs_buildrow(self, self->row);
-        else
-            res = _psyco_curs_buildrow_with_factory(self, self->row);
-
-        self->row++;
+    if (list == NULL) return NULL;
 
-        if (res == NULL) {
-            Py_DECREF(list);
-            return NULL;
-        }
-
-        PyList_SET_ITEM(list, i, res);
+    if (_psyco_curs_buildrows(self, list, size) < 0) {
+        Py_DECREF(list);
+        return NULL;
     }
 
     /* if the query was async aggresively free pgres, to allow
@@ -892,8 +1046,8 @@ psyco_curs_fetchmany(cursorObject *self, PyObject *args, PyObject *kwords)
 static PyObject *
 psyco_curs_fetchall(cursorObject *self, PyObject *args)
 {
-    int i, size;
-    PyObject *list, *res;
+    int size;
+    PyObject *list;
 
     if (!PyArg_ParseTuple(args, "")) {
         return NULL;
@@ -920,20 +1074,11 @@ psyco_curs_fetchall(cursorObject *self, PyObject *args)
 
     list = PyList_New(size);
 
-    for (i = 0; i < size; i++) {
-        if (self->tuple_factory == Py_None)
-            res = _psyco_curs_buildrow(self, self->row);
-        else
-            res = _psyco_curs_buildrow_with_factory(self, self->row);
-
-        self->row++;
-
-        if (res == NULL) {
-            Py_DECREF(list);
-            return NULL;
-        }
+    if (list == NULL) return NULL;
 
-        PyList_SET_ITEM(list, i, res);
+    if (_psyco_curs_buildrows(self, list, size) < 0) {
+        Py_DECREF(list);
+        return NULL;
     }
 
     /* if the query was async aggresively free pgres, to allow
@@ -995,7 +1140,7 @@ psyco_curs_callproc(cursorObject *self, PyObject *args, PyObject *kwargs)
     operation = PyString_FromString(sql);
     PyMem_Free((void*)sql);
 
-    if (_psyco_curs_execute(self, operation, parameters, async)) {
+    if (_psyco_curs_execute(self, operation, parameters, async, 0)) {
         Py_INCREF(parameters);
         res = parameters;
     }
@@ -1489,7 +1634,9 @@ psyco_curs_fileno(cursorObject *self, PyObject *args)
 /* extension: isready - return true if data from async execute is ready */
 
 #define psyco_curs_isready_doc \
-"isready() -> bool -- Return True if data is ready after an async query."
+"isready() -> bool -- Return True if data is ready after an async query.\n\n" \
+"When the result is ready it is also processed, so errors in the query are\n" \
+"raised and description and rowcount are available."
 
 static PyObject *
 psyco_curs_isready(cursorObject *self, PyObject *args)
@@ -1521,6 +1668,8 @@ psyco_curs_isready(cursorObject *self, PyObject *args)
         pthread_mutex_unlock(&(self->conn->lock));
         Py_END_ALLOW_THREADS;
         self->needsfetch = 1;
+        if (_psyco_curs_prefetch(self) < 0)
+            return NULL;
         Py_INCREF(Py_True);
         return Py_True;
     }
@@ -1647,6 +1796,9 @@ static struct PyMemberDef cursorObject_members[] = {
     {"row_factory", T_OBJECT, OFFSETOF(tuple_factory), 0},
     {"tzinfo_factory", T_OBJECT, OFFSETOF(tzinfo_factory), 0},
     {"typecaster", T_OBJECT, OFFSETOF(caster), RO},
+    {"fetch_timeout", T_DOUBLE, OFFSETOF(fetch_timeout), 0,
+        "Seconds to wait for the result of an asynchronous query in the " \
+        "fetch methods (0 means no limit)."},
     {"string_types", T_OBJECT, OFFSETOF(string_types), 0},
     {"binary_types", T_OBJECT, OFFSETOF(binary_types), 0},
 #endif
@@ -1693,6 +1845,8 @@ cursor_setup(cursorObject *self, connectionObject *conn, const char *name)
     self->arraysize = 1;
     self->rowcount = -1;
     self->lastoid = InvalidOid;
+    self->fetch_timeout = 0.0;
+    self->queued = 0;
 
     self->casts = NULL;
     self->notice = NULL;
@@ -39,6 +39,12 @@ extern "C" {
 
 extern HIDDEN PyTypeObject lobjectType;
 
+/* size of the chunks returned iterating on a lobject */
+#define DEFAULT_LOBJ_CHUNKSIZE 65536
+
+/* size of the buffer used by copy_to_file() and copy_from_file() */
+#define DEFAULT_LOBJ_COPYSIZE 1048576
+
 typedef struct {
     PyObject HEAD;
 
@@ -62,6 +68,10 @@ HIDDEN int lobject_export(lobjectObject *self, const char *filename);
 HIDDEN Py_ssize_t lobject_read(lobjectObject *self, char *buf, size_t len);
 HIDDEN Py_ssize_t lobject_write(lobjectObject *self, const char *buf,
                                 size_t len);
+HIDDEN Py_ssize_t lobject_copy_to_fd(lobjectObject *self, int fd,
+                                     size_t bufsize, int *syserr);
+HIDDEN Py_ssize_t lobject_copy_from_fd(lobjectObject *self, int fd,
+                                       size_t bufsize, int *syserr);
 HIDDEN int lobject_seek(lobjectObject *self, int pos, int whence);
 HIDDEN int lobject_tell(lobjectObject *self);
 HIDDEN int lobject_close(lobjectObject *self);
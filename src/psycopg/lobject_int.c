@@ -26,6 +26,13 @@
 #define PY_SSIZE_T_CLEAN
 #include <Python.h>
 #include <string.h>
+#include <errno.h>
+
+#ifndef _WIN32
+#include <unistd.h>
+#else
+#include <io.h>
+#endif
 
 #define PSYCOPG_MODULE
 #include "psycopg/config.h"
@@ -34,6 +41,11 @@
 #include "psycopg/lobject.h"
 #include "psycopg/pqpath.h"
 
+#ifdef PSYCOPG_HAVE_MMAP
+#include <sys/mman.h>
+#include <sys/stat.h>
+#endif
+
 #ifdef PSYCOPG_EXTENSIONS
 
 static void
@@ -249,6 +261,191 @@ lobject_read(lobjectObject *self, char *buf, size_t len)
     return n_read;
 }
 
+/* lobject_copy_to_fd - copy the lo from the current position to a file
+   descriptor, using a single buffer of bufsize bytes
+
+   On error return -1: if *syserr is set the error is the errno of a failed
+   write() on the file descriptor, else the Python exception is already
+   set. */
+
+Py_ssize_t
+lobject_copy_to_fd(lobjectObject *self, int fd, size_t bufsize, int *syserr)
+{
+    Py_ssize_t total = 0, n_read, n_written, done;
+    PGresult *pgres = NULL;
+    char *error = NULL;
+    char *buf;
+
+    *syserr = 0;
+    if ((buf = PyMem_Malloc(bufsize)) == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&(self->conn->lock));
+
+    while ((n_read = lo_read(self->conn->pgconn, self->fd, buf, bufsize)) > 0) {
+        for (done = 0; done < n_read; done += n_written) {
+            n_written = write(fd, buf + done, n_read - done);
+            if (n_written < 0) {
+                if (errno == EINTR) { n_written = 0; continue; }
+                *syserr = errno;
+                break;
+            }
+        }
+        if (*syserr) break;
+        total += n_read;
+    }
+    if (n_read < 0)
+        collect_error(self->conn, &error);
+
+    pthread_mutex_unlock(&(self->conn->lock));
+    Py_END_ALLOW_THREADS;
+
+    PyMem_Free(buf);
+
+    if (*syserr)
+        return -1;
+    if (n_read < 0) {
+        pq_complete_error(self->conn, &pgres, &error);
+        return -1;
+    }
+    return total;
+}
+
+#ifdef PSYCOPG_HAVE_MMAP
+/* _lobject_write_mmap_locked - write a regular file to the lo mapping it
+
+   Write the file from the current position of fd to its end straight from
+   the mapped pages and leave fd positioned after the last byte written.
+   Return 1 if the file was written, 0 if it can't be mapped (nothing has
+   been written), -1 on error (*syserr or *error set). Must be called with
+   the connection locked and the GIL released. */
+
+static int
+_lobject_write_mmap_locked(lobjectObject *self, int fd, size_t bufsize,
+                           Py_ssize_t *total, int *syserr, char **error)
+{
+    struct stat st;
+    off_t offset, base;
+    size_t maplen, slice;
+    long pagesize;
+    char *map, *p, *end;
+    int n_written;
+
+    if (fstat(fd, &st) < 0 || !S_ISREG(st.st_mode))
+        return 0;
+    if ((offset = lseek(fd, 0, SEEK_CUR)) < 0)
+        return 0;
+
+    pagesize = sysconf(_SC_PAGESIZE);
+    if (bufsize < PSYCOPG_MMAP_SLICE) bufsize = PSYCOPG_MMAP_SLICE;
+
+    while (offset < st.st_size) {
+        base = offset - offset % pagesize;
+        maplen = st.st_size - base > PSYCOPG_MMAP_WINDOW ?
+            PSYCOPG_MMAP_WINDOW : (size_t)(st.st_size - base);
+        map = mmap(NULL, maplen, PROT_READ, MAP_SHARED, fd, base);
+        if (map == MAP_FAILED) {
+            if (*total == 0) return 0;
+            *syserr = errno;
+            return -1;
+        }
+#ifdef MADV_SEQUENTIAL
+        madvise(map, maplen, MADV_SEQUENTIAL);
+#endif
+
+        end = map + maplen;
+        for (p = map + (offset - base); p < end; p += n_written) {
+            slice = end - p > bufsize ? bufsize : (size_t)(end - p);
+            n_written = lo_write(self->conn->pgconn, self->fd, p, slice);
+            if (n_written <= 0) {
+                munmap(map, maplen);
+                collect_error(self->conn, error);
+                lseek(fd, (p - map) + base, SEEK_SET);
+                return -1;
+            }
+            *total += n_written;
+        }
+        munmap(map, maplen);
+        offset = base + maplen;
+    }
+
+    lseek(fd, offset, SEEK_SET);
+    return 1;
+}
+#endif
+
+/* lobject_copy_from_fd - copy the content of a file descriptor into the lo
+   from the current position, using a single buffer of bufsize bytes
+
+   Regular files are memory mapped where possible, avoiding the buffer.
+   Error handling is the same of lobject_copy_to_fd(). */
+
+Py_ssize_t
+lobject_copy_from_fd(lobjectObject *self, int fd, size_t bufsize, int *syserr)
+{
+    Py_ssize_t total = 0, n_read, n_written = 0;
+    PGresult *pgres = NULL;
+    char *error = NULL;
+    char *buf;
+
+    *syserr = 0;
+    if ((buf = PyMem_Malloc(bufsize)) == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&(self->conn->lock));
+
+    PQsetnonblocking(self->conn->pgconn, 0);
+#ifdef PSYCOPG_HAVE_MMAP
+    switch (_lobject_write_mmap_locked(self, fd, bufsize, &total,
+                                       syserr, &error)) {
+    case 1:
+        goto done;
+    case -1:
+        n_written = -1;
+        goto done;
+    }
+#endif
+    while (1) {
+        n_read = read(fd, buf, bufsize);
+        if (n_read < 0) {
+            if (errno == EINTR) continue;
+            *syserr = errno;
+            break;
+        }
+        if (n_read == 0) break;
+
+        n_written = lo_write(self->conn->pgconn, self->fd, buf, n_read);
+        if (n_written < 0) {
+            collect_error(self->conn, &error);
+            break;
+        }
+        total += n_written;
+    }
+#ifdef PSYCOPG_HAVE_MMAP
+ done:
+#endif
+    PQsetnonblocking(self->conn->pgconn, 1);
+
+    pthread_mutex_unlock(&(self->conn->lock));
+    Py_END_ALLOW_THREADS;
+
+    PyMem_Free(buf);
+
+    if (*syserr)
+        return -1;
+    if (n_written < 0) {
+        pq_complete_error(self->conn, &pgres, &error);
+        return -1;
+    }
+    return total;
+}
+
 /* lobject_seek - move the current position in the lo */
 
 int
@@ -26,6 +26,13 @@
 #include <Python.h>
 #include <structmember.h>
 #include <string.h>
+#include <errno.h>
+
+#ifndef _WIN32
+#include <unistd.h>
+#else
+#include <io.h>
+#endif
 
 #define PSYCOPG_MODULE
 #include "psycopg/config.h"
@@ -101,7 +108,6 @@ psyco_lobj_read(lobjectObject *self, PyObject *args)
 {
     PyObject *res;
     int where, end, size = -1;
-    char *buffer;
 
     if (!PyArg_ParseTuple(args, "|i", &size)) return NULL;
 
@@ -116,21 +122,190 @@ psyco_lobj_read(lobjectObject *self, PyObject *args)
         size = end - where;
     }
 
-    if ((buffer = PyMem_Malloc(size)) == NULL) {
-        PyErr_NoMemory();
+    /* read straight into the string returned */
+    if (!(res = PyString_FromStringAndSize(NULL, size)))
         return NULL;
-    }
-    if ((size = lobject_read(self, buffer, size)) < 0) {
-        PyMem_Free(buffer);
+    if ((size = lobject_read(self, PyString_AS_STRING(res), size)) < 0) {
+        Py_DECREF(res);
         return NULL;
     }
+    if (size != PyString_GET_SIZE(res))
+        _PyString_Resize(&res, size);
 
-    res = PyString_FromStringAndSize(buffer, size);
-    PyMem_Free(buffer);
-    
     return res;
 }
 
+/* readinto method - read data from the lobject into a buffer */
+
+#define psyco_lobj_readinto_doc \
+"readinto(buffer) -- Read up to len(buffer) bytes into a writable buffer.\n\n" \
+"Return the number of bytes read (0 at the end of the large object)."
+
+static PyObject *
+psyco_lobj_readinto(lobjectObject *self, PyObject *args)
+{
+    PyObject *obj;
+    void *buffer;
+    Py_ssize_t len, size;
+
+    if (!PyArg_ParseTuple(args, "O", &obj)) return NULL;
+
+    EXC_IF_LOBJ_CLOSED(self);
+    EXC_IF_LOBJ_LEVEL0(self);
+    EXC_IF_LOBJ_UNMARKED(self);
+
+    if (PyObject_AsWriteBuffer(obj, &buffer, &len) < 0)
+        return NULL;
+
+    if ((size = lobject_read(self, (char *)buffer, (size_t)len)) < 0)
+        return NULL;
+
+    return PyInt_FromSsize_t(size);
+}
+
+/* _psyco_lobj_get_fd - return the file descriptor of a file or -1
+
+   If the file is a Python object it is flushed (if writing) or its position
+   is synchronized with the descriptor one (if reading), to deal with the
+   data kept by the object in its own buffers. */
+
+static int
+_psyco_lobj_get_fd(PyObject *file, int reading)
+{
+    PyObject *tmp;
+    int fd;
+
+    if ((fd = PyObject_AsFileDescriptor(file)) < 0)
+        return -1;
+    if (PyInt_Check(file) || PyLong_Check(file))
+        return fd;
+
+    if (!reading) {
+        if (PyObject_HasAttrString(file, "flush")) {
+            if (!(tmp = PyObject_CallMethod(file, "flush", NULL)))
+                return -1;
+            Py_DECREF(tmp);
+        }
+    }
+    else if (PyObject_HasAttrString(file, "tell")) {
+        Py_ssize_t pos;
+        if (!(tmp = PyObject_CallMethod(file, "tell", NULL))) {
+            /* not seekable: nothing to synchronize */
+            PyErr_Clear();
+            return fd;
+        }
+        pos = PyInt_AsSsize_t(tmp);
+        Py_DECREF(tmp);
+        if (pos == -1 && PyErr_Occurred())
+            return -1;
+        if (lseek(fd, pos, SEEK_SET) < 0) {
+            PyErr_SetFromErrno(PyExc_IOError);
+            return -1;
+        }
+    }
+    return fd;
+}
+
+/* copy_to_file method - write the lobject content to a file */
+
+#define psyco_lobj_copy_to_file_doc \
+"copy_to_file(file, size=1048576) -- Copy the large object from the\n" \
+"current position to a file descriptor or an object with a fileno() method.\n\n" \
+"Data is transferred using a single buffer of the given size; return the\n" \
+"number of bytes copied."
+
+static PyObject *
+psyco_lobj_copy_to_file(lobjectObject *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *file;
+    Py_ssize_t size = DEFAULT_LOBJ_COPYSIZE, copied;
+    int fd, syserr;
+
+    static char *kwlist[] = {"file", "size", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|" CONV_CODE_PY_SSIZE_T,
+        kwlist, &file, &size)) return NULL;
+
+    EXC_IF_LOBJ_CLOSED(self);
+    EXC_IF_LOBJ_LEVEL0(self);
+    EXC_IF_LOBJ_UNMARKED(self);
+
+    if (size <= 0) {
+        PyErr_SetString(PyExc_ValueError, "buffer size must be positive");
+        return NULL;
+    }
+    if ((fd = _psyco_lobj_get_fd(file, 0)) < 0)
+        return NULL;
+
+    if ((copied = lobject_copy_to_fd(self, fd, size, &syserr)) < 0) {
+        if (syserr) {
+            errno = syserr;
+            PyErr_SetFromErrno(PyExc_IOError);
+        }
+        return NULL;
+    }
+
+    return PyInt_FromSsize_t(copied);
+}
+
+/* copy_from_file method - write a file content into the lobject */
+
+#define psyco_lobj_copy_from_file_doc \
+"copy_from_file(file, size=1048576) -- Copy the content of a file descriptor\n" \
+"or an object with a fileno() method into the large object, from the current\n" \
+"position.\n\n" \
+"Data is transferred using a single buffer of the given size; return the\n" \
+"number of bytes copied."
+
+static PyObject *
+psyco_lobj_copy_from_file(lobjectObject *self, PyObject *args,
+                          PyObject *kwargs)
+{
+    PyObject *file;
+    Py_ssize_t size = DEFAULT_LOBJ_COPYSIZE, copied;
+    int fd, syserr;
+
+    static char *kwlist[] = {"file", "size", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|" CONV_CODE_PY_SSIZE_T,
+        kwlist, &file, &size)) return NULL;
+
+    EXC_IF_LOBJ_CLOSED(self);
+    EXC_IF_LOBJ_LEVEL0(self);
+    EXC_IF_LOBJ_UNMARKED(self);
+
+    if (size <= 0) {
+        PyErr_SetString(PyExc_ValueError, "buffer size must be positive");
+        return NULL;
+    }
+    if ((fd = _psyco_lobj_get_fd(file, 1)) < 0)
+        return NULL;
+
+    if ((copied = lobject_copy_from_fd(self, fd, size, &syserr)) < 0) {
+        if (syserr) {
+            errno = syserr;
+            PyErr_SetFromErrno(PyExc_IOError);
+        }
+        return NULL;
+    }
+
+    /* keep the Python file position in sync with the descriptor one */
+    if (!PyInt_Check(file) && !PyLong_Check(file)
+            && PyObject_HasAttrString(file, "seek")) {
+        PyObject *tmp;
+        off_t pos = lseek(fd, 0, SEEK_CUR);
+        if (pos >= 0) {
+            if (!(tmp = PyObject_CallMethod(file, "seek", "L",
+                    (PY_LONG_LONG)pos)))
+                PyErr_Clear();
+            else
+                Py_DECREF(tmp);
+        }
+    }
+
+    return PyInt_FromSsize_t(copied);
+}
+
 /* seek method - seek in the lobject */
 
 #define psyco_lobj_seek_doc \
@@ -217,6 +392,32 @@ psyco_lobj_export(lobjectObject *self, PyObject *args)
 }
 
 
+/* iterator protocol - return the content in chunks */
+
+static PyObject *
+lobject_iternext(lobjectObject *self)
+{
+    PyObject *res;
+    Py_ssize_t size;
+
+    EXC_IF_LOBJ_CLOSED(self);
+    EXC_IF_LOBJ_LEVEL0(self);
+    EXC_IF_LOBJ_UNMARKED(self);
+
+    if (!(res = PyString_FromStringAndSize(NULL, DEFAULT_LOBJ_CHUNKSIZE)))
+        return NULL;
+    size = lobject_read(self, PyString_AS_STRING(res), DEFAULT_LOBJ_CHUNKSIZE);
+    if (size <= 0) {
+        /* 0 means end of the object: stop the iteration without error */
+        Py_DECREF(res);
+        return NULL;
+    }
+    if (size != DEFAULT_LOBJ_CHUNKSIZE)
+        _PyString_Resize(&res, size);
+
+    return res;
+}
+
 static PyObject *
 psyco_lobj_get_closed(lobjectObject *self, void *closure)
 {
@@ -235,8 +436,14 @@ psyco_lobj_get_closed(lobjectObject *self, void *closure)
 static struct PyMethodDef lobjectObject_methods[] = {
     {"read", (PyCFunction)psyco_lobj_read,
      METH_VARARGS, psyco_lobj_read_doc},
+    {"readinto", (PyCFunction)psyco_lobj_readinto,
+     METH_VARARGS, psyco_lobj_readinto_doc},
     {"write", (PyCFunction)psyco_lobj_write,
      METH_VARARGS, psyco_lobj_write_doc},
+    {"copy_to_file", (PyCFunction)psyco_lobj_copy_to_file,
+     METH_VARARGS|METH_KEYWORDS, psyco_lobj_copy_to_file_doc},
+    {"copy_from_file", (PyCFunction)psyco_lobj_copy_from_file,
+     METH_VARARGS|METH_KEYWORDS, psyco_lobj_copy_from_file_doc},
     {"seek", (PyCFunction)psyco_lobj_seek,
      METH_VARARGS, psyco_lobj_seek_doc},
     {"tell", (PyCFunction)psyco_lobj_tell,
@@ -387,8 +594,8 @@ PyTypeObject lobjectType = {
     0,          /*tp_richcompare*/
     0,          /*tp_weaklistoffset*/
 
-    0,          /*tp_iter*/
-    0,          /*tp_iternext*/
+    PyObject_SelfIter, /*tp_iter*/
+    (iternextfunc)lobject_iternext, /*tp_iternext*/
 
     /* Attribute descriptor and subclassing stuff */
 
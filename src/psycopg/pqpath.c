@@ -32,6 +32,8 @@
 #define PY_SSIZE_T_CLEAN
 #include <Python.h>
 #include <string.h>
+#include <ctype.h>
+#include <errno.h>
 
 #define PSYCOPG_MODULE
 #include "psycopg/config.h"
@@ -44,6 +46,16 @@
 #include "psycopg/pgtypes.h"
 #include "psycopg/pgversion.h"
 
+#ifdef PSYCOPG_HAVE_MMAP
+#include <sys/mman.h>
+#include <sys/stat.h>
+#endif
+
+#ifndef _WIN32
+#include <poll.h>
+#include <sys/time.h>
+#endif
+
 
 /* Strip off the severity from a Postgres error message. */
 static const char *
@@ -368,6 +380,25 @@ pq_complete_error(connectionObject *conn, PGresult **pgres, char **error)
 }
 
 
+/* pq_session_command - the command setting the session read only mode
+
+   the command must be executed on its own: sent in the same string of a
+   query it would only affect the transactions following the implicit one
+   the string is executed in. */
+
+static const char *
+pq_session_command(connectionObject *conn)
+{
+    return conn->readonly ?
+        "SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY" :
+        "SET SESSION CHARACTERISTICS AS TRANSACTION READ WRITE";
+}
+
+static const char *pq_begin_commands[] = {
+    NULL,
+    "BEGIN; SET TRANSACTION ISOLATION LEVEL READ COMMITTED",
+    "BEGIN; SET TRANSACTION ISOLATION LEVEL SERIALIZABLE"};
+
 /* pq_begin_locked - begin a transaction, if necessary
 
    This function should only be called on a locked connection without
@@ -376,32 +407,130 @@ pq_complete_error(connectionObject *conn, PGresult **pgres, char **error)
    On error, -1 is returned, and the pgres argument will hold the
    relevant result structure.
  */
+
 int
 pq_begin_locked(connectionObject *conn, PGresult **pgres, char **error)
 {
-    const char *query[] = {
-        NULL,
-        "BEGIN; SET TRANSACTION ISOLATION LEVEL READ COMMITTED",
-        "BEGIN; SET TRANSACTION ISOLATION LEVEL SERIALIZABLE"};
     int result;
 
     Dprintf("pq_begin_locked: pgconn = %p, isolevel = %ld, status = %d",
             conn->pgconn, conn->isolation_level, conn->status);
 
+    /* a read only mode not sent yet */
+    if (conn->session_pending) {
+        result = pq_execute_command_locked(conn, pq_session_command(conn),
+                                           pgres, error);
+        if (result < 0)
+            return result;
+        conn->session_pending = 0;
+    }
+
     if (conn->isolation_level == 0 || conn->status != CONN_STATUS_READY) {
         Dprintf("pq_begin_locked: transaction in progress");
         return 0;
     }
 
     pq_clear_async(conn);
-    result = pq_execute_command_locked(conn, query[conn->isolation_level],
-                                       pgres, error);
+    /* until the server default level is known use it implicitly */
+    result = pq_execute_command_locked(conn,
+        conn->default_isolation ?
+            "BEGIN" : pq_begin_commands[conn->isolation_level],
+        pgres, error);
     if (result == 0)
         conn->status = CONN_STATUS_BEGIN;
 
     return result;
 }
 
+/* pq_begin_query - prepend the commands beginning a transaction to a query
+
+   return a new string (to be freed with free()) with the commands needed to
+   begin a transaction followed by query, to send them to the backend in a
+   single round trip, and set *ncommands to the number of commands added.
+   Return NULL if no command is needed, or if they must be sent by
+   pq_begin_locked(): using protocol 2 the backend doesn't report if the
+   transaction started, and the read only mode must be set on its own (see
+   pq_session_command()).
+
+   after executing the query the connection status must be set using
+   pq_began_locked(). */
+
+static char *
+pq_begin_query(connectionObject *conn, const char *query, int *ncommands)
+{
+    const char *begin;
+    char *buf;
+
+    if (conn->isolation_level == 0 || conn->status != CONN_STATUS_READY
+            || conn->protocol < 3 || conn->session_pending)
+        return NULL;
+
+    if (conn->default_isolation) {
+        begin = "BEGIN";
+        *ncommands = 1;
+    }
+    else {
+        begin = pq_begin_commands[conn->isolation_level];
+        *ncommands = 2;
+    }
+
+    /* on failure we just fall back to a separate BEGIN */
+    if ((buf = malloc(strlen(begin) + strlen(query) + 3)) == NULL)
+        return NULL;
+    sprintf(buf, "%s; %s", begin, query);
+    return buf;
+}
+
+/* pq_began_locked - set the connection status after a pq_begin_query()
+
+   the transaction could have not started if the command string contained a
+   syntax error, or it could have been terminated by the query itself. */
+
+static void
+pq_began_locked(connectionObject *conn)
+{
+    if (PQtransactionStatus(conn->pgconn) == PQTRANS_IDLE)
+        conn->status = CONN_STATUS_READY;
+    else
+        conn->status = CONN_STATUS_BEGIN;
+}
+
+/* pq_abort_execute_locked - execute a no-result query outside transactions
+
+   if a transaction is in progress it is aborted in the same round trip of
+   the query. This function should only be called on a locked connection
+   without holding the global interpreter lock; errors are returned as in
+   pq_execute_command_locked(). */
+
+int
+pq_abort_execute_locked(connectionObject *conn, const char *query,
+                        PGresult **pgres, char **error)
+{
+    char *buf;
+    int retvalue;
+
+    if (conn->isolation_level == 0 || conn->status != CONN_STATUS_BEGIN)
+        return pq_execute_command_locked(conn, query, pgres, error);
+
+    if ((buf = malloc(strlen(query) + 8)) == NULL) {
+        retvalue = pq_abort_locked(conn, pgres, error);
+        if (retvalue == 0)
+            retvalue = pq_execute_command_locked(conn, query, pgres, error);
+        return retvalue;
+    }
+    sprintf(buf, "ABORT; %s", query);
+
+    conn->mark += 1;
+    pq_clear_async(conn);
+    retvalue = pq_execute_command_locked(conn, buf, pgres, error);
+    free(buf);
+
+    /* even if the query failed the transaction was rolled back */
+    conn->status = CONN_STATUS_READY;
+
+    return retvalue;
+}
+
 /* pq_commit - send an END, if necessary
 
    This function should be called while holding the global interpreter
@@ -505,6 +634,10 @@ pq_abort(connectionObject *conn)
 
 /* pq_reset - reset the connection
 
+   if discard is true the whole session state (temporary tables, prepared
+   statements...) is dropped using DISCARD ALL, else the parameters and the
+   listened channels are reset.
+
    This function should be called while holding the global interpreter
    lock.
 
@@ -513,7 +646,8 @@ pq_abort(connectionObject *conn)
 */
 
 int
-pq_reset_locked(connectionObject *conn, PGresult **pgres, char **error)
+pq_reset_locked(connectionObject *conn, int discard,
+                PGresult **pgres, char **error)
 {
     int retvalue = -1;
 
@@ -523,17 +657,23 @@ pq_reset_locked(connectionObject *conn, PGresult **pgres, char **error)
     conn->mark += 1;
     pq_clear_async(conn);
 
-    if (conn->isolation_level > 0 && conn->status == CONN_STATUS_BEGIN) {
-        retvalue = pq_execute_command_locked(conn, "ABORT", pgres, error);
-        if (retvalue != 0) return retvalue;
+    if (discard) {
+        /* DISCARD ALL can't be sent in a multi-command string */
+        retvalue = pq_abort_locked(conn, pgres, error);
+        if (retvalue == 0)
+            retvalue = pq_execute_command_locked(conn, "DISCARD ALL",
+                                                 pgres, error);
+    }
+    else {
+        retvalue = pq_abort_execute_locked(conn,
+            "RESET ALL; SET SESSION AUTHORIZATION DEFAULT; UNLISTEN *",
+            pgres, error);
     }
-
-    retvalue = pq_execute_command_locked(conn, "RESET ALL", pgres, error);
     if (retvalue != 0) return retvalue;
 
-    retvalue = pq_execute_command_locked(conn,
-        "SET SESSION AUTHORIZATION DEFAULT", pgres, error);
-    if (retvalue != 0) return retvalue;
+    /* RESET ALL restored the read write mode as well */
+    conn->readonly = 0;
+    conn->session_pending = 0;
 
     conn->status = CONN_STATUS_READY;
 
@@ -541,7 +681,7 @@ pq_reset_locked(connectionObject *conn, PGresult **pgres, char **error)
 }
 
 int
-pq_reset(connectionObject *conn)
+pq_reset(connectionObject *conn, int discard)
 {
     int retvalue = -1;
     PGresult *pgres = NULL;
@@ -553,7 +693,7 @@ pq_reset(connectionObject *conn)
     Py_BEGIN_ALLOW_THREADS;
     pthread_mutex_lock(&conn->lock);
 
-    retvalue = pq_reset_locked(conn, &pgres, &error);
+    retvalue = pq_reset_locked(conn, discard, &pgres, &error);
 
     pthread_mutex_unlock(&conn->lock);
     Py_END_ALLOW_THREADS;
@@ -579,7 +719,6 @@ int
 pq_is_busy(connectionObject *conn)
 {
     int res;
-    PGnotify *pgn;
 
     Dprintf("pq_is_busy: consuming input");
 
@@ -594,31 +733,480 @@ pq_is_busy(connectionObject *conn)
         return -1;
     }
 
+    res = PQisBusy(conn->pgconn);
+    
+    pthread_mutex_unlock(&(conn->lock));
+    Py_END_ALLOW_THREADS;
+    
+    conn_notice_process(conn);
+    conn_notifies_process(conn);
+
+    return res;
+}
+
+/* pq_time - return the current time in seconds */
+
+double
+pq_time(void)
+{
+#ifdef _WIN32
+    return (double)GetTickCount() / 1000.0;
+#else
+    struct timeval tv;
+
+    gettimeofday(&tv, NULL);
+    return (double)tv.tv_sec + (double)tv.tv_usec / 1000000.0;
+#endif
+}
+
+/* pq_wait_socket - wait for a socket to be readable and/or writable
+
+   events is a combination of PQ_WAIT_READ and PQ_WAIT_WRITE; deadline is an
+   absolute time as returned by pq_time() or 0 to wait forever.
+
+   this function doesn't touch Python objects and should be called with the
+   GIL released and without holding the connection lock
+
+   return value:
+     -1 - error in the system call (errno is set)
+      0 - deadline expired
+      1 - the socket is ready
+*/
+
+int
+pq_wait_socket(int sock, int events, double deadline)
+{
+    int res, timeout;
+    double left;
+
+    while (1) {
+        timeout = -1;
+        if (deadline > 0) {
+            left = deadline - pq_time();
+            if (left <= 0) return 0;
+            /* round up, not to spin on sub-millisecond waits */
+            timeout = (int)(left * 1000.0) + 1;
+        }
+
+#ifndef _WIN32
+        {
+            struct pollfd pfd;
+
+            pfd.fd = sock;
+            pfd.events = 0;
+            pfd.revents = 0;
+            if (events & PQ_WAIT_READ) pfd.events |= POLLIN;
+            if (events & PQ_WAIT_WRITE) pfd.events |= POLLOUT;
+            res = poll(&pfd, 1, timeout);
+        }
+#else
+        {
+            fd_set rfds, wfds;
+            struct timeval tv, *ptv = NULL;
+
+            FD_ZERO(&rfds);
+            FD_ZERO(&wfds);
+            if (events & PQ_WAIT_READ) FD_SET(sock, &rfds);
+            if (events & PQ_WAIT_WRITE) FD_SET(sock, &wfds);
+            if (timeout >= 0) {
+                tv.tv_sec = timeout / 1000;
+                tv.tv_usec = (timeout % 1000) * 1000;
+                ptv = &tv;
+            }
+            res = select(sock+1, &rfds, &wfds, NULL, ptv);
+            if (res < 0) errno = WSAGetLastError();
+        }
+#endif
+        if (res > 0) return 1;
+        if (res < 0 && errno != EINTR) return -1;
+        /* on timeout or EINTR the deadline is checked again */
+    }
+}
+
+/* _pq_wait_result_locked - wait until PQgetResult() can be called without
+   blocking
+
+   deadline is an absolute time as returned by pq_time() or 0 to wait
+   forever. return 0 if the result is available, 1 if the deadline expired,
+   -1 on connection error.
+
+   this function should only be called on a locked connection without
+   holding the global interpreter lock. */
+
+static int
+_pq_wait_result_locked(PGconn *pgconn, double deadline)
+{
+    int flush, ready;
+
+    while (1) {
+        if ((flush = PQflush(pgconn)) < 0 || PQconsumeInput(pgconn) == 0)
+            return -1;
+        if (flush == 0 && !PQisBusy(pgconn))
+            return 0;
+
+        ready = pq_wait_socket(PQsocket(pgconn), flush == 1 ?
+            PQ_WAIT_READ|PQ_WAIT_WRITE : PQ_WAIT_READ, deadline);
+        if (ready < 0)
+            return -1;
+        if (ready == 0)
+            return 1;
+    }
+}
+
+/* _pq_exec_timeout_locked - PQexec() cancelling the query after a timeout
+
+   the query is sent asynchronously and the results are collected waiting on
+   the socket: if the timeout expires before the query completes a cancel
+   request is sent and the error returned by the backend is reported as the
+   query result. as in PQexec() the last result is returned, unless an error
+   occurred, and the collection stops at a COPY.
+
+   this function should only be called on a locked connection without
+   holding the global interpreter lock. NULL is returned on connection
+   failure.
+*/
+
+static PGresult *
+_pq_exec_timeout_locked(connectionObject *conn, const char *query,
+                        double timeout)
+{
+    PGconn *pgconn = conn->pgconn;
+    PGresult *res, *last = NULL;
+    double deadline;
+    int ready, status;
+    char errbuf[256];
+
+    if (PQsendQuery(pgconn, query) == 0)
+        return NULL;
+
+    deadline = pq_time() + timeout;
+
+    while (1) {
+        while ((ready = _pq_wait_result_locked(pgconn, deadline)) == 1) {
+            /* the backend will answer with an error: wait for it */
+            Dprintf("_pq_exec_timeout_locked: timeout, cancelling");
+            PQcancel(conn->cancel, errbuf, sizeof(errbuf));
+            deadline = 0;
+        }
+        if (ready < 0)
+            goto fail;
+
+        if ((res = PQgetResult(pgconn)) == NULL)
+            break;
+
+        /* keep the first error, else the last result */
+        if (last != NULL && PQresultStatus(last) == PGRES_FATAL_ERROR) {
+            PQclear(res);
+            continue;
+        }
+        IFCLEARPGRES(last);
+        last = res;
+
+        status = PQresultStatus(res);
+        if (status == PGRES_COPY_IN || status == PGRES_COPY_OUT
+                || PQstatus(pgconn) == CONNECTION_BAD)
+            break;
+    }
+    return last;
+
+fail:
+    IFCLEARPGRES(last);
+    return NULL;
+}
+
+/* _pq_discard_copy_out_locked - read and throw away the data of a COPY TO
+
+   return 0 on success, -1 on connection error. this function should only be
+   called on a locked connection without holding the GIL. */
+
+static int
+_pq_discard_copy_out_locked(PGconn *pgconn)
+{
+    char *buffer;
+    int len;
+
+    while (1) {
+        len = PQgetCopyData(pgconn, &buffer, 1);
+        if (len > 0) {
+            PQfreemem(buffer);
+        }
+        else if (len == 0) {
+            if (pq_wait_socket(PQsocket(pgconn), PQ_WAIT_READ, 0) < 0
+                    || PQconsumeInput(pgconn) == 0)
+                return -1;
+        }
+        else {
+            return len == -1 ? 0 : -1;
+        }
+    }
+}
+
+/* _pq_count_statements - count the statements in a query string
+
+   the statements are separated by semicolons outside of string literals,
+   quoted identifiers, dollar quoted strings and comments; the empty
+   statements, which return no result, are not counted. backslash escapes
+   a quote in the literals if the server doesn't use standard conforming
+   strings. */
+
+static int
+_pq_count_statements(connectionObject *conn, const char *query)
+{
+    const char *p = query, *tag, *end, *scs;
+    int count = 0, content = 0, backslash;
+    size_t taglen;
+
+    scs = PQparameterStatus(conn->pgconn, "standard_conforming_strings");
+    backslash = scs == NULL || strcmp(scs, "off") == 0;
+
+    while (*p) {
+        if (*p == ';') {
+            count += content;
+            content = 0;
+            p++;
+        }
+        else if (*p == ' ' || *p == '\t' || *p == '\n' || *p == '\r'
+                 || *p == '\f') {
+            p++;
+        }
+        else if (p[0] == '-' && p[1] == '-') {
+            while (*p && *p != '\n') p++;
+        }
+        else if (p[0] == '/' && p[1] == '*') {
+            /* comments may be nested */
+            int depth = 1;
+            for (p += 2; *p && depth > 0; p++) {
+                if (p[0] == '/' && p[1] == '*') { depth++; p++; }
+                else if (p[0] == '*' && p[1] == '/') { depth--; p++; }
+            }
+        }
+        else if (*p == '\'' || *p == '"') {
+            char quote = *p;
+            /* E'' strings always accept backslash escapes */
+            int esc = quote == '\'' && (backslash
+                || (p > query && (p[-1] == 'E' || p[-1] == 'e')));
+            content = 1;
+            for (p++; *p; p++) {
+                if (esc && *p == '\\' && p[1]) { p++; continue; }
+                if (*p == quote) {
+                    if (p[1] == quote) { p++; continue; }
+                    p++;
+                    break;
+                }
+            }
+        }
+        else if (*p == '$' && (p == query
+                 || !(isalnum((unsigned char)p[-1]) || p[-1] == '_'))) {
+            /* a dollar quote $tag$...$tag$, else a parameter such as $1 */
+            content = 1;
+            tag = p++;
+            while (isalnum((unsigned char)*p) || *p == '_') p++;
+            if (*p != '$' || isdigit((unsigned char)tag[1])) continue;
+            taglen = ++p - tag;
+            for (end = p; *end; end++) {
+                if (*end == '$' && strncmp(end, tag, taglen) == 0) break;
+            }
+            p = *end ? end + taglen : end;
+        }
+        else {
+            content = 1;
+            p++;
+        }
+    }
+    return count + content;
+}
+
+/* pq_queue_pipeline - queue the query of a cursor in the connection pipeline
+
+   the query (already in curs->query) is sent by pq_sync_pipeline() together
+   with the other queued queries. The cursor must not be queued already.
+
+   the results are assigned to the cursors by position, so only the queries
+   made of a single statement are queued: return 1 if the query must be
+   executed on its own instead, 0 if queued, -1 on error. */
+
+int
+pq_queue_pipeline(cursorObject *curs)
+{
+    if (_pq_count_statements(curs->conn,
+                             PyString_AS_STRING(curs->query)) != 1)
+        return 1;
+
+    if (PyList_Append(curs->conn->pipeline, (PyObject*)curs) < 0)
+        return -1;
+
+    curs_reset(curs);
+    IFCLEARPGRES(curs->pgres);
+    curs->queued = 1;
+    return 0;
+}
+
+/* pq_sync_pipeline - execute the queries queued in the pipeline
+
+   the queries are sent to the backend as a single command string, so they
+   cost a single round trip, and the results are handed to the cursors in
+   order, then processed as in a sync execute. If a query fails the
+   exception is raised and the following cursors are left without result
+   (the backend doesn't execute the rest of the string).
+
+   this function locks the connection object
+   this function call Py_*_ALLOW_THREADS macros */
+
+int
+pq_sync_pipeline(connectionObject *conn)
+{
+    PyObject *pipeline, *queries = NULL, *sep = NULL, *query = NULL;
+    PGresult **results = NULL, *res, *pgres = NULL, *begin_error = NULL;
+    cursorObject *curs;
+    Py_ssize_t i, n, nres = 0;
+    char *error = NULL, *begin_query;
+    int status, sent = 0, failed = 0, skip = 0, extra = 0, retvalue = -1;
+
+    if (conn->pipeline == NULL || PyList_GET_SIZE(conn->pipeline) == 0)
+        return 0;
+
+    /* detach the queued cursors: new queries start a new batch */
+    pipeline = conn->pipeline;
+    if (!(conn->pipeline = PyList_New(0))) {
+        conn->pipeline = pipeline;
+        return -1;
+    }
+    n = PyList_GET_SIZE(pipeline);
+    for (i = 0; i < n; i++)
+        ((cursorObject *)PyList_GET_ITEM(pipeline, i))->queued = 0;
+
+    if (conn->critical) {
+        pq_resolve_critical(conn, 1);
+        goto exit;
+    }
+    if (conn->async_cursor != NULL) {
+        PyErr_SetString(ProgrammingError,
+                        "asynchronous query already in execution");
+        goto exit;
+    }
+
+    if (!(queries = PyList_New(n))) goto exit;
+    for (i = 0; i < n; i++) {
+        curs = (cursorObject *)PyList_GET_ITEM(pipeline, i);
+        Py_INCREF(curs->query);
+        PyList_SET_ITEM(queries, i, curs->query);
+    }
+    if (!(sep = PyString_FromString(";\n"))) goto exit;
+    if (!(query = _PyString_Join(sep, queries))) goto exit;
+
+    if (!(results = PyMem_Malloc(n * sizeof(PGresult *)))) {
+        PyErr_NoMemory();
+        goto exit;
+    }
 
-    /* now check for notifies */
-    while ((pgn = PQnotifies(conn->pgconn)) != NULL) {
-        PyObject *notify;
+    Dprintf("pq_sync_pipeline: executing " FORMAT_CODE_PY_SSIZE_T
+            " queries", n);
 
-        Dprintf("curs_is_busy: got NOTIFY from pid %d, msg = %s",
-                (int) pgn->be_pid, pgn->relname);
+    Py_BEGIN_ALLOW_THREADS;
+    pthread_mutex_lock(&(conn->lock));
 
+    /* send the BEGIN together with the queries, if needed */
+    begin_query = pq_begin_query(conn, PyString_AS_STRING(query), &skip);
+    if (begin_query == NULL && pq_begin_locked(conn, &pgres, &error) < 0) {
+        pthread_mutex_unlock(&(conn->lock));
         Py_BLOCK_THREADS;
-        notify = PyTuple_New(2);
-        PyTuple_SET_ITEM(notify, 0, PyInt_FromLong((long)pgn->be_pid));
-        PyTuple_SET_ITEM(notify, 1, PyString_FromString(pgn->relname));
-        PyList_Append(conn->notifies, notify);
-        Py_UNBLOCK_THREADS;
-        free(pgn);
+        pq_complete_error(conn, &pgres, &error);
+        goto exit;
+    }
+
+    if ((sent = PQsendQuery(conn->pgconn, begin_query ?
+                            begin_query : PyString_AS_STRING(query)))) {
+        while (1) {
+            if (_pq_wait_result_locked(conn->pgconn, 0) != 0) {
+                failed = 1;
+                break;
+            }
+            if ((res = PQgetResult(conn->pgconn)) == NULL)
+                break;
+
+            status = PQresultStatus(res);
+            if (skip > 0) {
+                /* the result of a command beginning the transaction */
+                skip--;
+                if (status != PGRES_COMMAND_OK && begin_error == NULL)
+                    begin_error = res;
+                else
+                    PQclear(res);
+                continue;
+            }
+            if (status == PGRES_COPY_IN) {
+                /* the backend answers with an error for this query */
+                PQputCopyEnd(conn->pgconn,
+                             "COPY FROM STDIN can't be used in a pipeline");
+                PQclear(res);
+                continue;
+            }
+            if (status == PGRES_COPY_OUT) {
+                PQclear(res);
+                if (_pq_discard_copy_out_locked(conn->pgconn) < 0) {
+                    failed = 1;
+                    break;
+                }
+                continue;
+            }
+
+            if (nres < n)
+                results[nres++] = res;
+            else {
+                /* the results don't match the cursors any more */
+                extra = 1;
+                PQclear(res);
+            }
+        }
+    }
+
+    if (begin_query) {
+        free(begin_query);
+        pq_began_locked(conn);
     }
 
-    res = PQisBusy(conn->pgconn);
-    
     pthread_mutex_unlock(&(conn->lock));
     Py_END_ALLOW_THREADS;
-    
+
     conn_notice_process(conn);
 
-    return res;
+    if (!sent || failed) {
+        PyErr_SetString(OperationalError, PQerrorMessage(conn->pgconn));
+        goto exit;
+    }
+    if (begin_error) {
+        /* e.g. a syntax error: no query was executed */
+        pq_raise(conn, NULL, begin_error);
+        goto exit;
+    }
+    if (extra) {
+        PyErr_SetString(ProgrammingError,
+            "the queries in the pipeline returned more results than queued");
+        goto exit;
+    }
+
+    retvalue = 0;
+    for (i = 0; i < nres && retvalue == 0; i++) {
+        curs = (cursorObject *)PyList_GET_ITEM(pipeline, i);
+        IFCLEARPGRES(curs->pgres);
+        curs->pgres = results[i];
+        results[i] = NULL;
+        if (pq_fetch(curs) == -1)
+            retvalue = -1;
+    }
+
+exit:
+    if (results) {
+        for (i = 0; i < nres; i++)
+            IFCLEARPGRES(results[i]);
+        PyMem_Free(results);
+    }
+    IFCLEARPGRES(begin_error);
+    Py_XDECREF(query);
+    Py_XDECREF(sep);
+    Py_XDECREF(queries);
+    Py_DECREF(pipeline);
+    return retvalue;
 }
 
 /* pq_execute - execute a query, possibly asyncronously
@@ -628,9 +1216,26 @@ pq_is_busy(connectionObject *conn)
 
 int
 pq_execute(cursorObject *curs, const char *query, int async)
+{
+    return pq_execute_timeout(curs, query, async, 0);
+}
+
+/* pq_execute_timeout - as pq_execute, with a timeout in seconds
+
+   if timeout > 0 a sync query still running after timeout seconds is
+   cancelled. */
+
+int
+pq_execute_timeout(cursorObject *curs, const char *query, int async,
+                   double timeout)
 {
     PGresult *pgres = NULL;
-    char *error = NULL;
+    char *error = NULL, *begin_query = NULL;
+    int ncommands;
+
+    /* the queries queued in the pipeline must be executed first */
+    if (pq_sync_pipeline(curs->conn) < 0)
+        return -1;
 
     /* if the status of the connection is critical raise an exception and
        definitely close the connection */
@@ -650,7 +1255,16 @@ pq_execute(cursorObject *curs, const char *query, int async)
     Py_BEGIN_ALLOW_THREADS;
     pthread_mutex_lock(&(curs->conn->lock));
 
-    if (pq_begin_locked(curs->conn, &pgres, &error) < 0) {
+    /* a sync query can carry the BEGIN in the same round trip: as PQexec()
+       returns the last result the commands added don't get in the way. The
+       async queries get the first result instead. */
+    if (async == 0)
+        begin_query = pq_begin_query(curs->conn, query, &ncommands);
+
+    if (begin_query != NULL) {
+        pq_clear_async(curs->conn);
+    }
+    else if (pq_begin_locked(curs->conn, &pgres, &error) < 0) {
         pthread_mutex_unlock(&(curs->conn->lock));
         Py_BLOCK_THREADS;
         pq_complete_error(curs->conn, &pgres, &error);
@@ -660,8 +1274,18 @@ pq_execute(cursorObject *curs, const char *query, int async)
     if (async == 0) {
         IFCLEARPGRES(curs->pgres);
         Dprintf("pq_execute: executing SYNC query:");
-        Dprintf("    %-.200s", query);
-        curs->pgres = PQexec(curs->conn->pgconn, query);
+        Dprintf("    %-.200s", begin_query ? begin_query : query);
+        if (timeout > 0)
+            curs->pgres = _pq_exec_timeout_locked(curs->conn,
+                begin_query ? begin_query : query, timeout);
+        else
+            curs->pgres = PQexec(curs->conn->pgconn,
+                begin_query ? begin_query : query);
+
+        if (begin_query) {
+            free(begin_query);
+            pq_began_locked(curs->conn);
+        }
 
         /* dont let pgres = NULL go to pq_fetch() */
         if (curs->pgres == NULL) {
@@ -881,16 +1505,138 @@ _pq_fetch_tuples(cursorObject *curs)
 }
 
 #ifdef HAVE_PQPROTOCOL3
+
+#ifdef PSYCOPG_HAVE_MMAP
+/* _pq_copy_in_mmap - send a regular file for COPY FROM mapping it in memory
+
+   The file is sent from its current position to the end straight from the
+   mapped pages, flushing each slice to keep the libpq buffer small. Return
+   1 if the file was sent, 0 if the file is not suitable for mapping (in
+   this case nothing was sent and the caller should read() the file), -1 on
+   error: *error is set to 1 for file errors (and a Python exception is set)
+   or to 2 for errors in PQputCopyData(). */
+
+static int
+_pq_copy_in_mmap(cursorObject *curs, int *error)
+{
+    PyObject *o;
+    PGconn *pgconn = curs->conn->pgconn;
+    struct stat st;
+    off_t offset, base;
+    size_t maplen, slice;
+    long pagesize;
+    char *map, *p, *end;
+    int fd, syserr = 0, mapped = 0, res = 1, sock;
+
+    /* only plain file objects open in binary mode: other objects, or the
+       universal newlines mode, may transform the data read */
+    if (!PyFile_CheckExact(curs->copyfile)
+            || !((PyFileObject *)curs->copyfile)->f_binary)
+        return 0;
+    if ((fd = PyObject_AsFileDescriptor(curs->copyfile)) < 0) {
+        PyErr_Clear();
+        return 0;
+    }
+    if (fstat(fd, &st) < 0 || !S_ISREG(st.st_mode))
+        return 0;
+
+    /* the Python file object may have read ahead: use its position */
+    if (!(o = PyObject_CallMethod(curs->copyfile, "tell", NULL))) {
+        PyErr_Clear();
+        return 0;
+    }
+    offset = (off_t)PyLong_AsLongLong(o);
+    Py_DECREF(o);
+    if (offset == -1 && PyErr_Occurred()) {
+        PyErr_Clear();
+        return 0;
+    }
+
+    pagesize = sysconf(_SC_PAGESIZE);
+    sock = PQsocket(pgconn);
+
+    Py_BEGIN_ALLOW_THREADS;
+    while (offset < st.st_size) {
+        base = offset - offset % pagesize;
+        maplen = st.st_size - base > PSYCOPG_MMAP_WINDOW ?
+            PSYCOPG_MMAP_WINDOW : (size_t)(st.st_size - base);
+        map = mmap(NULL, maplen, PROT_READ, MAP_SHARED, fd, base);
+        if (map == MAP_FAILED) {
+            if (!mapped) res = 0;
+            else syserr = errno;
+            break;
+        }
+        mapped = 1;
+#ifdef MADV_SEQUENTIAL
+        madvise(map, maplen, MADV_SEQUENTIAL);
+#endif
+
+        end = map + maplen;
+        for (p = map + (offset - base); p < end; p += slice) {
+            slice = end - p > PSYCOPG_MMAP_SLICE ?
+                PSYCOPG_MMAP_SLICE : (size_t)(end - p);
+            if (PQputCopyData(pgconn, p, (int)slice) != 1) {
+                *error = 2;
+                break;
+            }
+            /* the connection is non-blocking: wait for the data to be sent
+               instead of letting libpq buffer the whole file */
+            while ((res = PQflush(pgconn)) == 1) {
+                if (pq_wait_socket(sock, PQ_WAIT_READ|PQ_WAIT_WRITE, 0) < 0
+                        || PQconsumeInput(pgconn) == 0) {
+                    res = -1;
+                    break;
+                }
+            }
+            if (res == -1) {
+                *error = 2;
+                break;
+            }
+            res = 1;
+        }
+        munmap(map, maplen);
+        if (*error) break;
+        offset = base + maplen;
+    }
+    Py_END_ALLOW_THREADS;
+
+    if (res == 0)
+        return 0;
+
+    /* move the file to the position of the last byte sent */
+    if (!(o = PyObject_CallMethod(curs->copyfile, "seek", "L",
+            (PY_LONG_LONG)offset)))
+        PyErr_Clear();
+    else
+        Py_DECREF(o);
+
+    if (syserr) {
+        errno = syserr;
+        PyErr_SetFromErrno(PyExc_IOError);
+        *error = 1;
+    }
+
+    Dprintf("_pq_copy_in_mmap: sent file up to offset %ld; error = %d",
+        (long)offset, *error);
+    return *error ? -1 : 1;
+}
+#endif
+
 static int
 _pq_copy_in_v3(cursorObject *curs)
 {
     /* COPY FROM implementation when protocol 3 is available: this function
        uses the new PQputCopyData() and can detect errors and set the correct
        exception */
-    PyObject *o;
+    PyObject *o = NULL;
     Py_ssize_t length = 0;
     int res, error = 0;
 
+#ifdef PSYCOPG_HAVE_MMAP
+    if (_pq_copy_in_mmap(curs, &error) != 0)
+        goto copy_end;
+#endif
+
     while (1) {
         o = PyObject_CallMethod(curs->copyfile, "read",
             CONV_CODE_PY_SSIZE_T, curs->copysize);
@@ -924,6 +1670,9 @@ _pq_copy_in_v3(cursorObject *curs)
 
     Py_XDECREF(o);
 
+#ifdef PSYCOPG_HAVE_MMAP
+ copy_end:
+#endif
     Dprintf("_pq_copy_in_v3: error = %d", error);
 
     /* 0 means that the copy went well, 2 that there was an error on the
@@ -1104,33 +1853,45 @@ pq_fetch(cursorObject *curs)
        get something edible to eat */
     if (!curs->pgres) {
 
+        int busy, flush, sock, ready = 1;
+        double deadline = 0;
+
         Dprintf("pq_fetch: no data: entering polling loop");
 
-        while (pq_is_busy(curs->conn) > 0) {
-            fd_set rfds;
-            struct timeval tv;
-            int sval, sock;
+        if (curs->fetch_timeout > 0)
+            deadline = pq_time() + curs->fetch_timeout;
 
+        while ((busy = pq_is_busy(curs->conn)) > 0) {
+            /* send the data still queued (if any) and wait for the socket
+               without holding the connection lock */
             Py_BEGIN_ALLOW_THREADS;
             pthread_mutex_lock(&(curs->conn->lock));
-
+            flush = PQflush(curs->conn->pgconn);
             sock = PQsocket(curs->conn->pgconn);
-            FD_ZERO(&rfds);
-            FD_SET(sock, &rfds);
-
-            /* set a default timeout of 5 seconds
-               TODO: make use of the timeout, maybe allowing the user to
-               make a non-blocking (timeouted) call to fetchXXX */
-            tv.tv_sec = 5;
-            tv.tv_usec = 0;
-
-            Dprintf("pq_fetch: entering PDflush() loop");
-            while (PQflush(curs->conn->pgconn) != 0);
-            sval = select(sock+1, &rfds, NULL, NULL, &tv);
-
             pthread_mutex_unlock(&(curs->conn->lock));
+
+            if (flush >= 0)
+                ready = pq_wait_socket(sock, flush == 1 ?
+                    PQ_WAIT_READ|PQ_WAIT_WRITE : PQ_WAIT_READ, deadline);
             Py_END_ALLOW_THREADS;
+
+            if (flush < 0) {
+                PyErr_SetString(OperationalError,
+                                PQerrorMessage(curs->conn->pgconn));
+                return -1;
+            }
+            if (ready < 0) {
+                PyErr_SetFromErrno(OperationalError);
+                return -1;
+            }
+            if (ready == 0) {
+                /* the query is still running: a later fetch can wait again */
+                PyErr_SetString(OperationalError,
+                    "timeout expired waiting for the query result");
+                return -1;
+            }
         }
+        if (busy < 0) return -1;
 
         Py_BEGIN_ALLOW_THREADS;
         pthread_mutex_lock(&(curs->conn->lock));
@@ -1227,6 +1988,7 @@ pq_fetch(cursorObject *curs)
     Dprintf("pq_fetch: fetching done; check for critical errors");
 
     conn_notice_process(curs->conn);
+    conn_notifies_process(curs->conn);
 
     /* error checking, close the connection if necessary (some critical errors
        are not really critical, like a COPY FROM error: if that's the case we
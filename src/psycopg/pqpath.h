@@ -30,6 +30,10 @@
 #include "psycopg/cursor.h"
 #include "psycopg/connection.h"
 
+/* events for pq_wait_socket() */
+#define PQ_WAIT_READ  1
+#define PQ_WAIT_WRITE 2
+
 /* macros to clean the pg result */
 #define IFCLEARPGRES(pgres)  if (pgres) {PQclear(pgres); pgres = NULL;}
 #define CLEARPGRES(pgres)    PQclear(pgres); pgres = NULL
@@ -37,15 +41,25 @@
 /* exported functions */
 HIDDEN int pq_fetch(cursorObject *curs);
 HIDDEN int pq_execute(cursorObject *curs, const char *query, int async);
+HIDDEN int pq_execute_timeout(cursorObject *curs, const char *query,
+                              int async, double timeout);
+HIDDEN int pq_queue_pipeline(cursorObject *curs);
+HIDDEN int pq_sync_pipeline(connectionObject *conn);
 HIDDEN int pq_begin_locked(connectionObject *conn, PGresult **pgres,
                            char **error);
 HIDDEN int pq_commit(connectionObject *conn);
 HIDDEN int pq_abort_locked(connectionObject *conn, PGresult **pgres,
                            char **error);
 HIDDEN int pq_abort(connectionObject *conn);
-HIDDEN int pq_reset(connectionObject *conn);
+HIDDEN int pq_abort_execute_locked(connectionObject *conn,
+                                   const char *query,
+                                   PGresult **pgres, char **error);
+HIDDEN int pq_reset(connectionObject *conn, int discard);
 HIDDEN int pq_is_busy(connectionObject *conn);
 
+HIDDEN double pq_time(void);
+HIDDEN int pq_wait_socket(int sock, int events, double deadline);
+
 HIDDEN void pq_set_critical(connectionObject *conn, const char *msg);
 
 HIDDEN int pq_execute_command_locked(connectionObject *conn,
@@ -28,6 +28,7 @@
 
 #define PY_SSIZE_T_CLEAN
 #include <Python.h>
+#include <structseq.h>
 #include <libpq-fe.h>
 
 #include "psycopg/config.h"
@@ -105,6 +106,9 @@ import_psycopg(void)
 /* postgresql<->python encoding map */
 extern HIDDEN PyObject *psycoEncodings;
 
+/* type of the items in connection.notifies */
+extern HIDDEN PyTypeObject notifyType;
+
 typedef struct {
     char *pgenc;
     char *pyenc;
@@ -68,6 +68,24 @@ HIDDEN PyObject *pyPsycopgTzFixedOffsetTimezone = NULL;
 
 HIDDEN PyObject *psycoEncodings = NULL;
 
+/* the items of connection.notifies: 2 items tuples, for compatibility, with
+   the payload available as an attribute */
+HIDDEN PyTypeObject notifyType;
+
+static PyStructSequence_Field notify_fields[] = {
+    {"pid", "PID of the backend sending the notification"},
+    {"channel", "Name of the channel notified"},
+    {"payload", "Payload of the notification, empty string if none"},
+    {NULL}
+};
+
+static PyStructSequence_Desc notify_desc = {
+    "psycopg2.extensions.Notify",
+    "An asynchronous notification received by the session.",
+    notify_fields,
+    2
+};
+
 #ifdef PSYCOPG_DEBUG
 HIDDEN int psycopg_debug_enabled = 0;
 #endif
@@ -94,6 +112,9 @@ HIDDEN int psycopg_debug_enabled = 0;
 "function always return an instance of the `connection` class.\n"          \
 "Else the given sub-class of `extensions.connection` will be used to\n"    \
 "instantiate the connection object.\n\n"                                   \
+"If ``async`` is true the connection is established without blocking:\n"  \
+"call `connection.poll()` until it returns `extensions.POLL_OK` before\n"  \
+"using it.\n\n"                                                           \
 ":return: New database connection\n"                                         \
 ":rtype: `extensions.connection`"
 
@@ -113,6 +134,7 @@ psyco_connect(PyObject *self, PyObject *args, PyObject *keywds)
 
     size_t idsn=-1;
     int iport=-1;
+    long int async = 0;
     const char *dsn_static = NULL;
     char *dsn_dynamic=NULL;
     const char *database=NULL, *user=NULL, *password=NULL;
@@ -121,11 +143,12 @@ psyco_connect(PyObject *self, PyObject *args, PyObject *keywds)
 
     static char *kwlist[] = {"dsn", "database", "host", "port",
                              "user", "password", "sslmode",
-                             "connection_factory", NULL};
+                             "connection_factory", "async", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, keywds, "|sssOsssO", kwlist,
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "|sssOsssOl", kwlist,
                                      &dsn_static, &database, &host, &pyport,
-                                     &user, &password, &sslmode, &factory)) {
+                                     &user, &password, &sslmode, &factory,
+                                     &async)) {
         return NULL;
     }
 
@@ -194,7 +217,10 @@ psyco_connect(PyObject *self, PyObject *args, PyObject *keywds)
 
       /* allocate connection, fill with errors and return it */
       if (factory == NULL) factory = (PyObject *)&connectionType;
-      conn = PyObject_CallFunction(factory, "s", dsn);
+      if (async)
+          conn = PyObject_CallFunction(factory, "sl", dsn, async);
+      else
+          conn = PyObject_CallFunction(factory, "s", dsn);
     }
 
     goto cleanup;
@@ -723,6 +749,7 @@ init_psycopg(void)
     if (PyType_Ready(&asisType) == -1) return;
     if (PyType_Ready(&listType) == -1) return;
     if (PyType_Ready(&chunkType) == -1) return;
+    PyStructSequence_InitType(&notifyType, &notify_desc);
 
 #ifdef PSYCOPG_EXTENSIONS
     lobjectType.ob_type    = &PyType_Type;
@@ -797,6 +824,8 @@ init_psycopg(void)
     PyModule_AddObject(module, "connection", (PyObject*)&connectionType);
     PyModule_AddObject(module, "cursor", (PyObject*)&cursorType);
     PyModule_AddObject(module, "ISQLQuote", (PyObject*)&isqlquoteType);
+    Py_INCREF(&notifyType);
+    PyModule_AddObject(module, "Notify", (PyObject*)&notifyType);
 #ifdef PSYCOPG_EXTENSIONS
     PyModule_AddObject(module, "lobject", (PyObject*)&lobjectType);
 #endif
@@ -46,6 +46,9 @@
   #define charbufferproc getcharbufferproc
 
   #define CONV_CODE_PY_SSIZE_T "i"
+
+  #define PyInt_FromSsize_t(x) PyInt_FromLong((long)(x))
+  #define PyInt_AsSsize_t(x) PyInt_AsLong(x)
 #else
   #define CONV_CODE_PY_SSIZE_T "n"
 #endif
@@ -182,6 +182,139 @@ typecast_parse_time(const char* s, const char** t, Py_ssize_t* len,
 #include "psycopg/typecast_array.c"
 #include "psycopg/typecast_builtins.c"
 
+/** native decoding - parse fixed-width values without the GIL **/
+
+#ifdef HAVE_LONG_LONG
+#if defined(_MSC_VER)
+#define psyco_strtoll _strtoi64
+#else
+#define psyco_strtoll strtoll
+#endif
+#endif
+
+/* typecast_native_kind - return the TYPECAST_NATIVE_* value that can be
+   used to parse the values of a typecaster, TYPECAST_NATIVE_NONE if the
+   typecaster must be called */
+
+int
+typecast_native_kind(PyObject *obj)
+{
+    typecast_function ccast;
+
+    if (obj == NULL || !PyObject_TypeCheck(obj, &typecastType))
+        return TYPECAST_NATIVE_NONE;
+
+    ccast = ((typecastObject *)obj)->ccast;
+    if (ccast == typecast_INTEGER_cast)
+        return TYPECAST_NATIVE_INTEGER;
+#ifdef HAVE_LONG_LONG
+    if (ccast == typecast_LONGINTEGER_cast)
+        return TYPECAST_NATIVE_LONGINTEGER;
+#endif
+    if (ccast == typecast_FLOAT_cast)
+        return TYPECAST_NATIVE_FLOAT;
+    if (ccast == typecast_BOOLEAN_cast)
+        return TYPECAST_NATIVE_BOOLEAN;
+    if (ccast == typecast_PYDATE_cast)
+        return TYPECAST_NATIVE_DATE;
+    return TYPECAST_NATIVE_NONE;
+}
+
+/* typecast_native_parse - parse a non-NULL value
+
+   return 1 on success, 0 if the value has an unexpected form (e.g. it
+   overflows, or is a special value as 'NaN' or 'infinity'): in this case
+   the typecaster should be called. str must be NUL-terminated; this
+   function doesn't touch Python objects and can be called without the GIL */
+
+int
+typecast_native_parse(int kind, const char *str, Py_ssize_t len,
+                      typecast_native *val)
+{
+    char *end;
+    const char *c;
+    int i, acc;
+
+    if (len <= 0 || str[len] != '\0')
+        return 0;
+
+    switch (kind) {
+
+    case TYPECAST_NATIVE_INTEGER:
+        errno = 0;
+        val->l = strtol(str, &end, 10);
+        return end == str + len && errno == 0;
+
+#ifdef HAVE_LONG_LONG
+    case TYPECAST_NATIVE_LONGINTEGER:
+        errno = 0;
+        val->ll = psyco_strtoll(str, &end, 10);
+        return end == str + len && errno == 0;
+#endif
+
+    case TYPECAST_NATIVE_FLOAT:
+        /* strtod() is locale dependent and accepts more than the plain
+           numbers: leave anything else to the typecaster */
+        for (c = str; *c; c++) {
+            if (!((*c >= '0' && *c <= '9')
+                  || *c == '.' || *c == 'e' || *c == 'E'
+                  || *c == '-' || *c == '+'))
+                return 0;
+        }
+        errno = 0;
+        val->d = strtod(str, &end);
+        return end == str + len && errno == 0;
+
+    case TYPECAST_NATIVE_BOOLEAN:
+        val->l = (str[0] == 't');
+        return 1;
+
+    case TYPECAST_NATIVE_DATE:
+        /* only the ISO form YYYY-MM-DD */
+        c = str;
+        for (i = 0; i < 3; i++) {
+            if (*c < '0' || *c > '9')
+                return 0;
+            for (acc = 0; *c >= '0' && *c <= '9' && acc < 100000; c++)
+                acc = acc * 10 + (*c - '0');
+            val->ymd[i] = acc;
+            if (i < 2 && *c++ != '-')
+                return 0;
+        }
+        if (*c != '\0')
+            return 0;
+        if (val->ymd[0] > 9999) val->ymd[0] = 9999;
+        return 1;
+    }
+
+    return 0;
+}
+
+/* typecast_native_object - build the Python object for a parsed value */
+
+PyObject *
+typecast_native_object(int kind, typecast_native *val)
+{
+    switch (kind) {
+    case TYPECAST_NATIVE_INTEGER:
+        return PyInt_FromLong(val->l);
+#ifdef HAVE_LONG_LONG
+    case TYPECAST_NATIVE_LONGINTEGER:
+        return PyLong_FromLongLong(val->ll);
+#endif
+    case TYPECAST_NATIVE_FLOAT:
+        return PyFloat_FromDouble(val->d);
+    case TYPECAST_NATIVE_BOOLEAN:
+        return PyBool_FromLong(val->l);
+    case TYPECAST_NATIVE_DATE:
+        return PyObject_CallFunction(pyDateTypeP, "iii",
+            val->ymd[0], val->ymd[1], val->ymd[2]);
+    }
+
+    PyErr_SetString(InternalError, "unknown native typecast");
+    return NULL;
+}
+
 
 /* a list of initializers, used to make the typecasters accessible anyway */
 static typecastObject_initlist typecast_pydatetime[] = {
@@ -86,6 +86,29 @@ HIDDEN PyObject *typecast_from_c(typecastObject_initlist *type, PyObject *d);
 HIDDEN PyObject *typecast_from_python(
     PyObject *self, PyObject *args, PyObject *keywds);
 
+/* native decoding of the fixed-width types with a C typecaster: the values
+   are parsed without holding the GIL, the objects built later */
+#define TYPECAST_NATIVE_NONE        0
+#define TYPECAST_NATIVE_INTEGER     1
+#define TYPECAST_NATIVE_LONGINTEGER 2
+#define TYPECAST_NATIVE_FLOAT       3
+#define TYPECAST_NATIVE_BOOLEAN     4
+#define TYPECAST_NATIVE_DATE        5
+
+typedef union {
+    long l;
+#ifdef HAVE_LONG_LONG
+    PY_LONG_LONG ll;
+#endif
+    double d;
+    int ymd[3];
+} typecast_native;
+
+HIDDEN int typecast_native_kind(PyObject *obj);
+HIDDEN int typecast_native_parse(
+    int kind, const char *str, Py_ssize_t len, typecast_native *val);
+HIDDEN PyObject *typecast_native_object(int kind, typecast_native *val);
+
 /* the function used to dispatch typecasting calls */
 HIDDEN PyObject *typecast_cast(
     PyObject *self, const char *str, Py_ssize_t len, PyObject *curs);
@@ -230,7 +230,26 @@ def parse_interval(s):
     return (years, months, days, hours, minutes, seconds)
 
 
-# Type conversions
+# The factory of the time zones of the TIMETZ and TIMESTAMPTZ values, called
+# with the offset in minutes east of UTC; zope.datetime.tzinfo if not set.
+_tzinfo_factory = None
+
+def setTzinfoFactory(factory):
+    """Set the factory of the time zones of the values read."""
+    global _tzinfo_factory
+    _tzinfo_factory = factory
+
+def getTzinfoFactory():
+    """Return the factory of the time zones of the values read."""
+    global _tzinfo_factory
+    if _tzinfo_factory is None:
+        from zope.datetime import tzinfo
+        _tzinfo_factory = tzinfo
+    return _tzinfo_factory
+
+
+# Type conversions, used if psycopg2 can't parse the values into Python
+# date/time objects by itself
 def _conv_date(s, cursor):
     if s:
         return date(*parse_date(s))
@@ -244,11 +263,10 @@ def _conv_time(s, cursor):
 
 def _conv_timetz(s, cursor):
     if s:
-        from zope.datetime import tzinfo
         hr, mn, sc, tz = parse_timetz(s)
         sc, micro = divmod(sc, 1.0)
         micro = round(micro * 1000000)
-        if tz: tz = tzinfo(tz)
+        if tz is not None: tz = getTzinfoFactory()(tz)
         return time(hr, mn, int(sc), int(micro), tz)
 
 def _conv_timestamp(s, cursor):
@@ -260,11 +278,10 @@ def _conv_timestamp(s, cursor):
 
 def _conv_timestamptz(s, cursor):
     if s:
-        from zope.datetime import tzinfo
         y, m, d, hr, mn, sc, tz = parse_datetimetz(s)
         sc, micro = divmod(sc, 1.0)
         micro = round(micro * 1000000)
-        if tz: tz = tzinfo(tz)
+        if tz is not None: tz = getTzinfoFactory()(tz)
         return datetime(y, m, d, hr, mn, int(sc), int(micro), tz)
 
 def _conv_interval(s, cursor):
@@ -277,6 +294,15 @@ def _conv_interval(s, cursor):
         else:
             return timedelta(days=d, hours=hr, minutes=mn, seconds=sc)
 
+_PYINTERVAL = getattr(psycopg2.extensions, 'PYINTERVAL', None)
+
+def _conv_interval_fast(s, cursor):
+    if s:
+        if 'mon' in s or 'year' in s:
+            # see _conv_interval()
+            return s
+        return _PYINTERVAL(s, cursor)
+
 def _get_string_conv(encoding):
     def _conv_string(s, cursor):
         if s is not None:
@@ -284,13 +310,23 @@ def _get_string_conv(encoding):
         return s
     return _conv_string
 
-# User-defined types
-DATE = psycopg2.extensions.new_type((DATE_OID,), "ZDATE", _conv_date)
-TIME = psycopg2.extensions.new_type((TIME_OID,), "ZTIME", _conv_time)
-TIMETZ = psycopg2.extensions.new_type((TIMETZ_OID,), "ZTIMETZ", _conv_timetz)
-TIMESTAMP = psycopg2.extensions.new_type((TIMESTAMP_OID,), "ZTIMESTAMP", _conv_timestamp)
-TIMESTAMPTZ = psycopg2.extensions.new_type((TIMESTAMPTZ_OID,), "ZTIMESTAMPTZ", _conv_timestamptz)
-INTERVAL = psycopg2.extensions.new_type((INTERVAL_OID,), "ZINTERVAL", _conv_interval)
+# User-defined types: the psycopg2 C typecasters parse the dates and times
+# (building the time zones with the cursor tzinfo_factory, see
+# Psycopg2Connection.cursor()), else the Python functions above are used
+if _PYINTERVAL is not None:
+    DATE = psycopg2.extensions.PYDATE
+    TIME = TIMETZ = psycopg2.extensions.PYTIME
+    # PYDATETIME is also registered for INTERVAL_OID: registerTypes()
+    # registers INTERVAL after it
+    TIMESTAMP = TIMESTAMPTZ = psycopg2.extensions.PYDATETIME
+    INTERVAL = psycopg2.extensions.new_type((INTERVAL_OID,), "ZINTERVAL", _conv_interval_fast)
+else:
+    DATE = psycopg2.extensions.new_type((DATE_OID,), "ZDATE", _conv_date)
+    TIME = psycopg2.extensions.new_type((TIME_OID,), "ZTIME", _conv_time)
+    TIMETZ = psycopg2.extensions.new_type((TIMETZ_OID,), "ZTIMETZ", _conv_timetz)
+    TIMESTAMP = psycopg2.extensions.new_type((TIMESTAMP_OID,), "ZTIMESTAMP", _conv_timestamp)
+    TIMESTAMPTZ = psycopg2.extensions.new_type((TIMESTAMPTZ_OID,), "ZTIMESTAMPTZ", _conv_timestamptz)
+    INTERVAL = psycopg2.extensions.new_type((INTERVAL_OID,), "ZINTERVAL", _conv_interval)
 
 def registerTypes(encoding):
     """Register type conversions for psycopg"""
@@ -381,7 +417,9 @@ class Psycopg2Connection(ZopeConnection):
 
     def cursor(self):
         """See IZopeConnection"""
-        return Psycopg2Cursor(self.conn.cursor(), self)
+        cursor = self.conn.cursor()
+        cursor.tzinfo_factory = getTzinfoFactory()
+        return Psycopg2Cursor(cursor, self)
 
     def commit(self):
         try:
@@ -183,6 +183,30 @@ class TestPsycopg2TypeConversion(TestCase):
         self.assertRaises(ValueError, c, '2days')
         self.assertRaises(ValueError, c, '123')
 
+    def test_conv_timestamptz_utc(self):
+        from psycopg2da.adapter import _conv_timestamptz
+        from datetime import datetime
+        self.assertEquals(_conv_timestamptz('2001-03-02 12:44:01+00', None),
+                  datetime(2001, 3, 2, 12, 44, 01, 0, TZStub(0,0)))
+
+    def test_conv_interval_fast(self):
+        from psycopg2da.adapter import _conv_interval_fast, _PYINTERVAL
+        from datetime import timedelta
+        if _PYINTERVAL is None:
+            return
+        def c(s):
+            return _conv_interval_fast(s, None)
+
+        self.assertEquals(c(''), None)
+        self.assertEquals(c('00:00:00.037'), timedelta(microseconds=37000))
+        self.assertEquals(c('2 days 03:20:15.123456'),
+                          timedelta(days=2, hours=3, minutes=20,
+                                    seconds=15, microseconds=123456))
+        self.assertEquals(c('-1 days +02:00:00'),
+                          timedelta(days=-1, hours=2))
+        self.assertEquals(c('1 mon'), '1 mon')
+        self.assertEquals(c('3 years'), '3 years')
+
     def test_conv_string(self):
         from psycopg2da.adapter import _get_string_conv
         _conv_string = _get_string_conv("utf-8")
@@ -27,6 +27,10 @@ import test_transaction
 import types_basic
 import types_extras
 import test_lobject
+import test_copy
+import test_aio
+import test_notify
+import test_pool
 
 def test_suite():
     suite = unittest.TestSuite()
@@ -40,6 +44,10 @@ def test_suite():
     suite.addTest(types_basic.test_suite())
     suite.addTest(types_extras.test_suite())
     suite.addTest(test_lobject.test_suite())
+    suite.addTest(test_copy.test_suite())
+    suite.addTest(test_aio.test_suite())
+    suite.addTest(test_notify.test_suite())
+    suite.addTest(test_pool.test_suite())
     return suite
 
 if __name__ == '__main__':
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+import unittest
+import warnings
+from cStringIO import StringIO
+
+import psycopg2
+import psycopg2.aio
+from psycopg2.aio import asyncio
+import tests
+
+
+class AsyncIOTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.conn = self.wait(psycopg2.aio.aconnect(tests.dsn, loop=self.loop))
+        self.conn.set_isolation_level(0)
+
+    def tearDown(self):
+        self.conn.close()
+        self.loop.close()
+
+    def wait(self, future):
+        return self.loop.run_until_complete(future)
+
+    def test_connect_error(self):
+        self.assertRaises(psycopg2.OperationalError, self.wait,
+            psycopg2.aio.aconnect(tests.dsn + " port=1", loop=self.loop))
+
+    def test_execute_fetch(self):
+        curs = self.conn.cursor()
+        self.assert_(self.wait(curs.execute("SELECT %s, %s", (10, 'x'))) is curs)
+        self.assertEqual(self.wait(curs.fetchone()), (10, 'x'))
+
+    def test_queued_queries(self):
+        curs1 = self.conn.cursor()
+        curs2 = self.conn.cursor()
+        f1 = curs1.execute("SELECT pg_sleep(0.1), 1")
+        f2 = curs2.execute("SELECT 2")
+        self.wait(asyncio.wait([f1, f2], loop=self.loop))
+        self.assertEqual(self.wait(curs1.fetchone())[1], 1)
+        self.assertEqual(self.wait(curs2.fetchone())[0], 2)
+
+    def test_concurrent_connections(self):
+        conn2 = self.wait(psycopg2.aio.aconnect(tests.dsn, loop=self.loop))
+        conn2.set_isolation_level(0)
+        curs1 = self.conn.cursor()
+        curs2 = conn2.cursor()
+        self.wait(asyncio.wait([
+            curs1.execute("SELECT pg_sleep(0.2)"),
+            curs2.execute("SELECT pg_sleep(0.2)")], loop=self.loop))
+        conn2.close()
+
+    def test_error(self):
+        curs = self.conn.cursor()
+        self.assertRaises(psycopg2.ProgrammingError,
+            self.wait, curs.execute("SELECT * FROM nosuchtable"))
+        self.wait(curs.execute("SELECT 1"))
+        self.assertEqual(self.wait(curs.fetchall()), [(1,)])
+
+    def test_transaction(self):
+        self.conn.set_isolation_level(1)
+        curs = self.conn.cursor()
+        self.wait(curs.execute("CREATE TEMP TABLE aio_test (id int)"))
+        self.wait(curs.execute("INSERT INTO aio_test VALUES (1)"))
+        self.wait(self.conn.commit())
+        self.assertEqual(self.conn.status, psycopg2.extensions.STATUS_READY)
+
+    def test_copy(self):
+        curs = self.conn.cursor()
+        f = StringIO()
+        self.wait(curs.copy_expert(
+            "COPY (SELECT generate_series(1, 3)) TO STDOUT", f))
+        self.assertEqual(f.getvalue(), "1\n2\n3\n")
+
+
+def test_suite():
+    if asyncio is None:
+        warnings.warn("asyncio tests skipped: install trollius to run them")
+        return unittest.TestSuite()
+    return unittest.TestLoader().loadTestsFromName(__name__)
+
+if __name__ == "__main__":
+    unittest.main()
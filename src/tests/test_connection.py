@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 
+import time
+import select
+import threading
 import unittest
 import psycopg2
 import tests
@@ -37,6 +40,218 @@ class ConnectionTests(unittest.TestCase):
         # now the isolation level should be equal to saved one
         self.assertEqual(conn.isolation_level, level)
 
+    def test_fileno_flush(self):
+        conn = self.connect()
+        self.assertEqual(conn.fileno(), conn.cursor().fileno())
+        self.assertEqual(conn.flush(), True)
+        conn.close()
+        self.assertRaises(psycopg2.InterfaceError, conn.fileno)
+
+    def test_cancel(self):
+        conn = self.connect()
+        curs = conn.cursor()
+        conn.cancel()   # nothing running: no-op
+
+        def canceller():
+            time.sleep(0.5)
+            conn.cancel()
+        t = threading.Thread(target=canceller)
+        t.start()
+        t0 = time.time()
+        self.assertRaises(psycopg2.OperationalError,
+            curs.execute, "select pg_sleep(10)")
+        self.assert_(time.time() - t0 < 5)
+        t.join()
+        conn.rollback()
+        curs.execute("select 1")
+        self.assertEqual(curs.fetchone()[0], 1)
+        conn.close()
+        self.assertRaises(psycopg2.InterfaceError, conn.cancel)
+
+    def test_execute_timeout(self):
+        conn = self.connect()
+        curs = conn.cursor()
+        t0 = time.time()
+        self.assertRaises(psycopg2.OperationalError,
+            curs.execute, "select pg_sleep(10)", timeout=0.5)
+        self.assert_(time.time() - t0 < 5)
+        conn.rollback()
+        curs.execute("select 42", timeout=5)
+        self.assertEqual(curs.fetchone()[0], 42)
+        self.assertRaises(ValueError, curs.execute, "select 1", timeout=0)
+        conn.close()
+
+    def test_pipeline(self):
+        conn = self.connect()
+        curs1 = conn.cursor()
+        curs2 = conn.cursor()
+        curs3 = conn.cursor()
+        conn.start_pipeline()
+        curs1.execute("select %s", (10,))
+        curs2.execute("create temp table pipeline (id int)")
+        curs3.execute("select 'x', 2")
+        self.assertEqual(curs1.description, None)
+        self.assertEqual(curs3.fetchall(), [('x', 2)])
+        self.assertEqual(curs1.fetchone(), (10,))
+        curs2.execute("insert into pipeline values (1)")
+        curs1.execute("select 1/0")
+        curs3.execute("select 3")
+        self.assertRaises(psycopg2.DataError, conn.sync_pipeline)
+        self.assertEqual(curs2.rowcount, 1)
+        self.assertRaises(psycopg2.ProgrammingError, curs3.fetchone)
+        conn.rollback()
+        curs1.execute("select 1")
+        conn.end_pipeline()
+        self.assertEqual(curs1.fetchone(), (1,))
+        self.assertRaises(psycopg2.ProgrammingError, conn.sync_pipeline)
+        conn.close()
+
+    def test_pipeline_multi_statement(self):
+        conn = self.connect()
+        a, b, d = conn.cursor(), conn.cursor(), conn.cursor()
+        conn.start_pipeline()
+        a.execute("select 1; select 2")
+        b.execute("select %s", ('b;',))
+        d.execute("select $$;$$ /* ; */ -- ;\n")
+        conn.sync_pipeline()
+        self.assertEqual(a.fetchone(), (2,))
+        self.assertEqual(b.fetchone(), ('b;',))
+        self.assertEqual(d.fetchone(), (';',))
+        conn.end_pipeline()
+        conn.close()
+
+    def test_fetch_timeout(self):
+        conn = self.connect()
+        conn.set_isolation_level(0)
+        curs = conn.cursor()
+        self.assertEqual(curs.fetch_timeout, 0)
+        curs.fetch_timeout = 0.2
+        curs.execute("select pg_sleep(1), 42", async=1)
+        self.assertRaises(psycopg2.OperationalError, curs.fetchone)
+        # the query is still pending: without a limit the result arrives
+        curs.fetch_timeout = 0
+        self.assertEqual(curs.fetchone()[1], 42)
+        conn.close()
+
+    def test_setup(self):
+        conn = self.connect()
+        curs = conn.cursor()
+        curs.execute("SHOW client_encoding")
+        self.assertEqual(conn.encoding, curs.fetchone()[0].upper())
+        curs.execute("SHOW DateStyle")
+        self.assert_(curs.fetchone()[0].startswith("ISO"))
+        self.assertEqual(conn.isolation_level, None)
+        conn.close()
+
+    def test_isolation_level_no_query(self):
+        # reading the level doesn't disturb the transaction or async queries
+        conn = self.connect()
+        curs = conn.cursor()
+        self.assertRaises(psycopg2.ProgrammingError, curs.execute, "selct 1")
+        self.assertEqual(conn.isolation_level, None)
+        conn.rollback()
+        curs.execute("select 42", async=1)
+        self.assertEqual(conn.isolation_level, None)
+        while not curs.isready():
+            select.select([conn], [], [], 5)
+        self.assertEqual(curs.fetchall(), [(42,)])
+        conn.close()
+
+    def test_isolation_level_server_default(self):
+        # the server default level is not reported as read committed
+        from psycopg2 import extensions
+        conn = psycopg2.connect(tests.dsn +
+            " options='-c default_transaction_isolation=serializable'")
+        self.assertEqual(conn.isolation_level, None)
+        curs = conn.cursor()
+        curs.execute("SHOW transaction_isolation")
+        self.assertEqual(curs.fetchone()[0], "serializable")
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_SERIALIZABLE)
+        self.assertEqual(conn.isolation_level,
+            extensions.ISOLATION_LEVEL_SERIALIZABLE)
+        conn.close()
+
+    def test_set_isolation_level(self):
+        from psycopg2 import extensions
+        conn = self.connect()
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_SERIALIZABLE)
+        self.assertEqual(conn.isolation_level,
+            extensions.ISOLATION_LEVEL_SERIALIZABLE)
+        curs = conn.cursor()
+        curs.execute("SHOW transaction_isolation")
+        self.assertEqual(curs.fetchone()[0], "serializable")
+        conn.close()
+
+    def test_begin_with_query(self):
+        from psycopg2 import extensions
+        conn = self.connect()
+        curs = conn.cursor()
+        curs.execute("select 1")
+        self.assertEqual(curs.fetchone(), (1,))
+        self.assertEqual(conn.status, extensions.STATUS_BEGIN)
+        self.assertEqual(conn.get_transaction_status(),
+            extensions.TRANSACTION_STATUS_INTRANS)
+        conn.set_client_encoding("LATIN1")
+        self.assertEqual(conn.status, extensions.STATUS_READY)
+        self.assertEqual(conn.get_transaction_status(),
+            extensions.TRANSACTION_STATUS_IDLE)
+        # the backend doesn't execute the BEGIN of an invalid string
+        self.assertRaises(psycopg2.ProgrammingError, curs.execute, "selct 1")
+        self.assertEqual(conn.status, extensions.STATUS_READY)
+        curs.execute("select 1")
+        conn.close()
+
+    def test_set_session(self):
+        from psycopg2 import extensions
+        conn = self.connect()
+        self.assert_(conn.readonly is False)
+        self.assert_(not conn.autocommit)
+        conn.set_session(readonly=True, autocommit=True)
+        self.assert_(conn.readonly is True)
+        self.assert_(conn.autocommit)
+        curs = conn.cursor()
+        curs.execute("SHOW transaction_read_only")
+        self.assertEqual(curs.fetchone()[0], "on")
+        self.assertEqual(conn.status, extensions.STATUS_READY)
+        self.assertRaises(psycopg2.Error, curs.execute,
+            "create temp table test_set_session (id int)")
+        conn.set_session(readonly=False, autocommit=False)
+        self.assert_(not conn.autocommit)
+        curs.execute("SHOW transaction_read_only")
+        self.assertEqual(curs.fetchone()[0], "off")
+        self.assertEqual(conn.status, extensions.STATUS_BEGIN)
+        self.assertRaises(psycopg2.ProgrammingError, conn.set_session,
+            readonly=True)
+        conn.close()
+
+    def test_set_session_first_statement(self):
+        # the read only mode must apply to the first statement too
+        conn = self.connect()
+        conn.set_session(readonly=True, autocommit=True)
+        curs = conn.cursor()
+        self.assertRaises(psycopg2.Error, curs.execute,
+            "create temp table test_set_session (id int)")
+        conn.close()
+
+    def test_async_connect(self):
+        from psycopg2 import extensions
+        conn = psycopg2.connect(tests.dsn, async=1)
+        self.assertEqual(conn.status, extensions.STATUS_CONNECTING)
+        self.assertRaises(psycopg2.InterfaceError, conn.cursor)
+        state = conn.poll()
+        while state != extensions.POLL_OK:
+            if state == extensions.POLL_READ:
+                select.select([conn], [], [], 5)
+            else:
+                select.select([], [conn], [], 5)
+            state = conn.poll()
+        self.assertEqual(conn.status, extensions.STATUS_READY)
+        self.assert_(conn.encoding)
+        curs = conn.cursor()
+        curs.execute("select 1")
+        self.assertEqual(curs.fetchone(), (1,))
+        conn.close()
+
 
 def test_suite():
     return unittest.TestLoader().loadTestsFromName(__name__)
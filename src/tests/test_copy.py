@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+import os
+import datetime
+import tempfile
+import unittest
+from cStringIO import StringIO
+from decimal import Decimal
+
+import psycopg2
+import psycopg2.extras
+from psycopg2.extras import BinaryCopyReader, BinaryCopyWriter
+import tests
+
+
+def _roundtrip(types, rows, chunk=7):
+    writer = BinaryCopyWriter(types, rows)
+    reader = BinaryCopyReader(types)
+    while 1:
+        data = writer.read(chunk)
+        if not data:
+            break
+        reader.write(data)
+    return reader
+
+
+class BinaryCopyFormatTests(unittest.TestCase):
+
+    def test_roundtrip_numbers(self):
+        types = [16, 21, 23, 20, 701]
+        rows = [(True, 1, -2, 3L, 2.25), (False, -1, 2, -3L, -0.5)]
+        self.assertEqual(_roundtrip(types, rows).rows, rows)
+
+    def test_roundtrip_nulls(self):
+        types = [23, 25, 1082]
+        rows = [(None, None, None)]
+        self.assertEqual(_roundtrip(types, rows).rows, rows)
+
+    def test_roundtrip_datetime(self):
+        types = [1082, 1083, 1114, 1186]
+        rows = [(datetime.date(2010, 3, 4), datetime.time(12, 3, 4, 5),
+                 datetime.datetime(1999, 12, 31, 23, 59, 59, 123),
+                 datetime.timedelta(3, 5, 7))]
+        self.assertEqual(_roundtrip(types, rows).rows, rows)
+
+    def test_roundtrip_numeric(self):
+        values = ['123.4500', '-0.00012', '10000', '0.0', '0',
+                  '99999999999999999999.000000001']
+        rows = [(Decimal(v),) for v in values]
+        got = _roundtrip([1700], rows).rows
+        self.assertEqual([str(r[0]) for r in got], values)
+
+    def test_roundtrip_numeric_special(self):
+        values = ['NaN', 'Infinity', '-Infinity']
+        rows = [(Decimal(v),) for v in values]
+        got = _roundtrip([1700], rows).rows
+        self.assertEqual([str(r[0]) for r in got], values)
+
+    def test_columns(self):
+        rows = [(1, 'a'), (2, 'b'), (3, None)]
+        reader = _roundtrip([23, 25], rows)
+        self.assertEqual(reader.columns(), [[1, 2, 3], ['a', 'b', None]])
+
+    def test_callback(self):
+        rows = [(1, 'a'), (2, 'b')]
+        received = []
+        writer = BinaryCopyWriter([23, 25], rows)
+        reader = BinaryCopyReader([23, 25], callback=received.append)
+        reader.write(writer.read(1000))
+        self.assertEqual(received, rows)
+        self.assertEqual(reader.rows, [])
+
+    def test_iter_rows(self):
+        rows = [(i,) for i in range(10)]
+        f = StringIO(BinaryCopyWriter([23], rows).read(1000))
+        reader = BinaryCopyReader([23])
+        self.assertEqual(list(reader.iter_rows(f, 5)), rows)
+        self.assertEqual(reader.rows, [])
+
+    def test_truncated(self):
+        data = BinaryCopyWriter([23], [(1,), (2,)]).read(1000)
+        reader = BinaryCopyReader([23])
+        self.assertRaises(psycopg2.DataError,
+            reader.read_from, StringIO(data[:-2]))
+
+    def test_bad_signature(self):
+        reader = BinaryCopyReader([23])
+        self.assertRaises(psycopg2.DataError,
+            reader.write, 'NOTCOPY\n\377\r\n\0' + '\0' * 8)
+
+    def test_unsupported_type(self):
+        self.assertRaises(psycopg2.NotSupportedError,
+            BinaryCopyWriter, [600], [])
+
+
+class BinaryCopyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = psycopg2.connect(tests.dsn)
+        curs = self.conn.cursor()
+        curs.execute("""CREATE TEMP TABLE tcopy (
+            id int4, num numeric(10,2), data text, ts timestamp)""")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_copy_from_to(self):
+        rows = [(i, Decimal('%d.50' % i), 'row %d' % i,
+                 datetime.datetime(2010, 1, 1, 0, 0, i))
+                for i in range(50)]
+        rows.append((50, None, None, None))
+        curs = self.conn.cursor()
+        psycopg2.extras.copy_from_binary(curs, 'tcopy', iter(rows))
+        reader = psycopg2.extras.copy_to_binary(curs,
+            '(SELECT * FROM tcopy ORDER BY id)')
+        self.assertEqual(reader.rows, rows)
+
+    def test_copy_columns(self):
+        curs = self.conn.cursor()
+        psycopg2.extras.copy_from_binary(curs, 'tcopy',
+            [(1, 'one'), (2, 'two')], columns=['id', 'data'])
+        reader = psycopg2.extras.copy_to_binary(curs, 'tcopy',
+            columns=['data', 'id'])
+        self.assertEqual(reader.columns(), [['one', 'two'], [1, 2]])
+
+    def test_copy_query_columns(self):
+        curs = self.conn.cursor()
+        self.assertRaises(ValueError, psycopg2.extras.copy_to_binary, curs,
+            '(SELECT * FROM tcopy)', columns=['id'], types=[23])
+
+    def test_copy_infinity(self):
+        if self.conn.server_version < 140000:
+            return
+        curs = self.conn.cursor()
+        reader = psycopg2.extras.copy_to_binary(curs,
+            "(SELECT 'infinity'::numeric, '-infinity'::numeric)")
+        self.assertEqual([str(v) for v in reader.rows[0]],
+            ['Infinity', '-Infinity'])
+
+    def test_copy_to_callback(self):
+        curs = self.conn.cursor()
+        received = []
+        reader = psycopg2.extras.copy_to_binary(curs,
+            '(SELECT generate_series(1, 3))', callback=received.append)
+        self.assertEqual(received, [(1,), (2,), (3,)])
+        self.assertEqual(reader.rows, [])
+
+
+class CopyFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = psycopg2.connect(tests.dsn)
+        curs = self.conn.cursor()
+        curs.execute("CREATE TEMP TABLE tcopyfile (id int4, data text)")
+        fd, self.filename = tempfile.mkstemp()
+        os.write(fd, "1\tone\r\n2\ttwo\n")
+        os.close(fd)
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove(self.filename)
+
+    def test_copy_from_universal_newlines(self):
+        # the file must be read, not mapped, to translate the newlines
+        f = open(self.filename, 'rU')
+        try:
+            curs = self.conn.cursor()
+            curs.copy_from(f, 'tcopyfile')
+        finally:
+            f.close()
+        curs.execute("SELECT data FROM tcopyfile ORDER BY id")
+        self.assertEqual(curs.fetchall(), [('one',), ('two',)])
+
+    def test_copy_from_binary_file(self):
+        # the mixed newlines reach the server untranslated
+        f = open(self.filename, 'rb')
+        try:
+            curs = self.conn.cursor()
+            self.assertRaises(psycopg2.DataError,
+                curs.copy_from, f, 'tcopyfile')
+        finally:
+            f.close()
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromName(__name__)
+
+if __name__ == "__main__":
+    unittest.main()
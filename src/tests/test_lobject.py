@@ -123,6 +123,52 @@ class LargeObjectTests(unittest.TestCase):
         self.assertEqual(lo.read(4), "some")
         self.assertEqual(lo.read(), data)
 
+    def test_readinto(self):
+        lo = self.conn.lobject()
+        lo.write("some data")
+        lo.seek(0)
+
+        buf = bytearray(4)
+        self.assertEqual(lo.readinto(buf), 4)
+        self.assertEqual(str(buf), "some")
+        buf = bytearray(10)
+        self.assertEqual(lo.readinto(buf), 5)
+        self.assertEqual(str(buf[:5]), " data")
+        self.assertEqual(lo.readinto(buf), 0)
+
+    def test_iter(self):
+        lo = self.conn.lobject()
+        data = "data" * 100000
+        lo.write(data)
+        lo.seek(0)
+
+        chunks = list(lo)
+        self.assert_(len(chunks) > 1)
+        self.assertEqual("".join(chunks), data)
+
+    def test_copy_to_from_file(self):
+        lo = self.conn.lobject()
+        data = "data" * 1000000
+        lo.write(data)
+        lo.seek(0)
+
+        self.tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(self.tmpdir, "data.txt")
+        f = open(filename, "wb")
+        self.assertEqual(lo.copy_to_file(f, size=10000), len(data))
+        f.close()
+        self.assertEqual(open(filename, "rb").read(), data)
+
+        lo2 = self.conn.lobject()
+        f = open(filename, "rb")
+        self.assertEqual(f.read(4), "data")
+        self.assertEqual(lo2.copy_from_file(f), len(data) - 4)
+        self.assertEqual(f.tell(), len(data))
+        f.close()
+        lo2.seek(0)
+        self.assertEqual(lo2.read(), data[4:])
+        lo2.unlink()
+
     def test_seek_tell(self):
         lo = self.conn.lobject()
         length = lo.write("some data")
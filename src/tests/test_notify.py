@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+import time
+import select
+import unittest
+
+import psycopg2
+import psycopg2.extras
+from psycopg2 import extensions
+import tests
+
+
+class NotifiesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = psycopg2.connect(tests.dsn)
+        self.conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def notify(self, channel):
+        conn = psycopg2.connect(tests.dsn)
+        try:
+            conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute("NOTIFY " + channel)
+        finally:
+            conn.close()
+
+    def test_poll_idle(self):
+        self.assertEqual(self.conn.poll(), extensions.POLL_OK)
+        self.assertEqual(self.conn.notifies, [])
+
+    def test_poll_notifies(self):
+        self.conn.cursor().execute("LISTEN test_poll")
+        self.notify("test_poll")
+        self.assertNotEqual(select.select([self.conn], [], [], 5)[0], [])
+        self.assertEqual(self.conn.poll(), extensions.POLL_OK)
+        self.assertEqual(len(self.conn.notifies), 1)
+        self.assertEqual(self.conn.notifies[0][1], "test_poll")
+
+    def test_notifies_after_query(self):
+        curs = self.conn.cursor()
+        curs.execute("LISTEN test_query")
+        curs.execute("NOTIFY test_query")
+        self.assertEqual(len(self.conn.notifies), 1)
+        self.assertEqual(self.conn.notifies[0][1], "test_query")
+
+    def test_notify_payload(self):
+        if self.conn.server_version < 90000:
+            return
+        curs = self.conn.cursor()
+        curs.execute("LISTEN test_payload")
+        curs.execute("NOTIFY test_payload, 'hello'")
+        curs.execute("NOTIFY test_payload")
+        # the notifications are 2 items tuples, with or without payload
+        pid, channel = self.conn.notifies[0]
+        self.assertEqual(channel, "test_payload")
+        self.assertEqual(self.conn.notifies[0].payload, "hello")
+        self.assertEqual(self.conn.notifies[1], (pid, "test_payload"))
+        self.assertEqual(self.conn.notifies[1].payload, "")
+
+    def test_dispatcher_callback(self):
+        received = []
+        dispatcher = psycopg2.extras.NotifyDispatcher(self.conn)
+        dispatcher.listen("test_callback",
+            lambda *notify: received.append(notify))
+        dispatcher.start()
+        try:
+            self.notify("test_callback")
+            for i in range(50):
+                if received:
+                    break
+                time.sleep(0.1)
+        finally:
+            dispatcher.stop()
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0][1], "test_callback")
+
+    def test_dispatcher_queue(self):
+        dispatcher = psycopg2.extras.NotifyDispatcher(self.conn, maxsize=2)
+        dispatcher.listen("test_queue")
+        for i in range(3):
+            self.notify("test_queue")
+        # let the dispatcher find all the notifications pending
+        time.sleep(0.5)
+        dispatcher.start()
+        try:
+            pid, channel, payload = dispatcher.get(timeout=5)
+        finally:
+            dispatcher.stop()
+        self.assertEqual(channel, "test_queue")
+        self.assertEqual(payload, "")
+        self.assertEqual(dispatcher.get(timeout=5)[1], "test_queue")
+        self.assertEqual(dispatcher.dropped, 1)
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromName(__name__)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+import time
+import socket
+import threading
+import unittest
+
+import psycopg2
+import psycopg2.pool
+import psycopg2.extensions
+import tests
+
+
+def _terminate(conn):
+    """Have the server terminate the backend of 'conn'."""
+    killer = psycopg2.connect(tests.dsn)
+    killer.cursor().execute("SELECT pg_terminate_backend(%s)",
+        (conn.get_backend_pid(),))
+    killer.close()
+    time.sleep(0.1)
+
+
+class ThreadedPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = psycopg2.pool.ThreadedConnectionPool(1, 2, tests.dsn)
+
+    def tearDown(self):
+        if not self.pool.closed:
+            self.pool.closeall()
+
+    def test_stats(self):
+        conn = self.pool.getconn()
+        stats = self.pool.stats()
+        self.assertEqual(stats['idle'], 0)
+        self.assertEqual(stats['used'], 1)
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['waiting'], 0)
+        self.pool.putconn(conn, close=True)
+        stats = self.pool.stats()
+        self.assertEqual(stats['used'], 0)
+        self.assertEqual(stats['closed'], 1)
+
+    def test_exhausted(self):
+        self.pool.getconn()
+        self.pool.getconn()
+        self.assertRaises(psycopg2.pool.PoolError, self.pool.getconn)
+
+    def test_timeout(self):
+        self.pool.getconn()
+        self.pool.getconn()
+        t0 = time.time()
+        self.assertRaises(psycopg2.pool.PoolError,
+            self.pool.getconn, timeout=0.2)
+        self.assert_(time.time() - t0 >= 0.2)
+
+    def test_wait_putconn(self):
+        conn = self.pool.getconn()
+        self.pool.getconn()
+        got = []
+        def waiter():
+            got.append(self.pool.getconn(timeout=5))
+        t = threading.Thread(target=waiter)
+        t.start()
+        time.sleep(0.1)
+        self.assertEqual(got, [])
+        self.pool.putconn(conn)
+        t.join()
+        self.assert_(got[0] is conn)
+
+    def test_wait_putconn_terminated(self):
+        conn = self.pool.getconn()
+        self.pool.getconn()
+        got = []
+        def waiter():
+            got.append(self.pool.getconn(timeout=5))
+        t = threading.Thread(target=waiter)
+        t.start()
+        time.sleep(0.1)
+        _terminate(conn)
+        self.pool.putconn(conn)
+        t.join()
+        self.assert_(got[0] is not conn)
+        self.assert_(conn.closed)
+        curs = got[0].cursor()
+        curs.execute("select 1")
+        self.assertEqual(curs.fetchone(), (1,))
+
+    def test_fifo(self):
+        conn1 = self.pool.getconn()
+        conn2 = self.pool.getconn()
+        got = []
+        def waiter(i):
+            self.pool.getconn(timeout=5)
+            got.append(i)
+        threads = []
+        for i in range(2):
+            t = threading.Thread(target=waiter, args=(i,))
+            t.start()
+            threads.append(t)
+            time.sleep(0.1)
+        self.pool.putconn(conn1)
+        threads[0].join()
+        self.pool.putconn(conn2, close=True)
+        threads[1].join()
+        self.assertEqual(got, [0, 1])
+
+    def test_closeall_wakes_waiters(self):
+        self.pool.getconn()
+        self.pool.getconn()
+        errors = []
+        def waiter():
+            try:
+                self.pool.getconn(timeout=None)
+            except psycopg2.pool.PoolError, e:
+                errors.append(e)
+        t = threading.Thread(target=waiter)
+        t.start()
+        time.sleep(0.1)
+        self.pool.closeall()
+        t.join()
+        self.assertEqual(len(errors), 1)
+
+
+class LifecycleTests(unittest.TestCase):
+
+    def test_connect_many(self):
+        conns = psycopg2.pool.connect_many(3, tests.dsn)
+        self.assertEqual(len(conns), 3)
+        for conn in conns:
+            curs = conn.cursor()
+            curs.execute("select 1")
+            self.assertEqual(curs.fetchone(), (1,))
+            conn.close()
+
+    def test_connect_many_timeout(self):
+        # a server accepting the connection but never answering
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(5)
+        try:
+            dsn = "host=127.0.0.1 port=%d connect_timeout=2" \
+                % sock.getsockname()[1]
+            t0 = time.time()
+            self.assertRaises(psycopg2.OperationalError,
+                psycopg2.pool.connect_many, 2, dsn)
+            self.assert_(time.time() - t0 < 5)
+        finally:
+            sock.close()
+
+    def test_replace_closed(self):
+        pool = psycopg2.pool.SimpleConnectionPool(1, 2, tests.dsn)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.close()
+        conn2 = pool.getconn()
+        self.assert_(conn2 is not conn)
+        self.assertEqual(conn2.closed, 0)
+        pool.closeall()
+
+    def test_replace_terminated(self):
+        pool = psycopg2.pool.SimpleConnectionPool(1, 2, tests.dsn)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        _terminate(conn)
+        conn2 = pool.getconn()
+        self.assert_(conn2 is not conn)
+        conn2.cursor().execute("SELECT 1")
+        pool.closeall()
+
+    def test_reap_terminated(self):
+        pool = psycopg2.pool.SimpleConnectionPool(1, 2, tests.dsn,
+            check_on_checkout=False)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        _terminate(conn)
+        pool.reap()
+        self.assert_(conn.closed)
+        self.assert_(pool.getconn() is not conn)
+        pool.closeall()
+
+    def test_rollback_on_checkout(self):
+        pool = psycopg2.pool.SimpleConnectionPool(1, 2, tests.dsn)
+        conn = pool.getconn()
+        conn.cursor().execute("SELECT 1")
+        pool.putconn(conn)
+        self.assertEqual(pool.getconn().get_transaction_status(),
+            psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        pool.closeall()
+
+    def test_max_lifetime(self):
+        pool = psycopg2.pool.SimpleConnectionPool(1, 2, tests.dsn,
+            max_lifetime=0.1)
+        conn = pool.getconn()
+        time.sleep(0.2)
+        pool.putconn(conn)
+        self.assert_(conn.closed)
+        self.assert_(pool.getconn() is not conn)
+        pool.closeall()
+
+    def test_idle_timeout(self):
+        pool = psycopg2.pool.SimpleConnectionPool(1, 3, tests.dsn,
+            idle_timeout=0.1)
+        conns = [pool.getconn() for i in range(3)]
+        for conn in conns:
+            pool.putconn(conn)
+        self.assertEqual(len([c for c in conns if not c.closed]), 3)
+        time.sleep(0.2)
+        pool.reap()
+        self.assertEqual(len([c for c in conns if not c.closed]), 1)
+        pool.closeall()
+
+    def test_reset_rollback(self):
+        pool = psycopg2.pool.SimpleConnectionPool(1, 2, tests.dsn,
+            reset='rollback', check_on_checkout=False)
+        conn = pool.getconn()
+        conn.cursor().execute("SELECT 1")
+        pool.putconn(conn)
+        self.assertEqual(conn.get_transaction_status(),
+            psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        self.assert_(pool.getconn() is conn)
+        pool.closeall()
+
+    def test_reset_discard(self):
+        pool = psycopg2.pool.SimpleConnectionPool(1, 2, tests.dsn,
+            reset='discard')
+        conn = pool.getconn()
+        curs = conn.cursor()
+        curs.execute("CREATE TEMP TABLE test_reset_discard (id int)")
+        conn.commit()
+        pool.putconn(conn)
+        conn = pool.getconn()
+        curs = conn.cursor()
+        curs.execute("SELECT count(*) FROM pg_class "
+            "WHERE relname = 'test_reset_discard'")
+        self.assertEqual(curs.fetchone()[0], 0)
+        pool.closeall()
+
+    def test_bad_reset(self):
+        self.assertRaises(ValueError, psycopg2.pool.SimpleConnectionPool,
+            0, 1, tests.dsn, reset='nuke')
+
+
+
+class RoutingPoolTests(unittest.TestCase):
+
+    def test_readonly_to_replica(self):
+        pool = psycopg2.pool.RoutingConnectionPool(0, 2, tests.dsn,
+            [tests.dsn], max_lag=10)
+        conn = pool.getconn(readonly=True)
+        self.assertEqual(pool.stats()['replicas'][0]['outstanding'], 1)
+        self.assertEqual(pool.stats()['replicas'][0]['lag'], 0)
+        pool.putconn(conn)
+        conn = pool.getconn()
+        self.assertEqual(pool.stats()['primary']['used'], 1)
+        pool.putconn(conn)
+        pool.closeall()
+
+    def test_fallback_to_primary(self):
+        pool = psycopg2.pool.RoutingConnectionPool(0, 2, tests.dsn,
+            ["host=nosuchhost.invalid"])
+        conn = pool.getconn(readonly=True)
+        stats = pool.stats()
+        self.assertEqual(stats['primary']['used'], 1)
+        self.assertEqual(stats['fallbacks'], 1)
+        self.assert_(not stats['replicas'][0]['available'])
+        pool.putconn(conn)
+        pool.closeall()
+
+    def test_closed_replica_conn(self):
+        pool = psycopg2.pool.RoutingConnectionPool(0, 2, tests.dsn,
+            [tests.dsn])
+        # a connection closed on purpose doesn't disable the replica
+        conn = pool.getconn(readonly=True)
+        conn.close()
+        pool.putconn(conn)
+        self.assert_(pool.stats()['replicas'][0]['available'])
+
+        # a lost connection does
+        conn = pool.getconn(readonly=True)
+        killer = psycopg2.connect(tests.dsn)
+        killer.cursor().execute("SELECT pg_terminate_backend(%s)",
+            (conn.get_backend_pid(),))
+        killer.close()
+        time.sleep(0.1)
+        self.assertRaises(psycopg2.DatabaseError,
+            conn.cursor().execute, "SELECT 1")
+        pool.putconn(conn)
+        self.assert_(not pool.stats()['replicas'][0]['available'])
+        pool.closeall()
+
+    def test_bad_policy(self):
+        self.assertRaises(ValueError, psycopg2.pool.RoutingConnectionPool,
+            0, 1, tests.dsn, policy='random')
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromName(__name__)
+
+if __name__ == "__main__":
+    unittest.main()
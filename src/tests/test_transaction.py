@@ -204,6 +204,57 @@ class DeadlockSerializationTests(unittest.TestCase):
                 error, psycopg2.extensions.TransactionRollbackError))
 
 
+    def test_runner_retry(self):
+        from psycopg2.extras import TransactionRunner
+        runner = TransactionRunner(self.connect(), backoff=0)
+        calls = []
+
+        def update(curs):
+            curs.execute("SELECT name FROM table1 WHERE id = 1")
+            curs.fetchall()
+            if not calls:
+                # a concurrent transaction updates the row: the update
+                # below fails with a serialization failure
+                conn = self.connect()
+                conn.cursor().execute(
+                    "UPDATE table1 SET name='other' WHERE id = 1")
+                conn.commit()
+                conn.close()
+            calls.append(1)
+            curs.execute("UPDATE table1 SET name='runner' WHERE id = 1")
+            return len(calls)
+
+        self.assertEqual(runner.run(update), 2)
+        self.assertEqual(runner.stats.transactions, 1)
+        self.assertEqual(runner.stats.retries, 1)
+        self.assertEqual(runner.stats.errors, {'40001': 1})
+        curs = self.conn.cursor()
+        curs.execute("SELECT name FROM table1 WHERE id = 1")
+        self.assertEqual(curs.fetchone()[0], 'runner')
+        runner.conn.close()
+
+    def test_runner_give_up(self):
+        from psycopg2.extras import TransactionRunner
+        runner = TransactionRunner(self.connect(), max_retries=2, backoff=0)
+
+        def fail(curs):
+            curs.execute("SELECT name FROM table1 WHERE id = 1")
+            curs.fetchall()
+            conn = self.connect()
+            conn.cursor().execute(
+                "UPDATE table1 SET name='other' WHERE id = 1")
+            conn.commit()
+            conn.close()
+            curs.execute("UPDATE table1 SET name='runner' WHERE id = 1")
+
+        self.assertRaises(psycopg2.extensions.TransactionRollbackError,
+            runner.run, fail)
+        self.assertEqual(runner.stats.retries, 2)
+        self.assertEqual(runner.stats.failures, 1)
+        self.assertEqual(runner.conn.status, STATUS_READY)
+        runner.conn.close()
+
+
 class QueryCancelationTests(unittest.TestCase):
     """Tests for query cancelation."""
 
@@ -113,6 +113,23 @@ class TypesBasicTests(unittest.TestCase):
         self.failUnless(s == ['one', 'two', 'three'],
                         "wrong array quoting " + str(s))
 
+    def testFetchManyRows(self):
+        # fetchall() parses the fixed-width types in bulk: the values must be
+        # the same returned by fetchone()
+        query = """SELECT i, i::int8 * 10000000000, i / 3.0::float8,
+            i % 2 = 0, '2010-01-01'::date + i, 'x' || i,
+            CASE WHEN i % 10 = 0 THEN NULL ELSE i END,
+            CASE WHEN i % 7 = 0 THEN 'NaN'::float8 ELSE 0.5 END
+            FROM generate_series(1, 3000) AS i"""
+        curs = self.conn.cursor()
+        curs.execute(query)
+        rows = curs.fetchall()
+        curs.execute(query)
+        for row in rows:
+            self.assertEqual(repr(row), repr(curs.fetchone()))
+        self.assertEqual(type(rows[0][0]), int)
+        self.assertEqual(type(rows[0][1]), long)
+
 
 def test_suite():
     return unittest.TestLoader().loadTestsFromName(__name__)